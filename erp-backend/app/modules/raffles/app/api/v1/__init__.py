@@ -2,8 +2,10 @@ from fastapi import APIRouter
 from .auth import router as auth_router
 from .raffles import router as raffles_router
 from .tickets import router as ticket_router
+from .metrics import router as metrics_router
 
 router = APIRouter(prefix="/api/v1")
 router.include_router(auth_router)
 router.include_router(raffles_router)
 router.include_router(ticket_router)
+router.include_router(metrics_router)
@@ -49,6 +49,9 @@ async def register_user(
     except ValueError as ve:
         # Captura el error si el usuario ya existe
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    except HTTPException:
+        # El 503 del pool de contraseñas saturado se propaga tal cual
+        raise
     except Exception:
         # Captura cualquier otro error inesperado
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error al registrar el usuario.")
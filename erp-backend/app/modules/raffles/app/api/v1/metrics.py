@@ -0,0 +1,35 @@
+# raffle-backend/app/api/v1/metrics.py
+
+from fastapi import APIRouter, Depends
+
+from app.core.security import get_current_user, password_hasher
+from app.db.models import User
+from app.services.reservation_sweeper import reservation_sweeper
+from app.services.raffle_service import raffle_response_cache
+from app.services.raffle_meta_cache import raffle_meta_cache
+from app.services.principal_cache import principal_cache
+from app.services.receipt_pool import receipt_render_pool
+from app.services.receipt_cache import receipt_cache
+from app.services.receipt_service import receipt_variant_stats
+from app.services.send_whatsapp_message import whatsapp_client
+from app.services.notification_outbox import notification_dispatcher
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+# --- ENDPOINT DE MÉTRICAS INTERNAS DEL WORKER ---
+# Las métricas son por proceso: cada worker de gunicorn reporta las suyas.
+@router.get("/", summary="Get in-process metrics of background jobs and caches")
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    return {
+        "reservation_sweeper": reservation_sweeper.get_metrics(),
+        "raffle_response_cache": raffle_response_cache.get_metrics(),
+        "raffle_meta_cache": raffle_meta_cache.get_metrics(),
+        "principal_cache": principal_cache.get_metrics(),
+        "password_hasher": password_hasher.get_metrics(),
+        "receipt_render_pool": receipt_render_pool.get_metrics(),
+        "receipt_cache": receipt_cache.get_metrics(),
+        "receipt_variants": receipt_variant_stats.get_metrics(),
+        "whatsapp_client": whatsapp_client.get_metrics(),
+        "notification_dispatcher": notification_dispatcher.get_metrics(),
+    }
@@ -1,19 +1,39 @@
 # raffle-backend/app/api/v1/raffles.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Path, Query, Response
+from typing import Literal, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
-from app.core.security import get_current_user
+from app.core.config import settings
+from app.core.security import get_current_user, require_maintenance_operator
 from app.db.models import User
 # --- LÍNEA MODIFICADA ---
 # Se importan todos los esquemas y servicios necesarios
-from app.schemas.raffle import RaffleCreateRequest, RaffleListResponse, RaffleUpdateRequest, RaffleResponse
-from app.services.raffle_service import create_raffle_service, list_raffles_service, update_raffle_service, get_raffle_service, check_number_availability_service, get_random_available_numbers_service, _build_raffle_response
+from app.schemas.raffle import RaffleCreateRequest, RaffleListResponse, RaffleUpdateRequest, RaffleResponse, NumberBatchCheckRequest, NumberBatchCheckResponse, SoldTicketPage, ReceiptExportJobInfo
+from app.services.raffle_service import create_raffle_service, list_raffles_service, update_raffle_service, get_raffle_service, check_number_availability_service, get_random_available_numbers_service, check_availability_index_service, check_numbers_status_service, get_raffle_board_etag_service, get_raffle_board_service, list_sold_tickets_service, list_raffles_cached_service, get_raffle_cached_service, _build_raffle_response
+from app.services.response_cache import CachedResponse
 from app.modules.raffles.app.schemas.raffle import RaffleDetailResponse
+from app.services.board import encode_board
+from app.services.raffle_stats import reconcile_all_raffle_stats
+from app.services.receipt_export import start_receipt_export, get_receipt_export_job
+from fastapi.responses import StreamingResponse
+from app.utils.http_cache import etag_matches
+from app.utils.responses import PydanticJSONResponse
 # -------------------------
 
 router = APIRouter(prefix="/raffle", tags=["Raffles"])
 
+
+def _cached_json_response(cached: CachedResponse, not_modified: bool) -> Response:
+    """Respuesta 304 o el cuerpo JSON ya serializado; el cliente debe revalidar siempre con el ETag."""
+    headers = {"Cache-Control": "private, no-cache"}
+    if cached.etag:
+        headers["ETag"] = cached.etag
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 # --- ENDPOINT PARA CREAR UNA NUEVA RIFA ---
 # Este endpoint permite a los usuarios crear una nueva rifa.
 # Utiliza el servicio para manejar la lógica de negocio y devuelve la rifa creada.
@@ -32,12 +52,11 @@ async def create_raffle(
         #    Para una rifa nueva, las estadísticas son siempre 0.
         formatted_response = _build_raffle_response(
             raffle=new_raffle_orm,
-            tickets_sold=0,
-            participants=0
+            stats=None
         )
         
         # 3. Devolvemos la respuesta ya formateada y completa
-        return formatted_response
+        return PydanticJSONResponse(formatted_response, status_code=status.HTTP_201_CREATED)
         
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -47,14 +66,30 @@ async def create_raffle(
 
 @router.get("/", response_model=RaffleListResponse)
 async def list_raffles(
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        raffles = await list_raffles_service(db)
-        return {"raffles": raffles}
+        cached, not_modified = await list_raffles_cached_service(db, if_none_match)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing raffles: {str(e)}")
+    return _cached_json_response(cached, not_modified)
+
+# --- ENDPOINT PARA RECONCILIAR LAS ESTADÍSTICAS ---
+# Recalcula desde cero los contadores de raffle_stats a partir de la tabla 'tickets'.
+# Bloquea las filas de estadísticas que actualiza cada compra, y ya se ejecuta al arrancar:
+# solo para operadores (ver MAINTENANCE_ENDPOINTS_ENABLED).
+# Se declara antes de las rutas con '{raffle_id}'.
+@router.post("/stats/reconcile", summary="Recompute the maintained statistics of every raffle (or one) from scratch (operators only)")
+async def reconcile_raffle_stats(
+    raffle_id: Optional[str] = Query(None, description="Reconciliar solo esta rifa"),
+    current_user: User = Depends(require_maintenance_operator)
+):
+    try:
+        return await reconcile_all_raffle_stats([raffle_id] if raffle_id else None)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconciling raffle statistics: {str(e)}")
 
 # --- ENDPOINT PARA OBTENER DETALLES DE UNA RIFA ---
 # Este endpoint permite obtener los detalles de una rifa específica por su ID.
@@ -62,17 +97,79 @@ async def list_raffles(
 @router.get("/{raffle_id}", response_model=RaffleDetailResponse)
 async def get_raffle(
     raffle_id: str,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        raffle = await get_raffle_service(raffle_id, db)
-        return raffle
+        cached, not_modified = await get_raffle_cached_service(raffle_id, db, if_none_match)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting raffle: {str(e)}")
+    return _cached_json_response(cached, not_modified)
+
+# --- ENDPOINT PARA LISTAR LOS TIQUETES VENDIDOS DE UNA RIFA ---
+# El detalle de la rifa solo trae la primera página; el resto se recorre aquí con el
+# cursor 'next_cursor' (paginación keyset por fecha de compra descendente).
+@router.get("/{raffle_id}/sold-tickets", response_model=SoldTicketPage, summary="List the sold tickets of a raffle with cursor pagination")
+async def list_sold_tickets(
+    raffle_id: str,
+    cursor: Optional[str] = Query(None, description="Cursor devuelto como 'next_cursor' en la página anterior"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        page = await list_sold_tickets_service(raffle_id, db, cursor, limit)
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing sold tickets: {str(e)}")
+    if page is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Raffle not found")
+    return PydanticJSONResponse(page)
     
+# --- EXPORTACIÓN MASIVA DE COMPROBANTES (ZIP EN STREAMING) ---
+# Renderiza los comprobantes de la rifa en paralelo en el pool de procesos y los va
+# escribiendo al ZIP. El encabezado X-Export-Job-Id permite consultar el avance y, si la
+# descarga se corta, pedir otro ZIP con lo que faltó usando ?resume_job=<id>.
+@router.get("/{raffle_id}/receipts/export", summary="Stream a ZIP with the receipt image of every ticket of a raffle")
+async def export_raffle_receipts(
+    raffle_id: str,
+    ticket_status: Optional[str] = Query(None, alias="status", description="Por defecto, pagados y pendientes"),
+    resume_job: Optional[str] = Query(None, description="Continuar después de lo que alcanzó a entregar esa exportación"),
+    current_user: User = Depends(get_current_user)
+):
+    logging.info(f"Exportación de comprobantes de la rifa {raffle_id} solicitada por '{current_user.username}'.")
+    try:
+        export = await start_receipt_export(raffle_id, ticket_status, resume_job)
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    if export is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Raffle not found")
+    job, archive = export
+    return StreamingResponse(
+        archive,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="comprobantes_{raffle_id[:8]}_{job.id[:8]}.zip"',
+            "X-Export-Job-Id": job.id,
+        },
+    )
+
+
+@router.get("/{raffle_id}/receipts/export/{job_id}", response_model=ReceiptExportJobInfo, summary="Get the progress of a receipt export")
+async def get_raffle_receipts_export(
+    raffle_id: str,
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    job = await get_receipt_export_job(raffle_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found")
+    return PydanticJSONResponse(ReceiptExportJobInfo.model_validate(job))
+
 # --- ENDPOINT DE ACTUALIZACIÓN CORREGIDO Y SIMPLIFICADO ---
 @router.put("/{raffle_id}", response_model=RaffleDetailResponse)
 async def update_raffle(
@@ -88,8 +185,8 @@ async def update_raffle(
         # El servicio ya devuelve el objeto Raffle actualizado y compatible
         updated_raffle_orm = await update_raffle_service(raffle_id, raffle_data, db)
         
-        # FastAPI y Pydantic se encargarán de convertir el objeto ORM a la respuesta JSON
-        return updated_raffle_orm
+        # La respuesta ya es un RaffleDetailResponse: se serializa directo a bytes
+        return PydanticJSONResponse(updated_raffle_orm)
         
     except ValueError as e:
         # Si la rifa no se encuentra o hay un error de validación, devuelve 400 o 404
@@ -122,6 +219,8 @@ async def check_number_availability(
         # 2. Devuelve la respuesta en formato JSON
         return {"is_available": is_available}
 
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ve))
     except Exception as e:
         # 3. Maneja cualquier error inesperado
         raise HTTPException(
@@ -130,13 +229,74 @@ async def check_number_availability(
         )
     
 
+# --- ENDPOINT PARA VERIFICAR VARIOS NÚMEROS EN UNA SOLA PETICIÓN ---
+# Reemplaza N llamadas a check-number cuando el vendedor digita un paquete completo.
+@router.post("/{raffle_id}/check-numbers", response_model=NumberBatchCheckResponse, summary="Check the status of many numbers at once")
+async def check_numbers_status(
+    raffle_id: str,
+    data: NumberBatchCheckRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Devuelve el estado de cada número pedido: available, reserved, assigned, excluded o invalid.
+    """
+    try:
+        statuses = await check_numbers_status_service(raffle_id, data.numbers, db)
+        return {"statuses": statuses}
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al verificar la disponibilidad de los números: {str(e)}"
+        )
+
+
+# --- ENDPOINT PARA OBTENER EL TABLERO COMPLETO DE NÚMEROS ---
+# Devuelve el estado de todo el universo de la rifa en formato compacto:
+#   - encoding=packed: 2 bits por número (0 disponible, 1 reservado, 2 asignado, 3 excluido),
+#     el primer número en los bits bajos de cada byte, comprimido con zlib.
+#   - encoding=rle: JSON con corridas [código, longitud].
+# Soporta peticiones condicionales: con If-None-Match vigente responde 304 sin cuerpo.
+@router.get("/{raffle_id}/board", summary="Get the compact status board of every number in a raffle")
+async def get_raffle_board(
+    raffle_id: str,
+    encoding: Literal["packed", "rle"] = Query("packed"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        # La versión se lee antes de construir: si el tablero cambia mientras tanto, el ETag
+        # queda viejo y la siguiente revalidación descarga el tablero otra vez.
+        etag = await get_raffle_board_etag_service(raffle_id, encoding, db)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        board = await get_raffle_board_service(raffle_id, db)
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building raffle board: {str(e)}")
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "X-Board-Digits": str(board.digits),
+        "X-Board-Size": str(board.size),
+        "X-Board-Encoding": "packed-2bit+zlib" if encoding == "packed" else "rle",
+    }
+    body, media_type = encode_board(board, encoding)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
 # --- ENDPOINT PARA OBTENER NÚMEROS ALEATORIOS DISPONIBLES ---
 # Este endpoint genera y devuelve una lista de N números aleatorios disponibles para una rifa.
 # Utiliza el servicio para obtener los números y maneja errores comunes.
 @router.get("/{raffle_id}/random-numbers/{count}", summary="Get a list of random available numbers")
 async def get_random_available_numbers(
     raffle_id: str,
-    count: int,
+    count: int = Path(..., ge=1, le=settings.RANDOM_NUMBERS_MAX_COUNT),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -149,4 +309,21 @@ async def get_random_available_numbers(
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- ENDPOINT PARA VERIFICAR EL ÍNDICE DE DISPONIBILIDAD ---
+# Compara el bitmap en memoria de la rifa contra la tabla 'numbers' y lo reconstruye.
+# Recorre el universo completo de la rifa: solo para operadores (ver MAINTENANCE_ENDPOINTS_ENABLED).
+@router.get("/{raffle_id}/availability-index/check", summary="Check the in-memory availability index against the database (operators only)")
+async def check_availability_index(
+    raffle_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_maintenance_operator)
+):
+    try:
+        return await check_availability_index_service(raffle_id, db)
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,32 +1,39 @@
 # raffle-backend/app/api/v1/tickets.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Response, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, cast, Date # Se añaden cast y Date
-from sqlalchemy.orm import selectinload
-from typing import List
+from typing import List, Literal, Optional
 
 from app.db.database import get_db
-from app.core.security import get_current_user
+from app.core.security import get_current_user, require_maintenance_operator
 from app.db.models import User, Ticket
 from app.schemas.ticket import (
     TicketInfo,
     TicketListResponse,
     TicketCreateRequest, 
+    TicketAllocateRequest,
+    TicketFilters,
 )
 # Se importan los servicios simplificados
 from app.services.ticket_service import (
     list_tickets_service,
+    search_tickets_service,
     cancel_ticket_service,
     get_ticket_by_id_service,
     create_ticket_service,
-    send_purchase_notification,
+    allocate_random_ticket_service,
     confirm_payment_service,
 )
-from app.services.generate_image import generate_raffle_image
-from app.modules.raffles.app.utils.cleanup import cleanup_temp_file
-import tempfile
+from app.services.sales_service import (
+    get_sales_analytics_service,
+    get_monthly_sales_summary_service,
+    rebuild_sales_rollup_job,
+)
+from app.schemas.sales import SalesAnalyticsResponse
+from app.services.receipt_service import get_ticket_receipt, negotiate_image_format
+from app.services.ticket_export import export_tickets
+from app.utils.responses import PydanticJSONResponse, attachment_disposition
 import os
 import logging
 
@@ -79,18 +86,71 @@ async def confirm_payment(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred: {str(e)}")
 
 
-@router.get("/", response_model=TicketListResponse, summary="List all tickets")
-async def list_tickets(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/", response_model=TicketListResponse, summary="List tickets with cursor pagination and filters")
+async def list_tickets(
+    filters: TicketFilters = Depends(),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto como 'next_cursor' en la página anterior"),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     logging.info(f"Petición recibida en GET /tickets/ por el usuario '{current_user.username}'.")
     try:
-        tickets = await list_tickets_service(db)
+        tickets, next_cursor = await list_tickets_service(db, filters, cursor, limit)
         logging.info(f"Devolviendo {len(tickets)} tiquetes.")
-        return {"tickets": tickets}
+        return PydanticJSONResponse(TicketListResponse.model_construct(tickets=tickets, next_cursor=next_cursor))
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
     except Exception as e:
         logging.error(f"Error 500 inesperado al listar tiquetes: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error listing tickets: {str(e)}")
 
 
+# --- ENDPOINT DE BÚSQUEDA DE PARTICIPANTES ---
+# Se declara antes de '/{ticket_id}'. Si la consulta parece un teléfono se busca por los dígitos
+# del teléfono; si no, por el nombre sin tildes ni mayúsculas. Ambas son coincidencias parciales.
+@router.get("/search", response_model=TicketListResponse, summary="Search tickets by participant phone or name")
+async def search_tickets(
+    q: str = Query(..., min_length=3, max_length=100, description="Parte del teléfono o del nombre del participante"),
+    raffle_id: Optional[str] = Query(None),
+    ticket_status: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    logging.info(f"Petición recibida en GET /tickets/search por el usuario '{current_user.username}'.")
+    try:
+        tickets = await search_tickets_service(db, q, raffle_id, ticket_status, limit)
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    except Exception as e:
+        logging.error(f"Error 500 inesperado al buscar tiquetes: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error searching tickets: {str(e)}")
+    return PydanticJSONResponse(TicketListResponse.model_construct(tickets=tickets, next_cursor=None))
+
+
+# --- ENDPOINT DE EXPORTACIÓN EN STREAMING (CSV / NDJSON) ---
+# Se declara antes de '/{ticket_id}' para que la ruta '/export' no se interprete como un ID.
+@router.get("/export", summary="Stream a CSV or NDJSON export of tickets")
+async def export_tickets_endpoint(
+    filters: TicketFilters = Depends(),
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Exporta los tiquetes con las mismas columnas de TicketInfo, escribiendo las filas a
+    medida que se leen de la base de datos. La memoria usada no depende del total.
+    """
+    logging.info(f"Petición recibida en GET /tickets/export ({export_format}) por el usuario '{current_user.username}'.")
+    media_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson"
+    filename = f"tickets_{date.today().strftime('%Y%m%d')}.{export_format}"
+    return StreamingResponse(
+        export_tickets(filters, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/{ticket_id}", response_model=TicketInfo, summary="Get a single ticket by ID")
 async def get_ticket(
     ticket_id: str,
@@ -104,7 +164,7 @@ async def get_ticket(
             logging.warning(f"Tiquete {ticket_id} no encontrado.")
             raise HTTPException(status_code=404, detail="Ticket not found")
         logging.info(f"Tiquete {ticket_id} encontrado y devuelto.")
-        return ticket
+        return PydanticJSONResponse(ticket)
     except Exception as e:
         logging.error(f"Error 500 inesperado al obtener tiquete {ticket_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error getting ticket: {str(e)}")
@@ -113,7 +173,6 @@ async def get_ticket(
 @router.post("/", response_model=TicketInfo, status_code=status.HTTP_201_CREATED)
 async def create_ticket(
     data: TicketCreateRequest,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -125,45 +184,12 @@ async def create_ticket(
     logging.info(f"Datos recibidos del frontend: {data.model_dump_json(indent=2)}")
 
     try:
-        new_ticket_orm = await create_ticket_service(data, db, current_user)
-
-        await db.refresh(new_ticket_orm, ['raffle'])
-
-        if new_ticket_orm.status == 'paid':
-            logging.info(f"Añadiendo tarea de fondo para enviar notificación de WhatsApp al tiquete {new_ticket_orm.id}.")
-            background_tasks.add_task(
-                send_purchase_notification, 
-                db, # Se pasa la sesión a la tarea de fondo
-                new_ticket_orm.phone, 
-                new_ticket_orm.name, 
-                new_ticket_orm.raffle_id,
-                new_ticket_orm.id
-            )
-
-        raffle = new_ticket_orm.raffle
-        formatted_response = TicketInfo(
-            id=new_ticket_orm.id,
-            name=new_ticket_orm.name,
-            phone=new_ticket_orm.phone,
-            raffle_id=new_ticket_orm.raffle_id,
-            status=new_ticket_orm.status,
-            responsible=new_ticket_orm.user.username if new_ticket_orm.user else None,
-            created_at=new_ticket_orm.created_at,
-            updated_at=new_ticket_orm.updated_at,
-            payment_type=new_ticket_orm.payment_type,
-            payment_date=new_ticket_orm.payment_date,
-            payment_proof_url=new_ticket_orm.payment_proof_url,
-            numbers=[n.number for n in new_ticket_orm.numbers],
-            number_ids=[n.id for n in new_ticket_orm.numbers],
-            raffle_name=raffle.name,
-            raffle_status=raffle.status,
-            raffle_short_id=raffle.short_id,
-            raffle_end_date=raffle.end_date,
-            raffle_price=raffle.price
-        )
-        
+        # El servicio devuelve el TicketInfo construido con las filas de la inserción.
+        # La notificación de WhatsApp ya quedó en la bandeja de salida dentro de la transacción.
+        formatted_response = await create_ticket_service(data, db, current_user)
+
         logging.info(f"Tiquete {formatted_response.id} creado exitosamente. Enviando respuesta al frontend.")
-        return formatted_response
+        return PydanticJSONResponse(formatted_response, status_code=status.HTTP_201_CREATED)
 
     except ValueError as ve:
         logging.warning(f"Error de validación (400) al crear tiquete: {ve}")
@@ -173,76 +199,68 @@ async def create_ticket(
         raise HTTPException(status_code=500, detail=f"Error al crear el tiquete: {str(e)}")
 
 
+# --- ENDPOINT DE ASIGNACIÓN ALEATORIA ATÓMICA ---
+# Elige N números disponibles y los reserva para un tiquete nuevo en la misma transacción,
+# en lugar de pedir números aleatorios y comprarlos en una segunda petición.
+@router.post("/allocate", response_model=TicketInfo, status_code=status.HTTP_201_CREATED, summary="Allocate random available numbers into a new ticket")
+async def allocate_random_ticket(
+    data: TicketAllocateRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    logging.info(f"Petición recibida en POST /tickets/allocate por el usuario '{current_user.username}'.")
+    try:
+        allocated_ticket = await allocate_random_ticket_service(data, db, current_user)
+        return PydanticJSONResponse(allocated_ticket, status_code=status.HTTP_201_CREATED)
+    except ValueError as ve:
+        logging.warning(f"Error de validación (400) al asignar números aleatorios: {ve}")
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logging.error(f"Error inesperado (500) al asignar números aleatorios: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error al asignar los números: {str(e)}")
+
+
 # --- ENDPOINT PARA GENERAR IMAGEN DEL TIQUETE ---
 # CAMBIO: Se crea un endpoint para generar una imagen del tiquete.
-# CAMBIO: Se usa una función de generación de imagen y se maneja la limpieza del archivo temporal.
-# CAMBIO: Se devuelve la imagen generada como FileResponse.
+# CAMBIO: El render corre en un pool de procesos acotado y la imagen se devuelve en memoria,
+# sin archivo temporal; el event loop del worker no se bloquea mientras Pillow dibuja.
+# CAMBIO: Los comprobantes se cachean por el hash de sus campos (memoria y disco) y se
+# revalidan con un ETag fuerte: una vista repetida no renderiza nada.
+# CAMBIO: Variantes de tamaño (full, preview, thumb) y formato (JPEG o WebP según Accept),
+# todas derivadas del mismo render maestro.
 @router.get("/{ticket_id}/image", summary="Genera una imagen para un tiquete específico")
 async def get_ticket_image(
     ticket_id: str,
-    background_tasks: BackgroundTasks,
+    variant: Literal["full", "preview", "thumb"] = Query("full", description="full (plantilla completa), preview (720 px) o thumb (240 px)"),
+    image_format: Literal["auto", "jpeg", "webp"] = Query("auto", alias="format", description="'auto' usa WebP si el encabezado Accept lo incluye"),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Obtiene los datos de un tiquete y su rifa asociada para generar una imagen
     visual que sirve como comprobante para el comprador.
     """
-    temp_path = None
     try:
-        # La consulta a la base de datos ya es eficiente y está bien
-        query = (
-            select(Ticket)
-            .options(selectinload(Ticket.raffle), selectinload(Ticket.numbers))
-            .where(Ticket.id == ticket_id)
-        )
-        result = await db.execute(query)
-        ticket = result.scalars().first()
-
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Ticket not found")
-
-        # --- DICCIONARIO AJUSTADO CON LA INFORMACIÓN COMPLETA ---
-        ticket_data_for_image = {
-            "ticket_id": ticket.id,
-            "buyer_name": ticket.name,
-            "raffle_name": ticket.raffle.name,
-            
-            # Ajuste: Usamos payment_date para mayor precisión y lo formateamos.
-            "purchase_date": ticket.payment_date.strftime("%d de %B de %Y") if ticket.payment_date else "N/A",
-            
-            # Nuevo: Añadimos la fecha del sorteo, también formateada.
-            "draw_date": ticket.raffle.end_date.strftime("%d de %B de %Y") if ticket.raffle.end_date else "Por definir",
-
-            # Ajuste: El total pagado es el precio de la rifa.
-            "total_price": ticket.raffle.price,
-
-            # Esto ya estaba correcto.
-            "numbers": [n.number for n in ticket.numbers]
-        }
-        # --- FIN DE LOS AJUSTES ---
-
-        # El resto de la función para generar el archivo y devolverlo es correcta.
-        img = generate_raffle_image(ticket_data_for_image)
-        
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as temp_file:
-            temp_path = temp_file.name
-            img.save(temp_path, "JPEG", quality=95)
-        
-        background_tasks.add_task(cleanup_temp_file, temp_path)
-        
-        return FileResponse(
-            temp_path,
-            media_type="image/jpeg",
-            filename=f"Rifa_{ticket.raffle.name.replace(' ', '_')}_Ticket_{ticket.id[:8]}.jpg"
-        )
-        
+        chosen_format = negotiate_image_format(image_format, accept)
+        receipt = await get_ticket_receipt(db, ticket_id, if_none_match, variant, chosen_format)
+    except HTTPException:
+        # 503 (cola llena) y 504 (tiempo agotado) del pool de render
+        raise
     except Exception as e:
-        # El manejo de errores y limpieza de archivos temporales es correcto.
-        if temp_path and os.path.exists(temp_path):
-            cleanup_temp_file(temp_path)
-        # Es buena idea loggear el error real para debugging
-        # logging.error(f"Error al generar imagen para ticket {ticket_id}: {e}")
+        logging.error(f"Error al generar imagen para ticket {ticket_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error interno al generar la imagen: {str(e)}")
+
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    headers = {"ETag": receipt.etag, "Cache-Control": "private, no-cache"}
+    if image_format == "auto":
+        # La representación depende de Accept: los caches intermedios deben distinguirla.
+        headers["Vary"] = "Accept"
+    if receipt.body is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    headers["Content-Disposition"] = attachment_disposition(receipt.filename)
+    return Response(content=receipt.body, media_type=receipt.media_type, headers=headers)
     
 
 # --- NUEVO ENDPOINT PARA SUBIR COMPROBANTE ---
@@ -308,6 +326,41 @@ async def delete_payment_proof(
 
 
 # --- ENDPOINT PARA DATOS DEL DASHBOARD (VERSIÓN CORREGIDA) ---
+# --- ANALÍTICA DE VENTAS ---
+# Se leen del rollup diario 'sales_daily_rollup', que se mantiene en la misma transacción
+# que cada cambio de estado de un tiquete; ya no se agrupa 'tickets' en cada petición.
+@router.get("/sales/analytics", response_model=SalesAnalyticsResponse, summary="Paid sales bucketed by day, week or month")
+async def get_sales_analytics(
+    granularity: Literal["day", "week", "month"] = Query("day"),
+    date_from: Optional[date] = Query(None, description="Inclusivo; por defecto el inicio del mes de 'date_to'"),
+    date_to: Optional[date] = Query(None, description="Inclusivo; por defecto hoy"),
+    group_by: Optional[str] = Query(None, description="Dimensiones separadas por coma: seller, raffle, payment_type"),
+    raffle_id: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    payment_type: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        return await get_sales_analytics_service(
+            db, granularity, date_from, date_to, group_by,
+            raffle_id=raffle_id, user_id=user_id, payment_type=payment_type,
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+
+
+# Toma un bloqueo exclusivo sobre sales_daily_rollup que frena las compras pagadas mientras
+# dura: solo para operadores (ver MAINTENANCE_ENDPOINTS_ENABLED). Ya se ejecuta al arrancar.
+@router.post("/sales/rollup/rebuild", summary="Rebuild the daily sales rollup from tickets (operators only)")
+async def rebuild_sales_rollup_endpoint(
+    date_from: Optional[date] = Query(None, description="Reconstruir solo desde esta fecha de pago"),
+    current_user: User = Depends(require_maintenance_operator)
+):
+    logging.info(f"Reconstrucción del rollup de ventas solicitada por '{current_user.username}'.")
+    return await rebuild_sales_rollup_job(date_from)
+
+
 @router.get("/sales/monthly_summary", summary="Get sales summary for the current month by user")
 async def get_monthly_sales_summary(
     db: AsyncSession = Depends(get_db),
@@ -317,33 +370,4 @@ async def get_monthly_sales_summary(
     Devuelve un resumen de los tiquetes 'paid' vendidos en el mes actual,
     agrupados por día de PAGO y por vendedor (usuario).
     """
-    today = date.today()
-    start_of_month = today.replace(day=1)
-
-    # --- CONSULTA AJUSTADA ---
-    # Ahora se selecciona, agrupa y filtra usando 'Ticket.payment_date'.
-    # Como 'payment_date' ya es de tipo Date, no se necesita el 'cast'.
-    query = (
-        select(
-            Ticket.payment_date.label('sale_date'),
-            User.username.label('seller'),
-            func.count(Ticket.id).label('tickets_sold')
-        )
-        .join(User, Ticket.user_id == User.id)
-        .where(
-            Ticket.status == 'paid',
-            Ticket.payment_date != None,  # Se añade filtro para evitar fechas nulas
-            Ticket.payment_date >= start_of_month
-        )
-        .group_by(
-            Ticket.payment_date,
-            User.username
-        )
-        .order_by(Ticket.payment_date)
-    )
-    # --- FIN DEL AJUSTE ---
-
-    result = await db.execute(query)
-    sales_data = [row._asdict() for row in result.all()]
-    
-    return sales_data
\ No newline at end of file
+    return await get_monthly_sales_summary_service(db)
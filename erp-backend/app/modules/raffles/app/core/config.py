@@ -27,6 +27,85 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 1 week
     ALGORITHM: str = "HS256"
 
+    # Índice de disponibilidad en memoria (bitmap por rifa)
+    # Edad máxima antes de reconstruirlo; acota el desfase entre workers.
+    AVAILABILITY_INDEX_MAX_AGE_SECONDS: int = 30
+    # Máximo de números aleatorios por solicitud (sugerencias y asignación aleatoria).
+    RANDOM_NUMBERS_MAX_COUNT: int = 1000
+
+    # Barrido de reservas vencidas ('pending' con expire_at en el pasado)
+    RESERVATION_SWEEPER_ENABLED: bool = True
+    RESERVATION_SWEEP_INTERVAL_SECONDS: int = 60
+    RESERVATION_SWEEP_BATCH_SIZE: int = 200
+    RESERVATION_SWEEP_MAX_BATCHES: int = 50
+
+    # Cache de respuestas (ETag) del listado y del detalle de rifas, por worker
+    RAFFLE_RESPONSE_CACHE_MAX_ENTRIES: int = 256
+
+    # Cache de metadatos de rifas (dígitos, excluidos, precio, estado...) por worker.
+    # El TTL acota el desfase con las ediciones hechas en otros workers.
+    RAFFLE_META_CACHE_TTL_SECONDS: int = 15
+    RAFFLE_META_CACHE_MAX_ENTRIES: int = 512
+
+    # Cache de usuarios autenticados (por 'sub' del token) por worker.
+    # El TTL acota cuánto tarda otro worker en ver un usuario desactivado.
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 1024
+
+    # Hash y verificación de contraseñas (bcrypt) en un pool de hilos propio, por worker.
+    # Operaciones simultáneas como máximo y espera máxima en cola antes de responder 503.
+    PASSWORD_HASH_MAX_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0
+
+    # Endpoints de mantenimiento (reconstrucciones que bloquean tablas). Apagados por defecto:
+    # lo normal es que se ejecuten al arrancar. Solo los usuarios listados (separados por
+    # comas) pueden llamarlos cuando están encendidos.
+    MAINTENANCE_ENDPOINTS_ENABLED: bool = False
+    MAINTENANCE_OPERATORS: str = ""
+
+    # Render de comprobantes en un pool de procesos, por worker.
+    # Renders en curso o en cola antes de responder 503, y tiempo máximo por render (504).
+    RECEIPT_RENDER_PROCESSES: int = 2
+    RECEIPT_RENDER_MAX_PENDING: int = 32
+    RECEIPT_RENDER_TIMEOUT_SECONDS: float = 10.0
+
+    # Cache de comprobantes renderizados: memoria por worker (en bytes) y disco compartido.
+    RECEIPT_CACHE_DIR: str = "cache/receipts"
+    RECEIPT_CACHE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
+    # Poda del disco: tope total, antigüedad máxima sin uso y cada cuánto se revisa.
+    RECEIPT_CACHE_DISK_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    RECEIPT_CACHE_DISK_MAX_AGE_SECONDS: int = 7 * 24 * 3600
+    RECEIPT_CACHE_PRUNE_INTERVAL_SECONDS: int = 600
+    # Tiquetes cuyo último hash recuerda cada worker para limpiar versiones viejas al guardar.
+    RECEIPT_CACHE_TRACKED_TICKETS: int = 50_000
+
+    # Exportación masiva de comprobantes: renders en vuelo por exportación (ventana deslizante).
+    RECEIPT_EXPORT_WINDOW: int = 4
+
+    # Cliente de la Graph API de WhatsApp (una sesión HTTP compartida por worker).
+    # La URL base se puede apuntar a scripts/mock_graph_api.py para pruebas locales.
+    WHATSAPP_GRAPH_API_BASE_URL: str = "https://graph.facebook.com"
+    WHATSAPP_ACCESS_TOKEN: str = ""  # Vacío: se usa el token configurado en send_whatsapp_message.py
+    WHATSAPP_PHONE_NUMBER_ID: str = ""
+    WHATSAPP_MAX_CONNECTIONS: int = 20
+    WHATSAPP_MAX_CONNECTIONS_PER_HOST: int = 10
+    WHATSAPP_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    WHATSAPP_READ_TIMEOUT_SECONDS: float = 10.0
+
+    # Bandeja de salida de notificaciones: la compra solo inserta la fila y el despachador
+    # la entrega en segundo plano. El ritmo y la concurrencia son por worker (el total es
+    # el valor por el número de workers de gunicorn).
+    NOTIFICATION_DISPATCHER_ENABLED: bool = True
+    NOTIFICATION_POLL_INTERVAL_SECONDS: float = 1.0
+    NOTIFICATION_BATCH_SIZE: int = 50
+    NOTIFICATION_CONCURRENCY: int = 10
+    NOTIFICATION_RATE_PER_SECOND: float = 20.0
+    NOTIFICATION_MAX_ATTEMPTS: int = 8
+    NOTIFICATION_BACKOFF_BASE_SECONDS: float = 5.0
+    NOTIFICATION_BACKOFF_MAX_SECONDS: float = 900.0
+    # Tiempo que una fila reclamada queda reservada para el worker que la está enviando.
+    NOTIFICATION_LEASE_SECONDS: float = 60.0
+
     # CORS
     BACKEND_CORS_ORIGINS: str = "http://localhost:3000"
 
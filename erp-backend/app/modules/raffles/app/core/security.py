@@ -1,3 +1,7 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -12,6 +16,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.db.database import get_db
 from app.db.models import User
+from app.services.principal_cache import Principal, principal_cache
 
 # --- CONFIGURACIÓN DE PASSLIB ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -23,6 +28,75 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     """Genera el hash de una contraseña."""
     return pwd_context.hash(password)
+
+
+# --- BCRYPT FUERA DEL EVENT LOOP ---
+# Cada verificación o hash de bcrypt toma cientos de milisegundos de CPU. Dentro de un handler
+# async bloquea todo el worker (y con él las compras en curso), así que se ejecutan en un pool
+# de hilos propio y pequeño (bcrypt libera el GIL). El semáforo limita cuántas operaciones hay
+# en curso por worker; las demás esperan su turno hasta un tiempo máximo y luego se rechazan
+# con 503, para que una ráfaga de logins no acapare la CPU que necesitan las compras.
+class PasswordHasher:
+    def __init__(self, max_workers: int, queue_timeout_seconds: float):
+        self.max_workers = max_workers
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(max_workers)
+        self._waiting = 0
+        self.metrics = {"verified": 0, "hashed": 0, "rejected": 0, "total_wait_ms": 0.0, "total_run_ms": 0.0}
+
+    async def _run(self, func, *args):
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            self.metrics["rejected"] += 1
+            logging.warning("Operación de contraseña rechazada: demasiados logins en curso en este worker.")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        finally:
+            self._waiting -= 1
+
+        started = time.perf_counter()
+        self.metrics["total_wait_ms"] += (started - queued_at) * 1000
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.metrics["total_run_ms"] += (time.perf_counter() - started) * 1000
+            self._slots.release()
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        result = await self._run(verify_password, plain_password, hashed_password)
+        self.metrics["verified"] += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        result = await self._run(get_password_hash, password)
+        self.metrics["hashed"] += 1
+        return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_metrics(self) -> dict:
+        completed = self.metrics["verified"] + self.metrics["hashed"]
+        return {
+            **self.metrics,
+            "avg_wait_ms": round(self.metrics["total_wait_ms"] / completed, 2) if completed else None,
+            "avg_run_ms": round(self.metrics["total_run_ms"] / completed, 2) if completed else None,
+            "waiting": self._waiting,
+            "max_workers": self.max_workers,
+        }
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_MAX_WORKERS,
+    queue_timeout_seconds=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+)
 # ---------------------------------
 
 # La URL del token ahora se construye con la ruta de la API desde la configuración
@@ -44,7 +118,7 @@ async def authenticate_user(db: AsyncSession, username: str, password: str) -> O
     Autentica un usuario. Si es exitoso, devuelve el objeto User.
     """
     user = await get_user(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await password_hasher.verify(password, user.hashed_password):
         return None  # Se devuelve None en lugar de False para más claridad
     return user
 
@@ -66,12 +140,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-# MODIFICADO: Ahora depende de la sesión de la BD y consulta la BD real
+# MODIFICADO: El usuario se resuelve desde el cache de principals; solo va a la BD en un fallo
+# (la sesión no abre conexión hasta la primera consulta, así que un acierto no toca la BD).
 async def get_current_user(
     db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
+) -> Principal:
     """
-    Decodifica el token JWT para obtener el usuario actual.
+    Decodifica el token JWT para obtener el usuario actual. Los usuarios inactivos se rechazan.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -87,7 +162,18 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = await get_user(db, username) # Se consulta la BD real
-    if user is None:
+    user = await principal_cache.get(db, username)
+    if user is None or not user.is_active:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+
+# Los endpoints de mantenimiento bloquean tablas que usan las compras: solo operadores.
+async def require_maintenance_operator(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if not settings.MAINTENANCE_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    operators = {name.strip() for name in settings.MAINTENANCE_OPERATORS.split(",") if name.strip()}
+    if current_user.username not in operators:
+        logging.warning(f"Usuario '{current_user.username}' sin permiso para un endpoint de mantenimiento.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operator access required")
+    return current_user
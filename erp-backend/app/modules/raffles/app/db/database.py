@@ -1,5 +1,9 @@
+import logging
+from typing import Callable
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 # Se elimina la importación de declarative_base
 from app.core.config import settings
 
@@ -14,6 +18,33 @@ async_session_local = sessionmaker(
 
 # Se elimina la línea 'Base = declarative_base()' de este archivo.
 
+# --- ACCIONES DESPUÉS DEL COMMIT ---
+# Los servicios no hacen commit (lo hace get_db al terminar la petición). Lo que refleja la
+# base de datos fuera de ella (p. ej. el bitmap de disponibilidad en memoria) se registra
+# aquí y solo se aplica si la transacción se confirma; si se revierte, se descarta.
+_ON_COMMIT_KEY = "on_commit_callbacks"
+
+
+def on_commit(db: AsyncSession, callback: Callable[[], None]):
+    """Ejecuta 'callback' (síncrono) cuando se confirme la transacción en curso de 'db'."""
+    db.sync_session.info.setdefault(_ON_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit_callbacks(session: Session):
+    for callback in session.info.pop(_ON_COMMIT_KEY, []):
+        try:
+            callback()
+        except Exception as e:
+            # El commit ya ocurrió: un error aquí no debe convertir la petición en un 500.
+            logging.error(f"Error en una acción posterior al commit: {e}", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_commit_callbacks(session: Session):
+    session.info.pop(_ON_COMMIT_KEY, None)
+
+
 async def get_db():
     db = async_session_local()
     try:
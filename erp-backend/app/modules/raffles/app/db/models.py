@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     DateTime,
     ForeignKey,
@@ -8,7 +9,10 @@ from sqlalchemy import (
     Enum,
     Text,
     Boolean,
-    JSON
+    JSON,
+    Index,
+    UniqueConstraint,
+    text
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -71,6 +75,9 @@ class Ticket(Base):
     status = Column(String, default="pending")
     name = Column(String(100)) # Longitud recomendada
     phone = Column(String(20)) # Longitud recomendada
+    # Columnas de búsqueda (ver utils/normalization.py), con índices de trigramas.
+    phone_normalized = Column(String(20), nullable=True)
+    name_search = Column(String(100), nullable=True)
     
     # ---  CAMPOS DE PAGO AÑADIDOS ---
     payment_type = Column(Enum(PaymentType, native_enum=False), nullable=True)
@@ -85,16 +92,148 @@ class Ticket(Base):
     numbers_snapshot = Column(JSONB) # Añadido para almacenar los números comprados en el ticket
     numbers = relationship("Number", back_populates="ticket", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Índices para la paginación keyset del listado: uno global y uno por cada filtro selectivo.
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        Index("ix_tickets_raffle_created_at_id", "raffle_id", "created_at", "id"),
+        Index("ix_tickets_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_tickets_status_created_at_id", "status", "created_at", "id"),
+        # Búsqueda parcial de participantes (LIKE '%...%') con pg_trgm.
+        Index("ix_tickets_name_search_trgm", "name_search", postgresql_using="gin", postgresql_ops={"name_search": "gin_trgm_ops"}),
+        Index("ix_tickets_phone_normalized_trgm", "phone_normalized", postgresql_using="gin", postgresql_ops={"phone_normalized": "gin_trgm_ops"}),
+    )
+
 
 class Number(Base):
     __tablename__ = "numbers"
 
     id = Column(Integer, primary_key=True, index=True)
     raffle_id = Column(String, ForeignKey("raffles.id"), nullable=False)
-    ticket_id = Column(String, ForeignKey("tickets.id"), nullable=True)
+    ticket_id = Column(String, ForeignKey("tickets.id"), nullable=True, index=True)
     number = Column(String, nullable=False)
     status = Column(String, default="available", nullable=False)
     expire_at = Column(DateTime(timezone=True), nullable=True)
 
     ticket = relationship("Ticket", back_populates="numbers")
     raffle = relationship("Raffle")
+
+    __table_args__ = (
+        # Un número solo puede existir una vez por rifa: base de la compra atómica con upsert.
+        UniqueConstraint("raffle_id", "number", name="uq_numbers_raffle_number"),
+        # Índice parcial para que el barrido de reservas vencidas no recorra toda la tabla.
+        Index("ix_numbers_reserved_expire_at", "expire_at", postgresql_where=text("status = 'reserved'")),
+    )
+
+
+class RaffleStats(Base):
+    """
+    Contadores por rifa mantenidos en la misma transacción que cada cambio de estado de
+    un tiquete, para que el listado y el detalle no agreguen la tabla 'tickets'.
+    """
+    __tablename__ = "raffle_stats"
+
+    raffle_id = Column(String, ForeignKey("raffles.id", ondelete="CASCADE"), primary_key=True)
+    paid_tickets = Column(Integer, nullable=False, default=0, server_default="0")
+    pending_tickets = Column(Integer, nullable=False, default=0, server_default="0")
+    cancelled_tickets = Column(Integer, nullable=False, default=0, server_default="0")
+    participants = Column(Integer, nullable=False, default=0, server_default="0")
+    revenue = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Versión de la rifa para las respuestas cacheadas: sube con cada cambio de la rifa o de sus tiquetes.
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class RaffleParticipant(Base):
+    """
+    Tiquetes activos (pagados o pendientes) por nombre de participante. Permite mantener
+    'participants' de RaffleStats de forma incremental: cuenta de 0 a 1 suma un participante,
+    de 1 a 0 lo resta.
+    """
+    __tablename__ = "raffle_participants"
+
+    raffle_id = Column(String, ForeignKey("raffles.id", ondelete="CASCADE"), primary_key=True)
+    name = Column(String(100), primary_key=True)
+    active_tickets = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class SalesDailyRollup(Base):
+    """
+    Ventas pagadas pre-agregadas por día de pago, rifa, vendedor y tipo de pago. Se mantiene
+    en la misma transacción que cada cambio de estado de tiquete; las consultas de analítica
+    (día, semana, mes) leen de aquí y no de 'tickets'.
+    """
+    __tablename__ = "sales_daily_rollup"
+
+    sale_date = Column(Date, primary_key=True)
+    raffle_id = Column(String, ForeignKey("raffles.id", ondelete="CASCADE"), primary_key=True)
+    # 0 = tiquete sin vendedor; '' = sin tipo de pago (las columnas de la llave no admiten NULL).
+    user_id = Column(Integer, primary_key=True, default=0)
+    payment_type = Column(String, primary_key=True, default="")
+    tickets_sold = Column(Integer, nullable=False, default=0, server_default="0")
+    revenue = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Filtros por vendedor o rifa dentro de un rango de fechas.
+        Index("ix_sales_daily_rollup_user_date", "user_id", "sale_date"),
+        Index("ix_sales_daily_rollup_raffle_date", "raffle_id", "sale_date"),
+    )
+
+
+class ReceiptExportJob(Base):
+    """
+    Exportación masiva de comprobantes de una rifa (ZIP en streaming). El avance se guarda
+    aquí para que cualquier worker pueda reportarlo y para reanudar una descarga cortada
+    desde 'resume_cursor' (llave del último tiquete escrito completo en el ZIP). Los
+    tiquetes cuyo render falló quedan en 'failed_ticket_ids' y se reintentan al reanudar.
+    """
+    __tablename__ = "receipt_export_jobs"
+
+    id = Column(String, primary_key=True)
+    raffle_id = Column(String, ForeignKey("raffles.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="running")  # running, completed, interrupted, failed
+    total_tickets = Column(Integer, nullable=False, default=0)
+    exported_tickets = Column(Integer, nullable=False, default=0)
+    failed_tickets = Column(Integer, nullable=False, default=0)
+    failed_ticket_ids = Column(JSONB, nullable=False, default=list)
+    resume_cursor = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class NotificationOutbox(Base):
+    """
+    Bandeja de salida de notificaciones (patrón outbox). La fila se inserta en la misma
+    transacción de la compra, así que una notificación existe si y solo si el tiquete quedó
+    guardado; el despachador (services/notification_outbox.py) la entrega después.
+    Estados: pending -> sending -> sent, o dead cuando se agotan los reintentos o el error
+    no es recuperable. Una fila 'sending' con 'locked_until' vencido se vuelve a reclamar
+    (el worker que la tenía murió a mitad del envío).
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)  # purchase
+    ticket_id = Column(String, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False, index=True)
+    recipient = Column(String(20), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    last_status_code = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+    provider_message_id = Column(String, nullable=True)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Índice parcial para el reclamo de lotes: solo las filas que aún se pueden entregar.
+        Index(
+            "ix_notification_outbox_due",
+            "next_attempt_at",
+            postgresql_where=text("status IN ('pending', 'sending')"),
+        ),
+    )
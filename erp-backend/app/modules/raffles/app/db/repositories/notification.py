@@ -0,0 +1,130 @@
+# app/db/repositories/notification.py
+
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, insert, func, or_, and_
+
+from app.db.models import NotificationOutbox
+
+
+async def enqueue_notification(db: AsyncSession, kind: str, ticket_id: str, recipient: str, payload: dict):
+    """Inserta la notificación en la transacción del llamador (no hace commit)."""
+    await db.execute(
+        insert(NotificationOutbox).values(
+            kind=kind,
+            ticket_id=ticket_id,
+            recipient=recipient,
+            payload=payload,
+            status="pending",
+        )
+    )
+
+
+async def claim_notification_batch(db: AsyncSession, batch_size: int, lease_seconds: float, max_attempts: int) -> list:
+    """
+    Reclama hasta 'batch_size' notificaciones vencidas y las marca 'sending' con un lease.
+    Con FOR UPDATE SKIP LOCKED varios workers reclaman a la vez sin tomar la misma fila;
+    el lease evita que otro worker la reintente mientras este la está enviando.
+    Las filas cuyo lease venció en el último intento permitido pasan a 'dead' en lugar de
+    volver a reclamarse.
+    Retorna filas (id, recipient, payload, attempts) con 'attempts' ya incrementado.
+    """
+    await db.execute(
+        update(NotificationOutbox)
+        .where(
+            NotificationOutbox.status == "sending",
+            NotificationOutbox.locked_until < func.now(),
+            NotificationOutbox.attempts >= max_attempts,
+        )
+        .values(status="dead", locked_until=None, last_error="Lease vencido en el último intento")
+    )
+    due = (
+        select(NotificationOutbox.id)
+        .where(
+            NotificationOutbox.attempts < max_attempts,
+            or_(
+                and_(NotificationOutbox.status == "pending", NotificationOutbox.next_attempt_at <= func.now()),
+                and_(NotificationOutbox.status == "sending", NotificationOutbox.locked_until < func.now()),
+            ),
+        )
+        .order_by(NotificationOutbox.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("due_notifications")
+    )
+    result = await db.execute(
+        update(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(select(due.c.id)))
+        .values(
+            status="sending",
+            attempts=NotificationOutbox.attempts + 1,
+            locked_until=func.now() + timedelta(seconds=lease_seconds),
+        )
+        .returning(
+            NotificationOutbox.id,
+            NotificationOutbox.recipient,
+            NotificationOutbox.payload,
+            NotificationOutbox.attempts,
+        )
+    )
+    return result.all()
+
+
+def _still_claimed(notification_id: int, attempts: int):
+    """
+    Condición para escribir el resultado: la fila sigue en 'sending' con el mismo intento que
+    se reclamó. Si el lease venció y otro worker la reclamó, 'attempts' ya no coincide y el
+    resultado viejo no pisa el nuevo.
+    """
+    return and_(
+        NotificationOutbox.id == notification_id,
+        NotificationOutbox.status == "sending",
+        NotificationOutbox.attempts == attempts,
+    )
+
+
+async def mark_notification_sent(
+    db: AsyncSession,
+    notification_id: int,
+    attempts: int,
+    status_code: int | None,
+    message_id: str | None
+) -> bool:
+    """Devuelve False si la fila ya no pertenecía a este intento."""
+    result = await db.execute(
+        update(NotificationOutbox)
+        .where(_still_claimed(notification_id, attempts))
+        .values(
+            status="sent",
+            locked_until=None,
+            last_status_code=status_code,
+            last_error=None,
+            provider_message_id=message_id,
+            sent_at=func.now(),
+        )
+    )
+    return result.rowcount == 1
+
+
+async def mark_notification_failed(
+    db: AsyncSession,
+    notification_id: int,
+    attempts: int,
+    status_code: int | None,
+    error: str | None,
+    retry_at: datetime | None
+) -> bool:
+    """
+    Programa el reintento en 'retry_at', o la deja en 'dead' si es None.
+    Devuelve False si la fila ya no pertenecía a este intento.
+    """
+    values = {"locked_until": None, "last_status_code": status_code, "last_error": error}
+    if retry_at is None:
+        values["status"] = "dead"
+    else:
+        values.update(status="pending", next_attempt_at=retry_at)
+    result = await db.execute(
+        update(NotificationOutbox).where(_still_claimed(notification_id, attempts)).values(**values)
+    )
+    return result.rowcount == 1
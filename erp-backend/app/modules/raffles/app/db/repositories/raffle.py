@@ -2,9 +2,9 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
-from app.modules.raffles.app.db.models import Raffle, Number
-from sqlalchemy import select, func, text, String, and_
-from app.modules.raffles.app.db.models import Raffle, Number
+from sqlalchemy import select, func, text, String, and_, exists, true, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from app.db.models import Raffle, Number, Ticket, User, RaffleStats
 
 
 async def get_raffle_by_id(db: AsyncSession, raffle_id: str):
@@ -54,56 +54,172 @@ async def is_number_available(db: AsyncSession, raffle_id: str, number_str: str)
     # Si el número existe, su disponibilidad depende de su estado.
     return existing_number.status == 'available'
 
-# --- FUNCIÓN PARA OBTENER NÚMEROS ALEATORIOS DISPONIBLES ---
-# Esta función obtiene una cantidad específica de números aleatorios disponibles para una rifa.
-# Utiliza una consulta SQL optimizada para evitar conflictos de concurrencia.
-# Devuelve una lista de números disponibles.
+# --- FUNCIÓN PARA VERIFICAR LA DISPONIBILIDAD DE VARIOS NÚMEROS ---
+# Resuelve el estado de una lista de números con una sola consulta: la rifa (dígitos y
+# excluidos) se cruza con sus filas de 'numbers' restringidas a los números pedidos.
+async def get_numbers_status(db: AsyncSession, raffle_id: str, numbers: list[str]) -> dict[str, str] | None:
+    """
+    Devuelve un mapa número -> estado ('available', 'reserved', 'assigned', 'excluded'
+    o 'invalid'), o None si la rifa no existe.
+    """
+    requested = list(dict.fromkeys(numbers))
+    query = (
+        select(Raffle.dijits_per_number, Raffle.excluded_numbers, Number.number, Number.status)
+        .outerjoin(Number, and_(Number.raffle_id == Raffle.id, Number.number.in_(requested)))
+        .where(Raffle.id == raffle_id)
+    )
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return None
+
+    digits = rows[0].dijits_per_number
+    excluded = set(rows[0].excluded_numbers or [])
+    existing = {row.number: row.status for row in rows if row.number is not None}
+
+    statuses = {}
+    for number_str in requested:
+        if len(number_str) != digits or not number_str.isdigit():
+            statuses[number_str] = 'invalid'
+        elif number_str in excluded:
+            statuses[number_str] = 'excluded'
+        else:
+            # Un número sin fila nunca ha sido tocado y por lo tanto está disponible.
+            statuses[number_str] = existing.get(number_str, 'available')
+    return statuses
+
+
+# --- METADATOS DE LA RIFA PARA EL CACHE EN MEMORIA ---
+async def get_raffle_meta_row(db: AsyncSession, raffle_id: str):
+    """Lee solo las columnas que usan la compra y la disponibilidad; None si la rifa no existe."""
+    result = await db.execute(
+        select(
+            Raffle.id,
+            Raffle.short_id,
+            Raffle.name,
+            Raffle.status,
+            Raffle.dijits_per_number,
+            Raffle.numbers_per_ticket,
+            Raffle.excluded_numbers,
+            Raffle.price,
+            Raffle.end_date,
+        ).where(Raffle.id == raffle_id)
+    )
+    return result.first()
 
-# --- FUNCIÓN REESCRITA: Ahora usa el constructor de consultas de SQLAlchemy ---
-async def query_random_available_numbers(
-    db: AsyncSession,
-    raffle_id: str,
-    count: int
-) -> list[str]:
+
+# --- FUNCIONES DE SOPORTE PARA EL ÍNDICE DE DISPONIBILIDAD EN MEMORIA ---
+# El universo de números ya no se genera en SQL: el bitmap de 'services/availability_index.py'
+# se construye con estas consultas, que solo leen las filas existentes de la rifa.
+async def get_raffle_index_source(db: AsyncSession, raffle_id: str) -> tuple[int, list[str], list[str]] | None:
     """
-    Obtiene 'count' números aleatorios y disponibles para una rifa,
-    utilizando el constructor de consultas de SQLAlchemy para mayor seguridad y compatibilidad.
+    Devuelve (dígitos, números excluidos, números no disponibles) de una rifa,
+    o None si la rifa no existe.
     """
-    raffle = await db.get(Raffle, raffle_id)
-    if not raffle:
-        raise ValueError("Rifa no encontrada.")
+    raffle_result = await db.execute(
+        select(Raffle.dijits_per_number, Raffle.excluded_numbers).where(Raffle.id == raffle_id)
+    )
+    raffle_row = raffle_result.first()
+    if raffle_row is None:
+        return None
 
-    digits = raffle.dijits_per_number
-    max_num = (10 ** digits) - 1
+    taken_result = await db.execute(
+        select(Number.number).where(Number.raffle_id == raffle_id, Number.status != 'available')
+    )
+    return raffle_row.dijits_per_number, raffle_row.excluded_numbers, list(taken_result.scalars().all())
 
-    # 1. Se crea una subconsulta que genera todos los números posibles en memoria.
-    #    Esto es el equivalente a la cláusula `generate_series` en SQL.
-    series = select(
-        func.lpad(func.generate_series(0, max_num).cast(String), digits, '0').label('number')
-    ).subquery('number_series')
 
-    # 2. Se construye la consulta principal.
-    query = (
-        select(series.c.number)
-        # Se cruza el universo de números con los ya vendidos/reservados.
-        .outerjoin(Number, and_(Number.raffle_id == raffle_id, Number.number == series.c.number))
-        # Se filtra para quedarse solo con los que NO están en la tabla 'numbers'.
-        .where(Number.id == None)
+async def get_taken_numbers(db: AsyncSession, raffle_id: str, numbers: list[str]) -> set[str]:
+    """
+    De una lista de candidatos, devuelve los que ya tienen una fila no disponible
+    (reservados, asignados o excluidos). Es una búsqueda puntual, no un recorrido del universo.
+    """
+    if not numbers:
+        return set()
+    result = await db.execute(
+        select(Number.number).where(
+            Number.raffle_id == raffle_id,
+            Number.number.in_(numbers),
+            Number.status != 'available',
+        )
     )
+    return set(result.scalars().all())
 
-    # 3. Si hay números excluidos, se añade el filtro de forma segura.
-    #    SQLAlchemy se encarga de formatear la cláusula NOT IN correctamente.
-    if raffle.excluded_numbers:
-        query = query.where(series.c.number.not_in(raffle.excluded_numbers))
 
-    # 4. Se aplican el orden aleatorio y el límite al final.
-    final_query = query.order_by(func.random()).limit(count)
+async def get_all_raffle_ids(db: AsyncSession) -> list[str]:
+    result = await db.execute(select(Raffle.id))
+    return list(result.scalars().all())
 
-    result = await db.execute(final_query)
-    available_numbers = result.scalars().all()
 
-    if len(available_numbers) < count:
-        raise ValueError("No se pudieron generar suficientes números aleatorios disponibles.")
-        
-    return list(available_numbers)
+# --- FUENTE DEL TABLERO COMPLETO DE NÚMEROS ---
+async def get_raffle_board_source(db: AsyncSession, raffle_id: str) -> tuple[int, list[str], list[tuple[str, str]]] | None:
+    """
+    Devuelve (dígitos, números excluidos, [(número, estado)] de las filas no disponibles),
+    o None si la rifa no existe.
+    """
+    raffle_result = await db.execute(
+        select(Raffle.dijits_per_number, Raffle.excluded_numbers).where(Raffle.id == raffle_id)
+    )
+    raffle_row = raffle_result.first()
+    if raffle_row is None:
+        return None
+
+    numbers_result = await db.execute(
+        select(Number.number, Number.status).where(Number.raffle_id == raffle_id, Number.status != 'available')
+    )
+    return raffle_row.dijits_per_number, raffle_row.excluded_numbers, [tuple(row) for row in numbers_result.all()]
+
+
+# --- ESTADÍSTICAS Y TIQUETES VENDIDOS ---
+# Estados que cuentan como "vendidos" para el progreso de la rifa (pagados y pendientes).
+ACTIVE_TICKET_STATUSES = ('paid', 'pending')
+
+
+async def get_raffle_ticket_stats(db: AsyncSession, raffle_id: str) -> RaffleStats | None:
+    """Lee los contadores mantenidos de la rifa (tabla raffle_stats); None si aún no tiene tiquetes."""
+    result = await db.execute(select(RaffleStats).where(RaffleStats.raffle_id == raffle_id))
+    return result.scalars().first()
+
+
+async def raffle_has_active_tickets(db: AsyncSession, raffle_id: str) -> bool:
+    """EXISTS sobre los tiquetes no cancelados de la rifa; no carga ninguna fila."""
+    result = await db.execute(
+        select(exists().where(Ticket.raffle_id == raffle_id, Ticket.status != 'cancelled'))
+    )
+    return bool(result.scalar())
+
+
+async def get_sold_tickets_page(
+    db: AsyncSession,
+    raffle_id: str,
+    cursor: tuple | None,
+    limit: int
+) -> tuple[list, bool]:
+    """
+    Página de tiquetes activos de la rifa con solo las columnas de SoldTicketInfo, ordenada
+    por (created_at, id) descendente con paginación keyset. Retorna (filas, hay_más).
+    """
+    ticket_numbers = (
+        select(func.array_agg(aggregate_order_by(Number.number, Number.number)).label("numbers"))
+        .where(Number.ticket_id == Ticket.id)
+        .lateral("ticket_numbers")
+    )
+    query = (
+        select(
+            Ticket.id,
+            Ticket.name,
+            ticket_numbers.c.numbers,
+            Ticket.status,
+            Ticket.created_at,
+            User.username.label("responsible"),
+        )
+        .select_from(Ticket)
+        .outerjoin(User, User.id == Ticket.user_id)
+        .join(ticket_numbers, true())
+        .where(Ticket.raffle_id == raffle_id, Ticket.status.in_(ACTIVE_TICKET_STATUSES))
+    )
+    if cursor is not None:
+        query = query.where(tuple_(Ticket.created_at, Ticket.id) < tuple_(cursor[0], cursor[1]))
+    query = query.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(limit + 1)
 
+    rows = list((await db.execute(query)).all())
+    return rows[:limit], len(rows) > limit
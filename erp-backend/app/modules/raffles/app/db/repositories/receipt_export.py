@@ -0,0 +1,25 @@
+# app/db/repositories/receipt_export.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func
+
+from app.db.models import ReceiptExportJob
+
+
+async def create_export_job(db: AsyncSession, job_id: str, raffle_id: str, total_tickets: int) -> ReceiptExportJob:
+    job = ReceiptExportJob(id=job_id, raffle_id=raffle_id, status="running", total_tickets=total_tickets)
+    db.add(job)
+    await db.flush()
+    return job
+
+
+async def get_export_job(db: AsyncSession, job_id: str) -> ReceiptExportJob | None:
+    result = await db.execute(select(ReceiptExportJob).where(ReceiptExportJob.id == job_id))
+    return result.scalars().first()
+
+
+async def update_export_job(db: AsyncSession, job_id: str, finished: bool = False, **values):
+    """Guarda el avance (y el estado final si 'finished') sin cargar la fila."""
+    if finished:
+        values["finished_at"] = func.now()
+    await db.execute(update(ReceiptExportJob).where(ReceiptExportJob.id == job_id).values(**values))
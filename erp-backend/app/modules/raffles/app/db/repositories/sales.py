@@ -0,0 +1,177 @@
+# app/db/repositories/sales.py
+
+import enum
+import logging
+from collections import Counter
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Date, cast, select, delete, func, text, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.models import Raffle, SalesDailyRollup, Ticket, User
+
+
+def rollup_key(sale_date: date, raffle_id: str, user_id: int | None, payment_type) -> tuple:
+    """Llave de la fila del rollup; los valores nulos se guardan como 0 / ''."""
+    if isinstance(payment_type, enum.Enum):
+        payment_type = payment_type.value
+    return sale_date, raffle_id, user_id or 0, payment_type or ""
+
+
+# --- MANTENIMIENTO INCREMENTAL ---
+async def apply_sales_deltas(db: AsyncSession, deltas: dict[tuple, Counter]):
+    """
+    Suma (o resta) tiquetes e ingresos en las filas del rollup, dentro de la transacción de
+    quien llama. Las llaves se procesan ordenadas para no provocar interbloqueos.
+    """
+    rows = [
+        {
+            "sale_date": sale_date,
+            "raffle_id": raffle_id,
+            "user_id": user_id,
+            "payment_type": payment_type,
+            "tickets_sold": delta["tickets_sold"],
+            "revenue": delta["revenue"],
+        }
+        for (sale_date, raffle_id, user_id, payment_type), delta in sorted(deltas.items())
+        if delta["tickets_sold"] or delta["revenue"]
+    ]
+    if not rows:
+        return
+    statement = pg_insert(SalesDailyRollup).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[
+            SalesDailyRollup.sale_date,
+            SalesDailyRollup.raffle_id,
+            SalesDailyRollup.user_id,
+            SalesDailyRollup.payment_type,
+        ],
+        set_={
+            "tickets_sold": SalesDailyRollup.tickets_sold + statement.excluded.tickets_sold,
+            "revenue": SalesDailyRollup.revenue + statement.excluded.revenue,
+        },
+    )
+    await db.execute(statement)
+
+
+# --- RECONSTRUCCIÓN DESDE 'tickets' ---
+async def rebuild_sales_rollup(db: AsyncSession, date_from: date | None = None) -> int:
+    """
+    Recalcula el rollup (todo, o desde 'date_from') a partir de los tiquetes pagados.
+    El bloqueo EXCLUSIVE deja leer el rollup pero hace esperar a las transacciones que lo
+    actualizan, así ningún delta concurrente se pierde ni se cuenta dos veces.
+    """
+    await db.execute(text("LOCK TABLE sales_daily_rollup IN EXCLUSIVE MODE"))
+
+    clear = delete(SalesDailyRollup)
+    if date_from:
+        clear = clear.where(SalesDailyRollup.sale_date >= date_from)
+    await db.execute(clear)
+
+    user_key = func.coalesce(Ticket.user_id, literal(0))
+    payment_key = func.coalesce(Ticket.payment_type, literal(""))
+    source = (
+        select(
+            Ticket.payment_date,
+            Ticket.raffle_id,
+            user_key,
+            payment_key,
+            func.count(Ticket.id),
+            func.coalesce(func.sum(Raffle.price), 0),
+        )
+        .join(Raffle, Raffle.id == Ticket.raffle_id)
+        .where(Ticket.status == 'paid', Ticket.payment_date.is_not(None))
+        .group_by(Ticket.payment_date, Ticket.raffle_id, user_key, payment_key)
+    )
+    if date_from:
+        source = source.where(Ticket.payment_date >= date_from)
+
+    result = await db.execute(
+        pg_insert(SalesDailyRollup).from_select(
+            ["sale_date", "raffle_id", "user_id", "payment_type", "tickets_sold", "revenue"], source
+        )
+    )
+    logging.info(f"Rollup de ventas reconstruido desde {date_from or 'el inicio'}: {result.rowcount} filas.")
+    return result.rowcount
+
+
+# --- CONSULTAS DE ANALÍTICA ---
+SALES_DIMENSIONS = ("seller", "raffle", "payment_type")
+
+
+async def get_sales_buckets(
+    db: AsyncSession,
+    granularity: str,
+    date_from: date,
+    date_to: date,
+    group_by: list[str],
+    raffle_id: str | None = None,
+    user_id: int | None = None,
+    payment_type: str | None = None
+) -> list:
+    """
+    Agrega el rollup en cubetas de día, semana (lunes) o mes, agrupando además por las
+    dimensiones pedidas. Lee a lo sumo una fila por día y combinación de dimensiones.
+    """
+    if granularity == "day":
+        bucket = SalesDailyRollup.sale_date
+    else:
+        bucket = cast(func.date_trunc(granularity, SalesDailyRollup.sale_date), Date)
+    bucket = bucket.label("bucket")
+
+    columns, group_columns = [bucket], [bucket]
+    if "seller" in group_by:
+        columns += [SalesDailyRollup.user_id.label("user_id"), User.username.label("seller")]
+        group_columns += [SalesDailyRollup.user_id, User.username]
+    if "raffle" in group_by:
+        columns += [SalesDailyRollup.raffle_id.label("raffle_id"), Raffle.name.label("raffle_name")]
+        group_columns += [SalesDailyRollup.raffle_id, Raffle.name]
+    if "payment_type" in group_by:
+        columns.append(SalesDailyRollup.payment_type.label("payment_type"))
+        group_columns.append(SalesDailyRollup.payment_type)
+
+    query = select(
+        *columns,
+        func.sum(SalesDailyRollup.tickets_sold).label("tickets_sold"),
+        func.sum(SalesDailyRollup.revenue).label("revenue"),
+    ).select_from(SalesDailyRollup)
+    if "seller" in group_by:
+        query = query.outerjoin(User, User.id == SalesDailyRollup.user_id)
+    if "raffle" in group_by:
+        query = query.join(Raffle, Raffle.id == SalesDailyRollup.raffle_id)
+    query = (
+        query
+        .where(SalesDailyRollup.sale_date >= date_from, SalesDailyRollup.sale_date <= date_to)
+        .group_by(*group_columns)
+        .having(func.sum(SalesDailyRollup.tickets_sold) != 0)
+        .order_by(*group_columns)
+    )
+    if raffle_id:
+        query = query.where(SalesDailyRollup.raffle_id == raffle_id)
+    if user_id is not None:
+        query = query.where(SalesDailyRollup.user_id == user_id)
+    if payment_type:
+        query = query.where(SalesDailyRollup.payment_type == payment_type)
+
+    result = await db.execute(query)
+    return result.all()
+
+
+async def get_daily_sales_by_seller(db: AsyncSession, date_from: date, date_to: date | None = None) -> list:
+    """Tiquetes pagados por día de pago y vendedor (solo tiquetes con vendedor), desde el rollup."""
+    query = (
+        select(
+            SalesDailyRollup.sale_date.label("sale_date"),
+            User.username.label("seller"),
+            func.sum(SalesDailyRollup.tickets_sold).label("tickets_sold"),
+        )
+        .join(User, User.id == SalesDailyRollup.user_id)
+        .where(SalesDailyRollup.sale_date >= date_from)
+        .group_by(SalesDailyRollup.sale_date, User.username)
+        .having(func.sum(SalesDailyRollup.tickets_sold) > 0)
+        .order_by(SalesDailyRollup.sale_date)
+    )
+    if date_to:
+        query = query.where(SalesDailyRollup.sale_date <= date_to)
+    result = await db.execute(query)
+    return result.all()
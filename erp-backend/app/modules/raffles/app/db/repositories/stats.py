@@ -0,0 +1,232 @@
+# app/db/repositories/stats.py
+
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, update, func, text, case, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.models import Raffle, RaffleStats, RaffleParticipant, Ticket
+from app.db.repositories.sales import apply_sales_deltas, rollup_key
+
+# Estados que cuentan como tiquete activo (y por lo tanto como participante).
+ACTIVE_TICKET_STATUSES = ('paid', 'pending')
+
+# Columna de RaffleStats que cuenta cada estado de tiquete.
+STATUS_COLUMNS = {
+    'paid': 'paid_tickets',
+    'pending': 'pending_tickets',
+    'cancelled': 'cancelled_tickets',
+}
+
+
+@dataclass(frozen=True)
+class TicketTransition:
+    """Cambio de estado de un tiquete. 'old_status' es None cuando el tiquete es nuevo."""
+    raffle_id: str
+    name: str | None
+    old_status: str | None
+    new_status: str
+    price: int | None = None
+    # Llave del rollup de ventas (solo importa cuando el tiquete entra o sale de 'paid').
+    user_id: int | None = None
+    payment_type: str | None = None
+    payment_date: date | None = None
+
+
+# --- APLICACIÓN INCREMENTAL DE TRANSICIONES ---
+async def apply_ticket_transitions(db: AsyncSession, transitions: list[TicketTransition]):
+    """
+    Actualiza raffle_stats, raffle_participants y el rollup de ventas con los deltas de las
+    transiciones, dentro de la transacción de quien llama. Primero se toca la fila de
+    raffle_stats y después las de participantes (el mismo orden que usa la reconciliación)
+    para no provocar interbloqueos.
+    """
+    stats_deltas: dict[str, Counter] = defaultdict(Counter)
+    participant_deltas: Counter = Counter()
+    sales_deltas: dict[tuple, Counter] = defaultdict(Counter)
+
+    for transition in transitions:
+        if transition.old_status == transition.new_status:
+            continue
+        deltas = stats_deltas[transition.raffle_id]
+        if transition.old_status in STATUS_COLUMNS:
+            deltas[STATUS_COLUMNS[transition.old_status]] -= 1
+        if transition.new_status in STATUS_COLUMNS:
+            deltas[STATUS_COLUMNS[transition.new_status]] += 1
+        if transition.new_status == 'paid':
+            deltas['revenue'] += transition.price or 0
+        if transition.old_status == 'paid':
+            deltas['revenue'] -= transition.price or 0
+
+        # Las ventas se agregan por fecha de pago; sin fecha no entran al rollup (como antes el resumen mensual).
+        paid_delta = (transition.new_status == 'paid') - (transition.old_status == 'paid')
+        if paid_delta and transition.payment_date is not None:
+            sales = sales_deltas[rollup_key(transition.payment_date, transition.raffle_id, transition.user_id, transition.payment_type)]
+            sales['tickets_sold'] += paid_delta
+            sales['revenue'] += paid_delta * (transition.price or 0)
+
+        was_active = transition.old_status in ACTIVE_TICKET_STATUSES
+        is_active = transition.new_status in ACTIVE_TICKET_STATUSES
+        if was_active != is_active:
+            participant_deltas[(transition.raffle_id, transition.name or "")] += 1 if is_active else -1
+
+    if not stats_deltas:
+        return
+
+    for raffle_id in sorted(stats_deltas):
+        await _upsert_stats_deltas(db, raffle_id, stats_deltas[raffle_id])
+
+    participants_by_raffle = await _apply_participant_deltas(db, participant_deltas)
+    for raffle_id in sorted(participants_by_raffle):
+        if participants_by_raffle[raffle_id]:
+            await _upsert_stats_deltas(db, raffle_id, Counter(participants=participants_by_raffle[raffle_id]))
+
+    await apply_sales_deltas(db, sales_deltas)
+
+
+async def _upsert_stats_deltas(db: AsyncSession, raffle_id: str, deltas: Counter):
+    values = {column: deltas.get(column, 0) for column in (*STATUS_COLUMNS.values(), 'participants', 'revenue')}
+    statement = pg_insert(RaffleStats).values(raffle_id=raffle_id, version=1, **values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[RaffleStats.raffle_id],
+        set_={
+            **{column: getattr(RaffleStats, column) + getattr(statement.excluded, column) for column in values},
+            'version': RaffleStats.version + 1,
+            'updated_at': func.now(),
+        },
+    )
+    await db.execute(statement)
+
+
+async def _apply_participant_deltas(db: AsyncSession, participant_deltas: Counter) -> Counter:
+    """
+    Aplica los deltas de tiquetes activos por participante y devuelve, por rifa, cuántos
+    participantes aparecieron (cuenta 0 -> n) o desaparecieron (cuenta n -> 0).
+    """
+    participants_by_raffle: Counter = Counter()
+    increments = sorted((key, delta) for key, delta in participant_deltas.items() if delta > 0)
+    decrements = sorted((key, delta) for key, delta in participant_deltas.items() if delta < 0)
+
+    if increments:
+        statement = pg_insert(RaffleParticipant).values([
+            {"raffle_id": raffle_id, "name": name, "active_tickets": delta}
+            for (raffle_id, name), delta in increments
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[RaffleParticipant.raffle_id, RaffleParticipant.name],
+            set_={"active_tickets": RaffleParticipant.active_tickets + statement.excluded.active_tickets},
+        ).returning(RaffleParticipant.raffle_id, RaffleParticipant.name, RaffleParticipant.active_tickets)
+        deltas = dict(increments)
+        for row in (await db.execute(statement)).all():
+            if row.active_tickets == deltas[(row.raffle_id, row.name)]:
+                participants_by_raffle[row.raffle_id] += 1
+
+    if decrements:
+        result = await db.execute(
+            text(
+                "UPDATE raffle_participants AS p SET active_tickets = p.active_tickets + d.delta "
+                "FROM unnest(CAST(:raffle_ids AS text[]), CAST(:names AS text[]), CAST(:deltas AS integer[])) "
+                "AS d(raffle_id, name, delta) "
+                "WHERE p.raffle_id = d.raffle_id AND p.name = d.name "
+                "RETURNING p.raffle_id, p.active_tickets"
+            ),
+            {
+                "raffle_ids": [raffle_id for (raffle_id, _), _ in decrements],
+                "names": [name for (_, name), _ in decrements],
+                "deltas": [delta for _, delta in decrements],
+            },
+        )
+        for row in result.all():
+            if row.active_tickets <= 0:
+                participants_by_raffle[row.raffle_id] -= 1
+
+    return participants_by_raffle
+
+
+# --- VERSIÓN DE LA RIFA (para las respuestas cacheadas) ---
+async def bump_raffle_version(db: AsyncSession, raffle_id: str):
+    """Sube la versión de la rifa; se llama al crearla o modificarla, en su misma transacción."""
+    statement = pg_insert(RaffleStats).values(raffle_id=raffle_id, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[RaffleStats.raffle_id],
+        set_={'version': RaffleStats.version + 1, 'updated_at': func.now()},
+    )
+    await db.execute(statement)
+
+
+async def get_raffle_version(db: AsyncSession, raffle_id: str) -> int | None:
+    """Versión actual de la rifa (0 si no tiene fila de estadísticas); None si la rifa no existe."""
+    result = await db.execute(
+        select(func.coalesce(RaffleStats.version, 0))
+        .select_from(Raffle)
+        .outerjoin(RaffleStats, RaffleStats.raffle_id == Raffle.id)
+        .where(Raffle.id == raffle_id)
+    )
+    return result.scalar()
+
+
+async def get_raffles_version(db: AsyncSession) -> str:
+    """
+    Versión del listado completo: cantidad de rifas y suma de sus versiones. Como las versiones
+    solo crecen, cualquier cambio en cualquier rifa (o una rifa nueva) cambia el resultado.
+    """
+    result = await db.execute(
+        select(func.count(Raffle.id), func.coalesce(func.sum(RaffleStats.version), 0))
+        .select_from(Raffle)
+        .outerjoin(RaffleStats, RaffleStats.raffle_id == Raffle.id)
+    )
+    raffle_count, version_sum = result.one()
+    return f"{raffle_count}.{version_sum}"
+
+
+# --- LECTURA ---
+async def get_raffle_stats(db: AsyncSession, raffle_id: str) -> RaffleStats | None:
+    result = await db.execute(select(RaffleStats).where(RaffleStats.raffle_id == raffle_id))
+    return result.scalars().first()
+
+
+# --- RECONCILIACIÓN DESDE CERO ---
+async def reconcile_raffle_stats(db: AsyncSession, raffle_id: str):
+    """
+    Recalcula las estadísticas y los participantes de una rifa a partir de 'tickets'.
+    Se bloquea primero la fila de raffle_stats: una compra concurrente espera a que la
+    reconciliación termine y aplica su delta sobre el valor ya recalculado.
+    """
+    await db.execute(
+        pg_insert(RaffleStats).values(raffle_id=raffle_id).on_conflict_do_nothing(index_elements=[RaffleStats.raffle_id])
+    )
+    await db.execute(select(RaffleStats.raffle_id).where(RaffleStats.raffle_id == raffle_id).with_for_update())
+
+    await db.execute(delete(RaffleParticipant).where(RaffleParticipant.raffle_id == raffle_id))
+    participant_name = func.coalesce(Ticket.name, literal(""))
+    await db.execute(
+        pg_insert(RaffleParticipant).from_select(
+            ["raffle_id", "name", "active_tickets"],
+            select(Ticket.raffle_id, participant_name, func.count(Ticket.id))
+            .where(Ticket.raffle_id == raffle_id, Ticket.status.in_(ACTIVE_TICKET_STATUSES))
+            .group_by(Ticket.raffle_id, participant_name),
+        )
+    )
+
+    totals = (await db.execute(
+        select(
+            func.count(Ticket.id).filter(Ticket.status == 'paid').label("paid_tickets"),
+            func.count(Ticket.id).filter(Ticket.status == 'pending').label("pending_tickets"),
+            func.count(Ticket.id).filter(Ticket.status == 'cancelled').label("cancelled_tickets"),
+            func.count(func.distinct(participant_name)).filter(Ticket.status.in_(ACTIVE_TICKET_STATUSES)).label("participants"),
+            func.coalesce(func.sum(case((Ticket.status == 'paid', Raffle.price), else_=0)), 0).label("revenue"),
+        )
+        .select_from(Ticket)
+        .join(Raffle, Raffle.id == Ticket.raffle_id)
+        .where(Ticket.raffle_id == raffle_id)
+    )).one()
+
+    await db.execute(
+        update(RaffleStats)
+        .where(RaffleStats.raffle_id == raffle_id)
+        .values(**totals._asdict(), version=RaffleStats.version + 1, updated_at=func.now())
+    )
+    logging.info(f"Estadísticas de la rifa {raffle_id} reconciliadas: {totals.paid_tickets} pagados, {totals.pending_tickets} pendientes.")
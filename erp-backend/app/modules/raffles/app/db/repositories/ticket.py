@@ -5,11 +5,14 @@ import logging # <-- Se importa el módulo de logging
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload, joinedload
-from datetime import datetime, date
-from sqlalchemy import update
+from datetime import datetime, date, time, timedelta, timezone
+from sqlalchemy import update, exists, func, insert, text, true, tuple_, or_, Row
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
 
 from app.db.models import Ticket, Number, Raffle, User
-from app.modules.raffles.app.schemas.ticket import TicketCreateRequest
+from app.db.repositories.stats import TicketTransition, apply_ticket_transitions
+from app.utils.normalization import escape_like
+from app.schemas.ticket import TicketCreateRequest, TicketFilters
 
 # --- Configuración básica de logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - REPO - %(message)s')
@@ -28,21 +31,6 @@ async def get_raffle_by_id(db: AsyncSession, raffle_id: str) -> Raffle | None:
     return raffle
 
 
-async def find_and_lock_numbers(db: AsyncSession, raffle_id: str, numbers: list[str]) -> list[Number]:
-    if not numbers:
-        return []
-    logging.info(f"Buscando y bloqueando {len(numbers)} números para la rifa ID: {raffle_id}")
-    query = (
-        select(Number)
-        .where(Number.raffle_id == raffle_id, Number.number.in_(numbers))
-        .with_for_update()
-    )
-    result = await db.execute(query)
-    found_numbers = list(result.scalars().all())
-    logging.info(f"Se encontraron {len(found_numbers)} registros de números existentes para bloquear.")
-    return found_numbers
-
-
 async def get_ticket_with_numbers_and_raffle(db: AsyncSession, ticket_id: str):
     logging.info(f"Buscando tiquete detallado con ID: {ticket_id}")
     result = await db.execute(
@@ -56,78 +44,389 @@ async def get_ticket_with_numbers_and_raffle(db: AsyncSession, ticket_id: str):
 
 
 
-async def get_all_tickets_with_numbers_and_raffle(db: AsyncSession):
-    logging.info("Buscando todos los tiquetes con sus relaciones...")
-    result = await db.execute(
-        select(Ticket).options(
-            selectinload(Ticket.numbers),
-            joinedload(Ticket.raffle),
-            joinedload(Ticket.user)
+def _apply_ticket_filters(query, filters: TicketFilters):
+    """Aplica los filtros del listado en el servidor; cada uno tiene un índice compuesto con (created_at, id)."""
+    if filters.raffle_id:
+        query = query.where(Ticket.raffle_id == filters.raffle_id)
+    if filters.status:
+        query = query.where(Ticket.status == filters.status)
+    if filters.user_id is not None:
+        query = query.where(Ticket.user_id == filters.user_id)
+    if filters.payment_type:
+        query = query.where(Ticket.payment_type == filters.payment_type)
+    if filters.date_from:
+        query = query.where(Ticket.created_at >= datetime.combine(filters.date_from, time.min, tzinfo=timezone.utc))
+    if filters.date_to:
+        query = query.where(Ticket.created_at < datetime.combine(filters.date_to + timedelta(days=1), time.min, tzinfo=timezone.utc))
+    return query
+
+
+# --- PROYECCIÓN DE TIQUETES (solo las columnas de TicketInfo, sin hidratar el ORM) ---
+def ticket_projection_query():
+    """
+    Construye un SELECT con las columnas de TicketInfo ya etiquetadas con sus nombres.
+    Los números de cada tiquete se agregan en el servidor con array_agg en un LATERAL
+    que usa el índice de numbers.ticket_id.
+    """
+    ticket_numbers = (
+        select(
+            func.array_agg(aggregate_order_by(Number.number, Number.number)).label("numbers"),
+            func.array_agg(aggregate_order_by(Number.id, Number.number)).label("number_ids"),
+        )
+        .where(Number.ticket_id == Ticket.id)
+        .lateral("ticket_numbers")
+    )
+    return (
+        select(
+            Ticket.id,
+            Ticket.name,
+            Ticket.phone,
+            Ticket.raffle_id,
+            Ticket.status,
+            User.username.label("responsible"),
+            Ticket.created_at,
+            Ticket.updated_at,
+            Ticket.payment_type,
+            Ticket.payment_date,
+            Ticket.payment_proof_url,
+            ticket_numbers.c.numbers,
+            Ticket.numbers_snapshot,
+            ticket_numbers.c.number_ids,
+            Raffle.name.label("raffle_name"),
+            Raffle.status.label("raffle_status"),
+            Raffle.short_id.label("raffle_short_id"),
+            Raffle.end_date.label("raffle_end_date"),
+            Raffle.price.label("raffle_price"),
         )
+        .select_from(Ticket)
+        .join(Raffle, Raffle.id == Ticket.raffle_id)
+        .outerjoin(User, User.id == Ticket.user_id)
+        .join(ticket_numbers, true())
     )
-    tickets = result.scalars().unique().all()
-    logging.info(f"Se encontraron {len(tickets)} tiquetes en total.")
-    return tickets
+
+
+async def get_ticket_rows_page(
+    db: AsyncSession,
+    filters: TicketFilters,
+    cursor: tuple[datetime, str] | None,
+    limit: int
+) -> tuple[list[Row], bool]:
+    """
+    Devuelve una página de filas proyectadas ordenada por (created_at, id) descendente usando
+    paginación keyset: la posición se fija con la llave del último elemento, no con OFFSET,
+    así la latencia no crece con el tamaño de la tabla.
+    Retorna (filas, hay_más).
+    """
+    logging.info(f"Buscando página de tiquetes (límite {limit}) con filtros {filters.model_dump(exclude_none=True)}.")
+    query = _apply_ticket_filters(ticket_projection_query(), filters)
+    if cursor is not None:
+        query = query.where(tuple_(Ticket.created_at, Ticket.id) < tuple_(cursor[0], cursor[1]))
+    query = query.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(limit + 1)
+
+    rows = list((await db.execute(query)).all())
+    return rows[:limit], len(rows) > limit
+
+
+async def get_ticket_row(db: AsyncSession, ticket_id: str) -> Row | None:
+    """Fila proyectada de un tiquete (mismas columnas que TicketInfo), o None si no existe."""
+    logging.info(f"Buscando tiquete con ID: {ticket_id}")
+    result = await db.execute(ticket_projection_query().where(Ticket.id == ticket_id))
+    return result.first()
+
+
+# --- BÚSQUEDA DE PARTICIPANTES ---
+async def search_ticket_rows(
+    db: AsyncSession,
+    field: str,
+    term: str,
+    raffle_id: str | None,
+    status: str | None,
+    limit: int
+) -> list[Row]:
+    """
+    Coincidencia parcial (LIKE '%término%') sobre phone_normalized o name_search. Los índices
+    GIN con gin_trgm_ops resuelven el LIKE sin recorrer la tabla; el término ya viene
+    normalizado. Más recientes primero.
+    """
+    column = Ticket.phone_normalized if field == "phone" else Ticket.name_search
+    query = ticket_projection_query().where(column.like(f"%{escape_like(term)}%"))
+    if raffle_id:
+        query = query.where(Ticket.raffle_id == raffle_id)
+    if status:
+        query = query.where(Ticket.status == status)
+    query = query.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(limit)
+    return list((await db.execute(query)).all())
+
+
+# --- LECTURA EN STREAMING PARA EXPORTACIONES ---
+async def stream_ticket_rows(
+    db: AsyncSession,
+    filters: TicketFilters,
+    chunk_size: int = 1000,
+    after: tuple[datetime, str] | None = None,
+    statuses: tuple[str, ...] | None = None,
+    include_ids: list[str] | None = None
+):
+    """
+    Itera los tiquetes filtrados en bloques de 'chunk_size' filas con un cursor del lado
+    del servidor, de modo que la memoria no depende del total exportado. 'after' reanuda
+    desde la llave (created_at, id) del último tiquete ya procesado; 'include_ids' agrega
+    tiquetes anteriores a esa llave (los que fallaron en la exportación interrumpida).
+    """
+    query = _apply_ticket_filters(ticket_projection_query(), filters)
+    query = _apply_export_scope(query, after, statuses, include_ids)
+    query = query.order_by(Ticket.created_at, Ticket.id).execution_options(yield_per=chunk_size)
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        yield partition
+
+
+async def count_ticket_rows(
+    db: AsyncSession,
+    filters: TicketFilters,
+    after: tuple[datetime, str] | None = None,
+    statuses: tuple[str, ...] | None = None,
+    include_ids: list[str] | None = None
+) -> int:
+    query = _apply_ticket_filters(select(func.count(Ticket.id)).select_from(Ticket), filters)
+    query = _apply_export_scope(query, after, statuses, include_ids)
+    return (await db.execute(query)).scalar_one()
+
+
+def _apply_export_scope(
+    query,
+    after: tuple[datetime, str] | None,
+    statuses: tuple[str, ...] | None,
+    include_ids: list[str] | None = None
+):
+    if after is not None:
+        condition = tuple_(Ticket.created_at, Ticket.id) > tuple_(after[0], after[1])
+        if include_ids:
+            condition = or_(condition, Ticket.id.in_(include_ids))
+        query = query.where(condition)
+    if statuses:
+        query = query.where(Ticket.status.in_(statuses))
+    return query
+
+
+# --- INSERCIÓN DEL TIQUETE ---
+async def insert_ticket(db: AsyncSession, ticket_values: dict) -> Row:
+    """Inserta el tiquete y devuelve sus columnas generadas por el servidor (created_at, updated_at)."""
+    result = await db.execute(
+        insert(Ticket).values(**ticket_values).returning(Ticket.created_at, Ticket.updated_at)
+    )
+    return result.one()
+
+
+# --- RECLAMO ATÓMICO DE NÚMEROS ---
+async def claim_numbers(
+    db: AsyncSession,
+    raffle_id: str,
+    ticket_id: str,
+    numbers: list[str],
+    ticket_status: str,
+    expiration_time: datetime | None = None
+) -> list[Row]:
+    """
+    Reclama los números para el tiquete con un único
+    INSERT ... ON CONFLICT (raffle_id, number) DO UPDATE ... WHERE status = 'available' RETURNING.
+    Un número sin fila se inserta; uno liberado se reasigna; uno ocupado o excluido no se toca
+    y por lo tanto no aparece en el RETURNING. La restricción única hace imposible la doble venta.
+    Retorna las filas (id, number) reclamadas.
+    """
+    if not numbers:
+        return []
+    is_pending = ticket_status == "pending"
+    target_status = "reserved" if is_pending else "assigned"
+    claim = pg_insert(Number).values([
+        {
+            "raffle_id": raffle_id,
+            "ticket_id": ticket_id,
+            "number": num_str,
+            "status": target_status,
+            "expire_at": expiration_time if is_pending else None,
+        }
+        for num_str in numbers
+    ])
+    claim = claim.on_conflict_do_update(
+        constraint="uq_numbers_raffle_number",
+        set_={
+            "ticket_id": claim.excluded.ticket_id,
+            "status": claim.excluded.status,
+            "expire_at": claim.excluded.expire_at,
+        },
+        where=(Number.status == "available"),
+    ).returning(Number.id, Number.number)
+
+    claimed_rows = list((await db.execute(claim)).all())
+    logging.info(f"Se reclamaron {len(claimed_rows)} de {len(numbers)} números con estado '{target_status}'.")
+    return claimed_rows
 
 
 # --- FUNCIÓN DE ESCRITURA UNIFICADA ---
 async def save_new_ticket(
     db: AsyncSession,
-    ticket_data: Ticket,
-    existing_numbers: list[Number],
-    new_number_strings: set[str],
-    expiration_time: datetime | None = None
-) -> Ticket:
+    ticket_values: dict,
+    numbers: list[str],
+    expiration_time: datetime | None = None,
+    raffle_price: int | None = None
+) -> tuple[Row, list[Row]]:
     """
-    Guarda un nuevo tiquete y actualiza/crea sus números.
+    Guarda un nuevo tiquete, reclama todos sus números y suma el tiquete a las
+    estadísticas de la rifa, todo en la transacción de quien llama.
+    Retorna (fila del tiquete con created_at/updated_at, filas (id, number) reclamadas).
     """
-    logging.info(f"Iniciando guardado de tiquete ID: {ticket_data.id} con estado '{ticket_data.status}'.")
-    db.add(ticket_data)
-    
-    target_status = "reserved" if ticket_data.status == "pending" else "assigned"
-    
-    # Actualizar números existentes
-    if existing_numbers:
-        logging.info(f"Actualizando {len(existing_numbers)} números existentes al estado '{target_status}'.")
-        for num_obj in existing_numbers:
-            num_obj.status = target_status
-            num_obj.ticket_id = ticket_data.id
-            num_obj.expire_at = expiration_time if ticket_data.status == "pending" else None
-
-    # Crear números nuevos
-    if new_number_strings:
-        logging.info(f"Creando {len(new_number_strings)} nuevos números con estado '{target_status}'.")
-        new_numbers_to_create = [
-            Number(
-                number=num_str,
-                raffle_id=ticket_data.raffle_id,
-                ticket_id=ticket_data.id,
-                status=target_status,
-                expire_at=expiration_time if ticket_data.status == "pending" else None
-            )
-            for num_str in new_number_strings
-        ]
-        db.add_all(new_numbers_to_create)
-
-    logging.info(f"Tiquete y números listos para ser confirmados en la transacción.")
-    return ticket_data
+    logging.info(f"Iniciando guardado de tiquete ID: {ticket_values['id']} con estado '{ticket_values['status']}'.")
+    ticket_row = await insert_ticket(db, ticket_values)
+    claimed_rows = await claim_numbers(
+        db, ticket_values["raffle_id"], ticket_values["id"], numbers, ticket_values["status"], expiration_time
+    )
+    await record_new_ticket(db, ticket_values, raffle_price)
+    return ticket_row, claimed_rows
+
+
+async def record_new_ticket(db: AsyncSession, ticket_values: dict, raffle_price: int | None):
+    """Suma un tiquete recién creado a raffle_stats y raffle_participants."""
+    await apply_ticket_transitions(db, [TicketTransition(
+        raffle_id=ticket_values["raffle_id"],
+        name=ticket_values.get("name"),
+        old_status=None,
+        new_status=ticket_values["status"],
+        price=raffle_price,
+        user_id=ticket_values.get("user_id"),
+        payment_type=ticket_values.get("payment_type"),
+        payment_date=ticket_values.get("payment_date"),
+    )])
+
+
+# --- BLOQUEO SIN ESPERA DE CANDIDATOS PARA LA ASIGNACIÓN ALEATORIA ---
+async def try_lock_free_numbers(db: AsyncSession, raffle_id: str, candidates: list[str]) -> list[str]:
+    """
+    De una lista de candidatos, devuelve los que siguen libres y cuyo bloqueo se obtuvo.
+    SELECT ... FOR UPDATE SKIP LOCKED no sirve aquí porque la mayoría de los números aún no
+    tiene fila; en su lugar se usa pg_try_advisory_xact_lock por (rifa, número), que tiene la
+    misma semántica: si otro asignador ya tomó el número, se salta sin esperar. El bloqueo
+    se libera solo al terminar la transacción.
+    """
+    if not candidates:
+        return []
+    result = await db.execute(
+        text(
+            "SELECT c.number FROM unnest(CAST(:candidates AS text[])) AS c(number) "
+            "WHERE NOT EXISTS ("
+            "    SELECT 1 FROM numbers n"
+            "    WHERE n.raffle_id = :raffle_id AND n.number = c.number AND n.status <> 'available'"
+            ") "
+            "AND pg_try_advisory_xact_lock(hashtext(:raffle_id), CAST(c.number AS integer))"
+        ),
+        {"candidates": candidates, "raffle_id": raffle_id},
+    )
+    return list(result.scalars().all())
+
+
+async def set_ticket_numbers_snapshot(db: AsyncSession, ticket_id: str, numbers: list[str]):
+    await db.execute(update(Ticket).where(Ticket.id == ticket_id).values(numbers_snapshot=numbers))
+
+
+# --- LIBERACIÓN DE NÚMEROS (compartida por la cancelación y el barrido de reservas) ---
+async def release_ticket_numbers(db: AsyncSession, ticket_ids: list[str]) -> list[tuple[str, str]]:
+    """
+    Devuelve a 'available' todos los números de los tiquetes indicados con un único UPDATE.
+    Retorna las parejas (raffle_id, número) liberadas.
+    """
+    if not ticket_ids:
+        return []
+    result = await db.execute(
+        update(Number)
+        .where(Number.ticket_id.in_(ticket_ids))
+        .values(status="available", ticket_id=None, expire_at=None)
+        .returning(Number.raffle_id, Number.number)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+# --- CAMBIO DE ESTADO CONDICIONAL ---
+async def _transition_ticket_status(db: AsyncSession, ticket: Ticket, new_status: str, **values):
+    """
+    Cambia el estado del tiquete solo si sigue en el estado leído (UPDATE ... WHERE status = ...),
+    y aplica el mismo cambio a las estadísticas de la rifa. Si otra transacción (por ejemplo el
+    barrido de reservas) lo cambió primero, se lanza ValueError y los contadores no se tocan dos veces.
+    """
+    previous_status = ticket.status
+    result = await db.execute(
+        update(Ticket)
+        .where(Ticket.id == ticket.id, Ticket.status == previous_status)
+        .values(status=new_status, **values)
+        .returning(Ticket.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar() is None:
+        raise ValueError(f"El estado del tiquete {ticket.id} cambió mientras se procesaba la operación.")
+    ticket.status = new_status
+    for key, value in values.items():
+        setattr(ticket, key, value)
+
+    await apply_ticket_transitions(db, [TicketTransition(
+        raffle_id=ticket.raffle_id,
+        name=ticket.name,
+        old_status=previous_status,
+        new_status=new_status,
+        price=ticket.raffle.price if ticket.raffle else None,
+        user_id=ticket.user_id,
+        payment_type=ticket.payment_type,
+        payment_date=ticket.payment_date,
+    )])
 
 
 # --- FUNCIÓN DE CANCELACIÓN ---
-async def cancel_ticket_and_release_numbers(db: AsyncSession, ticket: Ticket):
+async def cancel_ticket_and_release_numbers(db: AsyncSession, ticket: Ticket) -> list[tuple[str, str]]:
     """
     Actualiza el estado de un tiquete a 'cancelled' y libera sus números asociados.
     """
     logging.info(f"Cancelando tiquete ID: {ticket.id}.")
-    ticket.status = "cancelled"
-    if ticket.numbers:
-        number_ids = [n.id for n in ticket.numbers]
-        logging.info(f"Liberando {len(number_ids)} números asociados al tiquete.")
-        await db.execute(
-            update(Number)
-            .where(Number.id.in_(number_ids))
-            .values(status="available", ticket_id=None, expire_at=None)
+    await _transition_ticket_status(db, ticket, "cancelled")
+    released = await release_ticket_numbers(db, [ticket.id])
+    logging.info(f"Se liberaron {len(released)} números asociados al tiquete.")
+    return released
+
+
+# --- FUNCIÓN DE EXPIRACIÓN DE RESERVAS EN LOTE ---
+async def expire_pending_tickets_batch(db: AsyncSession, batch_size: int) -> tuple[list[str], list[tuple[str, str]]]:
+    """
+    Cancela hasta 'batch_size' tiquetes 'pending' cuya reserva ya venció y libera sus números.
+    Los tiquetes se toman con FOR UPDATE SKIP LOCKED, así varios workers pueden barrer
+    al mismo tiempo sin procesar dos veces el mismo tiquete ni esperarse entre sí.
+    Retorna (ids de tiquetes cancelados, parejas (raffle_id, número) liberadas).
+    """
+    expired_tickets = (
+        select(Ticket.id)
+        .where(
+            Ticket.status == "pending",
+            exists().where(
+                Number.ticket_id == Ticket.id,
+                Number.status == "reserved",
+                Number.expire_at < func.now(),
+            ),
         )
+        .order_by(Ticket.created_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("expired_tickets")
+    )
+    result = await db.execute(
+        update(Ticket)
+        .where(Ticket.id.in_(select(expired_tickets.c.id)), Ticket.status == "pending")
+        .values(status="cancelled")
+        .returning(Ticket.id, Ticket.raffle_id, Ticket.name)
+    )
+    expired_rows = result.all()
+    ticket_ids = [row.id for row in expired_rows]
+    released = await release_ticket_numbers(db, ticket_ids)
+    await apply_ticket_transitions(db, [
+        TicketTransition(raffle_id=row.raffle_id, name=row.name, old_status="pending", new_status="cancelled")
+        for row in expired_rows
+    ])
+    return ticket_ids, released
 
 # --- FUNCIÓN DE CONFIRMACIÓN DE PAGO ---
 async def confirm_ticket_payment(db: AsyncSession, ticket: Ticket):
@@ -135,8 +434,7 @@ async def confirm_ticket_payment(db: AsyncSession, ticket: Ticket):
     Actualiza el estado de un tiquete a 'paid' y sus números a 'assigned'.
     """
     logging.info(f"Confirmando pago para tiquete ID: {ticket.id}.")
-    ticket.status = "paid"
-    ticket.payment_date = date.today() # Se establece la fecha de pago al día de hoy
+    await _transition_ticket_status(db, ticket, "paid", payment_date=date.today()) # Se establece la fecha de pago al día de hoy
     
     if ticket.numbers:
         number_ids = [n.id for n in ticket.numbers]
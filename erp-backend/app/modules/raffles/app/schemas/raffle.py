@@ -1,7 +1,7 @@
 # app/schemas/raffle.py
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # --- Esquema para los tiquetes vendidos (información pública) ---
 class SoldTicketInfo(BaseModel):
@@ -16,9 +16,13 @@ class SoldTicketInfo(BaseModel):
 
 # --- Esquema para las estadísticas ---
 class RaffleStatistics(BaseModel):
-    tickets_sold: int
+    tickets_sold: int  # Pagados + pendientes
     total_tickets: int
     participants: int
+    paid_tickets: int = 0
+    pending_tickets: int = 0
+    cancelled_tickets: int = 0
+    revenue: int = 0  # Suma del precio de los tiquetes pagados
 
 # --- Esquema de respuesta de la Rifa (Base para las respuestas) ---
 class RaffleResponse(BaseModel):
@@ -77,5 +81,38 @@ class RaffleUpdateRequest(BaseModel):
 class RaffleDetailResponse(RaffleResponse):
     # Ya no es necesario repetir todos los campos. Se heredan automáticamente.
     # Solo añadimos el campo extra que necesita esta vista detallada.
+    # Primera página de tiquetes vendidos; el resto se pide a /raffle/{id}/sold-tickets.
     sold_tickets: List[SoldTicketInfo]
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    sold_tickets_next_cursor: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
+
+# --- Página de tiquetes vendidos de una rifa ---
+class SoldTicketPage(BaseModel):
+    sold_tickets: List[SoldTicketInfo]
+    next_cursor: Optional[str] = None
+
+# --- Esquemas para la verificación de varios números en una sola petición ---
+class NumberBatchCheckRequest(BaseModel):
+    numbers: List[str] = Field(..., min_length=1, max_length=1000)
+
+class NumberBatchCheckResponse(BaseModel):
+    # Estado por número: available, reserved, assigned, excluded o invalid
+    statuses: Dict[str, str]
+
+# --- Avance de una exportación masiva de comprobantes (ZIP) ---
+class ReceiptExportJobInfo(BaseModel):
+    id: str
+    raffle_id: str
+    status: str  # running, completed, interrupted o failed
+    total_tickets: int
+    exported_tickets: int
+    failed_tickets: int
+    failed_ticket_ids: List[str] = []  # Se reintentan al reanudar
+    # Para continuar una descarga cortada: /receipts/export?resume_job=<id>
+    resume_cursor: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,26 @@
+# app/schemas/sales.py
+from pydantic import BaseModel
+from datetime import date
+from typing import List, Literal, Optional
+
+SalesGranularity = Literal["day", "week", "month"]
+
+# --- Una cubeta de ventas (día, semana o mes) con las dimensiones pedidas ---
+class SalesBucket(BaseModel):
+    bucket: date  # Primer día de la cubeta (las semanas empiezan el lunes)
+    tickets_sold: int
+    revenue: int
+    user_id: Optional[int] = None  # Solo si se agrupa por 'seller'
+    seller: Optional[str] = None
+    raffle_id: Optional[str] = None  # Solo si se agrupa por 'raffle'
+    raffle_name: Optional[str] = None
+    payment_type: Optional[str] = None  # Solo si se agrupa por 'payment_type'
+
+class SalesAnalyticsResponse(BaseModel):
+    granularity: SalesGranularity
+    date_from: date
+    date_to: date
+    group_by: List[str]
+    buckets: List[SalesBucket]
+    total_tickets_sold: int
+    total_revenue: int
@@ -1,10 +1,12 @@
 # app/schemas/ticket.py
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime, date
 from typing import List, Optional
 import enum
 
+from app.core.config import settings
+
 class PaymentType(str, enum.Enum):
     efectivo = "efectivo"
     transferencia = "transferencia"
@@ -32,6 +34,18 @@ class TicketCreateRequest(BaseModel):
     payment_date: Optional[date] = None
     payment_proof_url: Optional[str] = None
 
+# --- Solicitud para asignar números aleatorios y reservarlos en una sola operación ---
+class TicketAllocateRequest(BaseModel):
+    raffle_id: str
+    # Cantidad de números; por defecto, los números por tiquete de la rifa. Debe ser múltiplo de ese valor.
+    count: Optional[int] = Field(None, gt=0, le=settings.RANDOM_NUMBERS_MAX_COUNT)
+    name: str
+    phone: str
+    payment_type: PaymentType
+    status: Optional[str] = "pending"
+    payment_date: Optional[date] = None
+    payment_proof_url: Optional[str] = None
+
 class TicketInfo(BaseModel):
     id: str
     name: str
@@ -55,4 +69,15 @@ class TicketInfo(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 class TicketListResponse(BaseModel):
-    tickets: List[TicketInfo]
\ No newline at end of file
+    tickets: List[TicketInfo]
+    # Cursor para pedir la siguiente página; None cuando no hay más resultados.
+    next_cursor: Optional[str] = None
+
+# --- Filtros del listado de tiquetes (se reciben como parámetros de consulta) ---
+class TicketFilters(BaseModel):
+    raffle_id: Optional[str] = None
+    status: Optional[str] = None
+    user_id: Optional[int] = None
+    payment_type: Optional[PaymentType] = None
+    date_from: Optional[date] = None  # Inclusivo, sobre la fecha de creación
+    date_to: Optional[date] = None  # Inclusivo, sobre la fecha de creación
\ No newline at end of file
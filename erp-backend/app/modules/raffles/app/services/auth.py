@@ -7,7 +7,7 @@ from sqlalchemy import select
 # Se importan los modelos y esquemas necesarios
 from app.db.models import User
 from app.schemas.user import UserCreate
-from app.modules.raffles.app.core.security import get_password_hash # Asumiendo que esta función está en security.py
+from app.core.security import password_hasher # El hash se calcula fuera del event loop
 
 # --- Función Auxiliar para buscar usuarios ---
 async def get_user_by_username(db: AsyncSession, username: str) -> User | None:
@@ -30,7 +30,7 @@ async def create_user_service(db: AsyncSession, user_data: UserCreate) -> User:
         raise ValueError("El nombre de usuario ya está en uso.")
 
     # 2. Hashear la contraseña antes de guardarla
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
 
     # 3. Crear la instancia del modelo User
     # NOTA: No se asigna el 'id'. La base de datos lo genera automáticamente
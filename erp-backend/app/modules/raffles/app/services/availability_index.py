@@ -0,0 +1,238 @@
+# app/services/availability_index.py
+
+import asyncio
+import logging
+import random
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.repositories.raffle import get_raffle_index_source, get_taken_numbers
+
+# --- Generador aleatorio del sistema (mismo criterio de imparcialidad que random() de Postgres) ---
+_rng = random.SystemRandom()
+
+# Tope de sorteos del muestreo por rechazo, independiente de lo que se pida.
+_MAX_REJECTION_ATTEMPTS = 20_000
+
+
+class AvailabilityIndex:
+    """
+    Bitmap de disponibilidad de una rifa: un bit por número del universo
+    (1 = disponible, 0 = reservado, asignado o excluido).
+    Para 6 dígitos ocupa ~125 KB por rifa.
+    """
+
+    def __init__(self, raffle_id: str, digits: int):
+        self.raffle_id = raffle_id
+        self.digits = digits
+        self.size = 10 ** digits
+        self._bits = bytearray(b"\xff" * ((self.size + 7) // 8))
+        # Se apagan los bits sobrantes del último byte para que no cuenten como disponibles.
+        for pos in range(self.size, len(self._bits) * 8):
+            self._bits[pos >> 3] &= ~(1 << (pos & 7)) & 0xFF
+        self.available_count = self.size
+        self.built_at = time.monotonic()
+
+    # --- Conversión número <-> posición del bit ---
+    def position(self, number_str: str) -> int | None:
+        """Devuelve la posición del número en el bitmap, o None si no es válido para la rifa."""
+        if len(number_str) != self.digits or not number_str.isdigit():
+            return None
+        return int(number_str)
+
+    def format(self, position: int) -> str:
+        return str(position).zfill(self.digits)
+
+    def _test(self, pos: int) -> bool:
+        return bool(self._bits[pos >> 3] & (1 << (pos & 7)))
+
+    # --- Consultas ---
+    def is_available(self, number_str: str) -> bool:
+        pos = self.position(number_str)
+        return pos is not None and self._test(pos)
+
+    def is_stale(self, max_age_seconds: float) -> bool:
+        return time.monotonic() - self.built_at > max_age_seconds
+
+    # --- Mutaciones ---
+    def mark_unavailable(self, numbers) -> None:
+        for number_str in numbers:
+            pos = self.position(number_str)
+            if pos is not None and self._test(pos):
+                self._bits[pos >> 3] &= ~(1 << (pos & 7)) & 0xFF
+                self.available_count -= 1
+
+    def mark_available(self, numbers) -> None:
+        for number_str in numbers:
+            pos = self.position(number_str)
+            if pos is not None and not self._test(pos):
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+                self.available_count += 1
+
+    def available_numbers(self) -> list[str]:
+        """Enumera todos los números disponibles, saltando bytes completos en cero."""
+        result = []
+        for byte_index, byte in enumerate(self._bits):
+            if not byte:
+                continue
+            base = byte_index << 3
+            for bit in range(8):
+                if byte & (1 << bit):
+                    result.append(self.format(base + bit))
+        return result
+
+    def sample(self, count: int, skip: set[str] | None = None) -> list[str]:
+        """
+        Elige hasta 'count' números disponibles al azar sin recorrer el universo completo.
+        Usa muestreo por rechazo cuando hay muchos disponibles y enumeración cuando quedan pocos.
+        """
+        skip = skip or set()
+        if count <= 0 or self.available_count <= 0:
+            return []
+        # Nunca se pueden devolver más números de los que quedan: se pasa directo a enumerar.
+        count = min(count, self.available_count)
+
+        picked: set[str] = set()
+        # Muestreo por rechazo: eficiente mientras la densidad de disponibles sea razonable
+        # y se pida una fracción pequeña de lo que queda.
+        if self.available_count * 4 >= self.size and count * 2 <= self.available_count:
+            attempts = min(count * 20, _MAX_REJECTION_ATTEMPTS)
+            while len(picked) < count and attempts > 0:
+                attempts -= 1
+                pos = _rng.randrange(self.size)
+                if self._test(pos):
+                    number_str = self.format(pos)
+                    if number_str not in skip:
+                        picked.add(number_str)
+            if len(picked) == count:
+                return list(picked)
+
+        pool = [n for n in self.available_numbers() if n not in skip and n not in picked]
+        missing = min(count - len(picked), len(pool))
+        return list(picked) + _rng.sample(pool, missing)
+
+
+# --- REGISTRO DE ÍNDICES POR RIFA (en memoria, por proceso) ---
+_indexes: dict[str, AvailabilityIndex] = {}
+_build_locks: dict[str, asyncio.Lock] = {}
+
+
+async def build_availability_index(db: AsyncSession, raffle_id: str) -> AvailabilityIndex:
+    """
+    Construye el bitmap de una rifa a partir de la tabla 'numbers' y de sus números excluidos.
+    """
+    source = await get_raffle_index_source(db, raffle_id)
+    if source is None:
+        raise ValueError("Rifa no encontrada.")
+    digits, excluded_numbers, taken_numbers = source
+
+    index = AvailabilityIndex(raffle_id, digits or 0)
+    index.mark_unavailable(excluded_numbers or [])
+    index.mark_unavailable(taken_numbers)
+    _indexes[raffle_id] = index
+    logging.info(f"Índice de disponibilidad construido para la rifa {raffle_id}: {index.available_count}/{index.size} disponibles.")
+    return index
+
+
+async def get_availability_index(db: AsyncSession, raffle_id: str) -> AvailabilityIndex:
+    """
+    Devuelve el índice de la rifa, reconstruyéndolo si no existe o si superó su edad máxima.
+    La edad máxima acota el desfase con los cambios hechos por otros workers.
+    """
+    index = _indexes.get(raffle_id)
+    if index is not None and not index.is_stale(settings.AVAILABILITY_INDEX_MAX_AGE_SECONDS):
+        return index
+
+    lock = _build_locks.setdefault(raffle_id, asyncio.Lock())
+    async with lock:
+        index = _indexes.get(raffle_id)
+        if index is not None and not index.is_stale(settings.AVAILABILITY_INDEX_MAX_AGE_SECONDS):
+            return index
+        return await build_availability_index(db, raffle_id)
+
+
+async def rebuild_all_availability_indexes(db: AsyncSession, raffle_ids: list[str]) -> int:
+    """Reconstruye los índices de las rifas indicadas (usado en el arranque)."""
+    _indexes.clear()
+    for raffle_id in raffle_ids:
+        await build_availability_index(db, raffle_id)
+    return len(raffle_ids)
+
+
+def invalidate_availability_index(raffle_id: str) -> None:
+    """Descarta el índice de una rifa; se reconstruirá en la próxima consulta."""
+    _indexes.pop(raffle_id, None)
+
+
+def mark_numbers_unavailable(raffle_id: str, numbers) -> None:
+    index = _indexes.get(raffle_id)
+    if index is not None:
+        index.mark_unavailable(numbers)
+
+
+def mark_numbers_available(raffle_id: str, numbers) -> None:
+    index = _indexes.get(raffle_id)
+    if index is not None:
+        index.mark_available(numbers)
+
+
+async def pick_random_available_numbers(db: AsyncSession, raffle_id: str, count: int) -> list[str]:
+    """
+    Elige 'count' números al azar desde el bitmap y los confirma contra la base de datos
+    con una sola consulta por intento. Los que resulten ocupados se corrigen en el índice.
+    """
+    index = await get_availability_index(db, raffle_id)
+    if count > index.available_count:
+        raise ValueError("No hay suficientes números disponibles en la rifa.")
+    chosen: list[str] = []
+    rejected: set[str] = set()
+
+    for _ in range(3):
+        candidates = index.sample(count - len(chosen), skip=rejected | set(chosen))
+        if not candidates:
+            break
+        taken = await get_taken_numbers(db, raffle_id, candidates)
+        if taken:
+            index.mark_unavailable(taken)
+            rejected |= taken
+        chosen.extend(n for n in candidates if n not in taken)
+        if len(chosen) >= count:
+            break
+
+    if len(chosen) < count:
+        raise ValueError("No se pudieron generar suficientes números aleatorios disponibles.")
+    return chosen
+
+
+async def verify_availability_index(db: AsyncSession, raffle_id: str) -> dict:
+    """
+    Compara el índice en memoria con un bitmap recién construido desde la base de datos.
+    Devuelve las diferencias y deja instalado el índice fresco.
+    """
+    current = _indexes.get(raffle_id)
+    fresh = await build_availability_index(db, raffle_id)
+    if current is None:
+        return {"raffle_id": raffle_id, "checked": False, "consistent": True, "mismatch_count": 0, "mismatches": []}
+    if current.digits != fresh.digits:
+        return {"raffle_id": raffle_id, "checked": True, "consistent": False, "mismatch_count": fresh.size, "mismatches": []}
+
+    mismatches = []
+    for byte_index, (old, new) in enumerate(zip(current._bits, fresh._bits)):
+        diff = old ^ new
+        if not diff:
+            continue
+        for bit in range(8):
+            if diff & (1 << bit):
+                pos = (byte_index << 3) + bit
+                mismatches.append({"number": fresh.format(pos), "index_available": bool(old & (1 << bit))})
+
+    if mismatches:
+        logging.warning(f"Índice de disponibilidad inconsistente para la rifa {raffle_id}: {len(mismatches)} diferencias.")
+    return {
+        "raffle_id": raffle_id,
+        "checked": True,
+        "consistent": not mismatches,
+        "mismatch_count": len(mismatches),
+        "mismatches": mismatches[:100],  # Se acota la respuesta; el conteo refleja el total.
+    }
@@ -0,0 +1,96 @@
+# app/services/board.py
+
+import json
+import zlib
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.repositories.raffle import get_raffle_board_source
+
+# --- Códigos de estado del tablero (2 bits por número) ---
+BOARD_STATUS_CODES = {
+    "available": 0,
+    "reserved": 1,
+    "assigned": 2,
+    "excluded": 3,
+}
+
+
+class RaffleBoard:
+    """
+    Estado completo del universo de números de una rifa, un código por número.
+    Se construye solo a partir de las filas no disponibles, sin recorrer el universo en SQL.
+    """
+
+    def __init__(self, raffle_id: str, digits: int, codes_by_position: dict[int, int]):
+        self.raffle_id = raffle_id
+        self.digits = digits
+        self.size = 10 ** digits
+        self.codes_by_position = codes_by_position
+
+    def packed(self) -> bytes:
+        """
+        Empaqueta 4 números por byte (2 bits cada uno, el primero en los bits bajos).
+        El empaquetado se hace con enteros grandes para no iterar byte a byte en Python.
+        """
+        padded_size = (self.size + 3) // 4 * 4
+        codes = bytearray(padded_size)
+        for position, code in self.codes_by_position.items():
+            codes[position] = code
+
+        packed_int = 0
+        for offset in range(4):
+            packed_int |= int.from_bytes(codes[offset::4], "little") << (2 * offset)
+        return packed_int.to_bytes(padded_size // 4, "little")
+
+    def runs(self) -> list[list[int]]:
+        """Codificación run-length: lista de [código, longitud] que cubre todo el universo."""
+        runs: list[list[int]] = []
+        cursor = 0
+        for position in sorted(self.codes_by_position):
+            code = self.codes_by_position[position]
+            if position > cursor:
+                runs.append([BOARD_STATUS_CODES["available"], position - cursor])
+            if runs and runs[-1][0] == code and position == cursor:
+                runs[-1][1] += 1
+            else:
+                runs.append([code, 1])
+            cursor = position + 1
+        if cursor < self.size:
+            runs.append([BOARD_STATUS_CODES["available"], self.size - cursor])
+        return runs
+
+
+async def build_raffle_board(db: AsyncSession, raffle_id: str) -> RaffleBoard:
+    """
+    Construye el tablero a partir de los estados de la tabla 'numbers' y de 'excluded_numbers'.
+    """
+    source = await get_raffle_board_source(db, raffle_id)
+    if source is None:
+        raise ValueError("Rifa no encontrada.")
+    digits, excluded_numbers, number_rows = source
+    digits = digits or 0
+
+    codes_by_position: dict[int, int] = {}
+    for number_str, status in number_rows:
+        code = BOARD_STATUS_CODES.get(status)
+        if code and len(number_str) == digits and number_str.isdigit():
+            codes_by_position[int(number_str)] = code
+    for number_str in excluded_numbers or []:
+        if len(number_str) == digits and number_str.isdigit():
+            codes_by_position[int(number_str)] = BOARD_STATUS_CODES["excluded"]
+
+    return RaffleBoard(raffle_id, digits, codes_by_position)
+
+
+def encode_board(board: RaffleBoard, encoding: str) -> tuple[bytes, str]:
+    """
+    Devuelve (cuerpo, media type) del tablero en la codificación pedida:
+    - 'packed': 2 bits por número comprimidos con zlib (100k números caben en pocos KB).
+    - 'rle': JSON con las corridas [código, longitud].
+    """
+    if encoding == "packed":
+        return zlib.compress(board.packed(), 6), "application/octet-stream"
+    if encoding == "rle":
+        body = json.dumps({"digits": board.digits, "size": board.size, "runs": board.runs()}, separators=(",", ":"))
+        return body.encode(), "application/json"
+    raise ValueError(f"Codificación de tablero no soportada: {encoding}")
@@ -2,6 +2,7 @@ from fastapi import HTTPException
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
 from datetime import datetime
+import io
 import locale
 
 # Se configura el locale a español para que los nombres de los meses salgan correctamente.
@@ -23,18 +24,122 @@ try:
 except Exception as e:
     raise ImportError(f"No se pudieron construir las rutas base de los assets: {e}")
 
-def draw_text_centered(draw, y, text, font, fill_color):
-    """Función de ayuda para dibujar texto centrado horizontalmente."""
-    img_width, _ = draw.im.size
-    try:
-        text_bbox = draw.textbbox((0, y), text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        x = (img_width - text_width) / 2
-        draw.text((x, y), text, font=font, fill=fill_color)
-    except Exception:
-        text_width, _ = draw.textsize(text, font=font)
-        x = (img_width - text_width) / 2
-        draw.text((x, y), text, font=font, fill=fill_color)
+TEXT_COLOR = (0, 0, 0)
+BOX_FILL = (255, 255, 255, 210)  # Fondo blanco con ligera transparencia
+BOX_PADDING = 60
+BOX_MARGIN_X = 60
+
+# Tamaños de fuente por nombre
+FONT_SIZES = {"title": 60, "subtitle": 35, "main": 40, "numbers": 45, "small": 25}
+
+# Diseño del comprobante: (texto o plantilla con los campos del tiquete, fuente, espacio debajo).
+# Las líneas sin campos son fijas y se miden una sola vez al iniciar.
+RECEIPT_LAYOUT = [
+    ("¡Compra Exitosa!", "title", 20),
+    ("Rifa: {raffle_name}", "subtitle", 40),
+    ("Comprador: {buyer_name}", "main", 15),
+    ("Fecha de Compra: {purchase_date}", "main", 15),
+    ("Total Pagado: {price}", "main", 40),
+    ("Tus Números:", "title", 20),
+    ("{numbers}", "numbers", 40),
+    ("Fecha del Sorteo: {draw_date}", "subtitle", 50),
+    ("ID de Transacción: {ticket_id}", "small", 5),
+    ("Conserva este comprobante. ¡Mucha suerte!", "small", 0),
+]
+
+
+class ReceiptRenderer:
+    """
+    Dibuja el comprobante de compra. La plantilla se decodifica una sola vez (ya en RGBA y RGB),
+    las fuentes se cargan una vez por tamaño y las líneas fijas se miden al construirlo; cada
+    render solo mide y dibuja el texto variable, y compone únicamente la franja del recuadro
+    blanco en lugar de la imagen completa.
+    """
+
+    def __init__(self, template_path: Path = TEMPLATE_IMAGE_PATH, font_path: Path = FONT_PATH):
+        with Image.open(template_path) as template:
+            self._template_rgba = template.convert("RGBA")
+        self._template_rgb = self._template_rgba.convert("RGB")
+        self.size = self._template_rgba.size
+
+        try:
+            self._fonts = {name: ImageFont.truetype(str(font_path), size) for name, size in FONT_SIZES.items()}
+        except IOError:
+            # Fallback a fuentes por defecto si no se encuentra el archivo ARIAL.TTF
+            self._fonts = {name: ImageFont.load_default(size) for name, size in FONT_SIZES.items()}
+
+        self._layout = []
+        for text, font_name, spacing in RECEIPT_LAYOUT:
+            font = self._fonts[font_name]
+            is_static = "{" not in text
+            self._layout.append((text, font, spacing, font.getbbox(text) if is_static else None))
+
+    @staticmethod
+    def format_fields(ticket_data: dict) -> dict:
+        """Convierte los datos del tiquete en los textos que se dibujan (mismos valores por defecto de siempre)."""
+        total_price = ticket_data.get("total_price", 0) or 0
+        return {
+            "raffle_name": ticket_data.get("raffle_name", "N/A"),
+            "ticket_id": ticket_data.get("ticket_id", "N/A"),
+            "buyer_name": ticket_data.get("buyer_name", "N/A"),
+            "numbers": ", ".join(sorted(ticket_data.get("numbers", []))),
+            "purchase_date": ticket_data.get("purchase_date", "Fecha no definida"),
+            "draw_date": ticket_data.get("draw_date", "Fecha no definida"),
+            "price": f"${total_price:,.0f} COP" if total_price > 0 else "N/A",
+        }
+
+    def render(self, ticket_data: dict) -> Image.Image:
+        """Genera el comprobante centrado vertical y horizontalmente; devuelve una imagen RGB."""
+        fields = self.format_fields(ticket_data)
+        img_width, img_height = self.size
+
+        # Una sola medición por línea: de la caja salen tanto el alto como el ancho.
+        lines = []
+        for text, font, spacing, bbox in self._layout:
+            if bbox is None:
+                text = text.format(**fields)
+                bbox = font.getbbox(text)
+            lines.append((text, font, spacing, bbox))
+        total_content_height = sum(bbox[3] - bbox[1] + spacing for _, _, spacing, bbox in lines)
+
+        y = (img_height - total_content_height) / 2
+        box_y1 = y - BOX_PADDING
+        box_y2 = y + total_content_height + BOX_PADDING
+
+        # Fuera del recuadro la capa es transparente, así que solo se compone esa franja.
+        band_top = max(int(box_y1) - 1, 0)
+        band_bottom = min(int(box_y2) + 2, img_height)
+        band_box = (0, band_top, img_width, band_bottom)
+        overlay = Image.new("RGBA", (img_width, band_bottom - band_top), (255, 255, 255, 0))
+        draw = ImageDraw.Draw(overlay)
+        draw.rectangle([BOX_MARGIN_X, box_y1 - band_top, img_width - BOX_MARGIN_X, box_y2 - band_top], fill=BOX_FILL)
+
+        for text, font, spacing, bbox in lines:
+            x = (img_width - (bbox[2] - bbox[0])) / 2
+            draw.text((x, y - band_top), text, font=font, fill=TEXT_COLOR)
+            y += bbox[3] - bbox[1] + spacing
+
+        img = self._template_rgb.copy()
+        band = Image.alpha_composite(self._template_rgba.crop(band_box), overlay)
+        img.paste(band.convert("RGB"), band_box)
+        return img
+
+    def render_jpeg(self, ticket_data: dict, quality: int = 95) -> bytes:
+        buffer = io.BytesIO()
+        self.render(ticket_data).save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+
+_receipt_renderer: ReceiptRenderer | None = None
+
+
+def init_receipt_renderer() -> ReceiptRenderer:
+    """Carga plantilla y fuentes; se llama al iniciar la app para que la primera petición no lo pague."""
+    global _receipt_renderer
+    if _receipt_renderer is None:
+        _receipt_renderer = ReceiptRenderer()
+    return _receipt_renderer
+
 
 def generate_raffle_image(ticket_data: dict):
     """
@@ -42,79 +147,39 @@ def generate_raffle_image(ticket_data: dict):
     con el contenido centrado vertical y horizontalmente.
     """
     try:
-        template = Image.open(TEMPLATE_IMAGE_PATH)
-        img = template.copy().convert("RGBA")
+        renderer = init_receipt_renderer()
     except FileNotFoundError:
         raise HTTPException(status_code=500, detail="Error Crítico: No se encontró la plantilla de imagen.")
+    return renderer.render(ticket_data)
 
-    img_width, img_height = img.size
-    overlay = Image.new("RGBA", img.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(overlay)
 
-    # --- 1. Definición de Fuentes y Colores ---
-    try:
-        font_title = ImageFont.truetype(str(FONT_PATH), 60)
-        font_subtitle = ImageFont.truetype(str(FONT_PATH), 35)
-        font_main = ImageFont.truetype(str(FONT_PATH), 40)
-        font_numbers = ImageFont.truetype(str(FONT_PATH), 45)
-        font_small = ImageFont.truetype(str(FONT_PATH), 25)
-    except IOError:
-        # Fallback a fuentes por defecto si no se encuentra el archivo ARIAL.TTF
-        font_title, font_subtitle, font_main, font_numbers, font_small = [ImageFont.load_default(s) for s in [60, 35, 40, 45, 25]]
-
-    text_color = (0, 0, 0)
-
-    # --- 2. Extracción y Formateo de TODOS los Datos ---
-    raffle_name = ticket_data.get("raffle_name", "N/A")
-    ticket_id = ticket_data.get("ticket_id", "N/A")
-    buyer_name = ticket_data.get("buyer_name", "N/A")
-    numbers_str = ", ".join(sorted(ticket_data.get("numbers", [])))
-    
-    # Se añade la fecha de compra que faltaba
-    purchase_date_str = ticket_data.get("purchase_date", "Fecha no definida")
-    
-    draw_date_str = ticket_data.get("draw_date", "Fecha no definida")
-
-    total_price = ticket_data.get("total_price", 0)
-    price_str = f"${total_price:,.0f} COP" if total_price > 0 else "N/A"
-
-    # --- 3. Lógica para Centrado Vertical ---
-
-    # Se define todo el contenido que se va a dibujar
-    content_lines = [
-        ("¡Compra Exitosa!", font_title, 20),
-        (f"Rifa: {raffle_name}", font_subtitle, 40),
-        (f"Comprador: {buyer_name}", font_main, 15),
-        (f"Fecha de Compra: {purchase_date_str}", font_main, 15),
-        (f"Total Pagado: {price_str}", font_main, 40),
-        ("Tus Números:", font_title, 20),
-        (numbers_str, font_numbers, 40),
-        (f"Fecha del Sorteo: {draw_date_str}", font_subtitle, 50),
-        (f"ID de Transacción: {ticket_id}", font_small, 5),
-        ("Conserva este comprobante. ¡Mucha suerte!", font_small, 0)
-    ]
-
-    # Se calcula la altura total del bloque de texto
-    total_content_height = sum(font.getbbox(text)[3] - font.getbbox(text)[1] + spacing for text, font, spacing in content_lines)
-
-    # Se calcula la posición 'y' inicial para centrar el bloque
-    y = (img_height - total_content_height) / 2
-
-    # --- 4. Dibujo del Fondo Blanco y los Textos ---
-
-    # El fondo blanco se dibuja dinámicamente alrededor del contenido
-    padding = 60
-    box_y1 = y - padding
-    box_y2 = y + total_content_height + padding
-    box_xy = [60, box_y1, img_width - 60, box_y2]
-    draw.rectangle(box_xy, fill=(255, 255, 255, 210)) # Fondo blanco con ligera transparencia
-
-    # Se dibuja cada línea de texto, ahora perfectamente centrada
-    for text, font, spacing in content_lines:
-        line_height = font.getbbox(text)[3] - font.getbbox(text)[1]
-        draw_text_centered(draw, y, text, font, text_color)
-        y += line_height + spacing # Se incrementa 'y' para la siguiente línea
-
-    # --- 5. Composición Final de la Imagen ---
-    img_with_overlay = Image.alpha_composite(img, overlay)
-    return img_with_overlay.convert("RGB")
\ No newline at end of file
+# --- VARIANTES DERIVADAS DEL COMPROBANTE MAESTRO ---
+# Formatos de salida soportados: nombre -> (formato de Pillow, tipo MIME, extensión).
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+}
+
+
+def derive_receipt_variant(master_jpeg: bytes, max_width: int | None, image_format: str, quality: int) -> bytes:
+    """
+    Re-codifica el comprobante maestro (JPEG) a otro formato y, si 'max_width' es menor que
+    su ancho, lo reduce conservando la proporción.
+    """
+    pillow_format = IMAGE_FORMATS[image_format][0]
+    with Image.open(io.BytesIO(master_jpeg)) as master:
+        if max_width and master.width > max_width:
+            target_size = (max_width, round(master.height * max_width / master.width))
+            # draft() deja que el decodificador JPEG reduzca por bloques antes del resize fino.
+            master.draft("RGB", target_size)
+            img = master.resize(target_size, Image.LANCZOS)
+        else:
+            img = master.convert("RGB")
+    buffer = io.BytesIO()
+    options = {"quality": quality}
+    if pillow_format == "JPEG":
+        options.update(optimize=True, progressive=True)
+    else:
+        options["method"] = 4
+    img.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
@@ -0,0 +1,207 @@
+# app/services/notification_outbox.py
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import async_session_local
+from app.db.repositories.notification import (
+    enqueue_notification,
+    claim_notification_batch,
+    mark_notification_sent,
+    mark_notification_failed,
+)
+from app.schemas.ticket import TicketInfo
+from app.services.send_whatsapp_message import NotificationResult, build_purchase_payload, whatsapp_client
+
+
+# --- ENCOLADO (dentro de la transacción de la compra) ---
+async def enqueue_purchase_notification(db: AsyncSession, ticket: TicketInfo):
+    """
+    Deja la notificación de compra en la bandeja de salida. No hace ninguna llamada de red:
+    se confirma junto con el tiquete (get_db hace el commit) y la entrega el despachador.
+    """
+    if ticket.status != 'paid' or not ticket.phone:
+        return
+    payload = build_purchase_payload(ticket.phone, ticket.name, ticket.id)
+    await enqueue_notification(db, "purchase", ticket.id, ticket.phone, payload)
+    logging.info(f"Notificación de compra del tiquete {ticket.id} encolada para {ticket.phone}.")
+
+
+class _RateLimiter:
+    """Espacia los envíos para no pasar de 'rate_per_second' (0 = sin límite)."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        # Sin 'await' entre la lectura y la escritura de '_next_slot': no hace falta un lock.
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# --- DESPACHADOR ---
+class NotificationDispatcher:
+    """
+    Tarea periódica en el event loop que entrega la bandeja de salida. Cada ciclo reclama un
+    lote con SKIP LOCKED (todos los workers de gunicorn pueden despachar a la vez), lo envía
+    en paralelo con concurrencia y ritmo acotados, y guarda el resultado de cada fila:
+      - enviada: 'sent' con el id del mensaje de Meta.
+      - error recuperable (red, 429, 5xx): vuelve a 'pending' con backoff exponencial.
+      - error no recuperable o intentos agotados: 'dead', para revisión manual.
+    La entrega es al menos una vez: si el worker muere después de enviar y antes de guardar,
+    la fila se reenvía cuando vence su lease.
+    """
+
+    def __init__(
+        self,
+        poll_interval_seconds: float,
+        batch_size: int,
+        concurrency: int,
+        rate_per_second: float,
+        max_attempts: int,
+        backoff_base_seconds: float,
+        backoff_max_seconds: float,
+        lease_seconds: float,
+    ):
+        self.poll_interval_seconds = poll_interval_seconds
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.lease_seconds = lease_seconds
+        self._rate_limiter = _RateLimiter(rate_per_second)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: asyncio.Task | None = None
+        self.metrics = {
+            "runs": 0,
+            "batches": 0,
+            "sent": 0,
+            "retried": 0,
+            "dead": 0,
+            "lease_lost": 0,
+            "errors": 0,
+            "last_batch_at": None,
+            "last_batch_size": 0,
+            "last_batch_duration_ms": None,
+            "last_error": None,
+        }
+
+    def _retry_at(self, attempts: int) -> datetime:
+        delay = min(self.backoff_base_seconds * 2 ** (attempts - 1), self.backoff_max_seconds)
+        # Jitter para que los reintentos de un mismo corte no lleguen todos juntos.
+        delay *= random.uniform(0.8, 1.2)
+        return datetime.now(timezone.utc) + timedelta(seconds=delay)
+
+    async def _deliver(self, payload: dict) -> NotificationResult:
+        async with self._semaphore:
+            await self._rate_limiter.acquire()
+            return await whatsapp_client.send_template(payload)
+
+    async def run_once(self) -> int:
+        """Reclama y entrega un lote; devuelve cuántas notificaciones procesó."""
+        started = time.perf_counter()
+        async with async_session_local() as session:
+            async with session.begin():
+                rows = await claim_notification_batch(session, self.batch_size, self.lease_seconds, self.max_attempts)
+        if not rows:
+            return 0
+
+        results = await asyncio.gather(*(self._deliver(row.payload) for row in rows), return_exceptions=True)
+
+        async with async_session_local() as session:
+            async with session.begin():
+                for row, result in zip(rows, results):
+                    if isinstance(result, Exception):
+                        result = NotificationResult(ok=False, error=f"Error inesperado: {result}", retryable=True)
+                    if result.ok:
+                        outcome = "sent"
+                        recorded = await mark_notification_sent(session, row.id, row.attempts, result.status, result.message_id)
+                    elif result.retryable and row.attempts < self.max_attempts:
+                        outcome = "retried"
+                        recorded = await mark_notification_failed(
+                            session, row.id, row.attempts, result.status, result.error, self._retry_at(row.attempts)
+                        )
+                    else:
+                        outcome = "dead"
+                        recorded = await mark_notification_failed(session, row.id, row.attempts, result.status, result.error, None)
+
+                    if not recorded:
+                        # El lease venció durante el envío y otro worker ya reclamó la fila.
+                        self.metrics["lease_lost"] += 1
+                        logging.warning(f"Notificación {row.id}: el lease venció antes de guardar el resultado ({outcome}).")
+                        continue
+                    self.metrics[outcome] += 1
+                    if outcome == "dead":
+                        logging.error(
+                            f"Notificación {row.id} a {row.recipient} descartada tras {row.attempts} intentos: {result.error}"
+                        )
+
+        self.metrics["batches"] += 1
+        self.metrics["last_batch_at"] = datetime.now(timezone.utc).isoformat()
+        self.metrics["last_batch_size"] = len(rows)
+        self.metrics["last_batch_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return len(rows)
+
+    async def _run_forever(self):
+        while True:
+            processed = 0
+            try:
+                processed = await self.run_once()
+                self.metrics["runs"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["errors"] += 1
+                self.metrics["last_error"] = str(e)
+                logging.error(f"Error en el despachador de notificaciones: {e}", exc_info=True)
+            # Con un lote lleno probablemente hay más pendientes: se sigue sin esperar.
+            if processed < self.batch_size:
+                await asyncio.sleep(self.poll_interval_seconds)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever(), name="notification-dispatcher")
+
+    async def stop(self):
+        # Las filas que quedaron a mitad de envío se reclaman cuando vence su lease.
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_metrics(self) -> dict:
+        return {
+            **self.metrics,
+            "running": self._task is not None and not self._task.done(),
+            "concurrency": self.concurrency,
+            "rate_per_second": self.rate_per_second,
+        }
+
+
+notification_dispatcher = NotificationDispatcher(
+    poll_interval_seconds=settings.NOTIFICATION_POLL_INTERVAL_SECONDS,
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    concurrency=settings.NOTIFICATION_CONCURRENCY,
+    rate_per_second=settings.NOTIFICATION_RATE_PER_SECOND,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    backoff_base_seconds=settings.NOTIFICATION_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.NOTIFICATION_BACKOFF_MAX_SECONDS,
+    lease_seconds=settings.NOTIFICATION_LEASE_SECONDS,
+)
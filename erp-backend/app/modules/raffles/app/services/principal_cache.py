@@ -0,0 +1,90 @@
+# app/services/principal_cache.py
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Usuario autenticado: solo los campos que usan los endpoints y servicios (id y username)."""
+    id: int
+    username: str
+    is_active: bool
+
+
+class PrincipalCache:
+    """
+    Cache LRU acotado con TTL de los usuarios autenticados, indexado por el 'sub' del token y
+    por worker. Los cambios a usuarios hechos en este worker lo invalidan (eventos del ORM);
+    los de otros workers se ven al vencer el TTL.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Principal]]" = OrderedDict()
+        self.metrics = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0}
+
+    async def get(self, db: AsyncSession, username: str) -> Principal | None:
+        entry = self._entries.get(username)
+        if entry is not None:
+            loaded_at, principal = entry
+            if time.monotonic() - loaded_at <= self.ttl_seconds:
+                self._entries.move_to_end(username)
+                self.metrics["hits"] += 1
+                return principal
+            self.metrics["expired"] += 1
+
+        self.metrics["misses"] += 1
+        result = await db.execute(
+            select(User.id, User.username, User.is_active).where(User.username == username)
+        )
+        row = result.first()
+        if row is None:
+            # Los usuarios inexistentes no se guardan: uno recién registrado debe verse de inmediato.
+            self._entries.pop(username, None)
+            return None
+
+        principal = Principal(id=row.id, username=row.username, is_active=row.is_active is not False)
+        self._entries[username] = (time.monotonic(), principal)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, username: str) -> None:
+        if self._entries.pop(username, None) is not None:
+            self.metrics["invalidations"] += 1
+
+    def get_metrics(self) -> dict:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_ratio": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+)
+
+
+# --- INVALIDACIÓN AL MODIFICAR O BORRAR UN USUARIO ---
+# Cualquier UPDATE/DELETE de un User por el ORM (desactivarlo, renombrarlo, cambiar su
+# contraseña) lo saca del cache; si cambió el username también se saca el nombre anterior.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User):
+    principal_cache.invalidate(target.username)
+    for previous_username in inspect(target).attrs.username.history.deleted:
+        principal_cache.invalidate(previous_username)
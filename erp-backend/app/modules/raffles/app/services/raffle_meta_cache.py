@@ -0,0 +1,96 @@
+# app/services/raffle_meta_cache.py
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.repositories.raffle import get_raffle_meta_row
+
+
+@dataclass(frozen=True)
+class RaffleMeta:
+    """Campos de la rifa que casi no cambian durante la venta. Los excluidos van en un set."""
+    id: str
+    short_id: str
+    name: str
+    status: str
+    dijits_per_number: int
+    numbers_per_ticket: int
+    excluded_numbers: frozenset[str]
+    price: int | None
+    end_date: datetime
+
+    @property
+    def is_on_sale(self) -> bool:
+        return (self.status or "").lower() in ('active', 'open')
+
+
+class RaffleMetaCache:
+    """
+    Cache LRU acotado con TTL de los metadatos de las rifas, por worker. Las ediciones hechas
+    en este worker lo invalidan explícitamente (update_raffle_service); las de otros workers
+    se ven al vencer el TTL.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, RaffleMeta]]" = OrderedDict()
+        self.metrics = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0}
+
+    async def get(self, db: AsyncSession, raffle_id: str) -> RaffleMeta | None:
+        entry = self._entries.get(raffle_id)
+        if entry is not None:
+            loaded_at, meta = entry
+            if time.monotonic() - loaded_at <= self.ttl_seconds:
+                self._entries.move_to_end(raffle_id)
+                self.metrics["hits"] += 1
+                return meta
+            self.metrics["expired"] += 1
+
+        self.metrics["misses"] += 1
+        row = await get_raffle_meta_row(db, raffle_id)
+        if row is None:
+            # Las rifas inexistentes no se guardan: una rifa recién creada debe verse de inmediato.
+            self._entries.pop(raffle_id, None)
+            return None
+
+        meta = RaffleMeta(
+            id=row.id,
+            short_id=row.short_id,
+            name=row.name,
+            status=row.status,
+            dijits_per_number=row.dijits_per_number,
+            numbers_per_ticket=row.numbers_per_ticket,
+            excluded_numbers=frozenset(row.excluded_numbers or ()),
+            price=row.price,
+            end_date=row.end_date,
+        )
+        self._entries[raffle_id] = (time.monotonic(), meta)
+        self._entries.move_to_end(raffle_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return meta
+
+    def invalidate(self, raffle_id: str) -> None:
+        if self._entries.pop(raffle_id, None) is not None:
+            self.metrics["invalidations"] += 1
+
+    def get_metrics(self) -> dict:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_ratio": round(self.metrics["hits"] / lookups, 4) if lookups else None,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+raffle_meta_cache = RaffleMetaCache(
+    ttl_seconds=settings.RAFFLE_META_CACHE_TTL_SECONDS,
+    max_entries=settings.RAFFLE_META_CACHE_MAX_ENTRIES,
+)
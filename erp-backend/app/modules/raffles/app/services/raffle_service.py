@@ -8,9 +8,29 @@ from sqlalchemy import text, select, func, and_, cast, Integer
 from sqlalchemy.orm import selectinload
 from sqlalchemy.orm import Mapped, mapped_column
 
-from app.schemas.raffle import RaffleCreateRequest, RaffleResponse, RaffleStatistics, SoldTicketInfo, RaffleUpdateRequest, RaffleDetailResponse
-from app.db.models import Raffle, Ticket, Number, User
-from app.modules.raffles.app.db.repositories.raffle import is_number_available, query_random_available_numbers
+from app.schemas.raffle import RaffleCreateRequest, RaffleResponse, RaffleStatistics, SoldTicketInfo, RaffleUpdateRequest, RaffleDetailResponse, RaffleListResponse, SoldTicketPage
+from app.db.models import Raffle, Ticket, Number, User, RaffleStats
+from app.db.repositories.raffle import (
+    get_numbers_status,
+    get_raffle_by_id,
+    get_raffle_ticket_stats,
+    get_sold_tickets_page,
+    raffle_has_active_tickets,
+)
+from app.db.repositories.stats import bump_raffle_version, get_raffle_version, get_raffles_version
+from app.core.config import settings
+from app.services.response_cache import CachedResponse, VersionedResponseCache
+from app.services.raffle_meta_cache import raffle_meta_cache
+from app.utils.http_cache import etag_matches
+from app.utils.responses import model_to_json
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.services.board import RaffleBoard, build_raffle_board
+from app.services.availability_index import (
+    get_availability_index,
+    invalidate_availability_index,
+    pick_random_available_numbers,
+    verify_availability_index,
+)
 
 
 
@@ -79,6 +99,10 @@ async def create_raffle_service(data: RaffleCreateRequest, db: AsyncSession, use
         # Se añaden todos los nuevos objetos a la sesión de la base de datos
         db.add_all(excluded_number_objects)
 
+    # La fila de estadísticas nace con la rifa; su versión invalida las respuestas cacheadas del listado.
+    await db.flush()
+    await bump_raffle_version(db, raffle_id)
+
     # 4. Se confirman todos los cambios en una sola transacción
     await db.commit()
     await db.refresh(new_raffle)
@@ -88,28 +112,17 @@ async def create_raffle_service(data: RaffleCreateRequest, db: AsyncSession, use
 # Esta función actualiza los detalles de una rifa existente, asegurándose de que no se cambien los dígitos de una rifa que ya tiene tiquetes vendidos.
 async def update_raffle_service(raffle_id: str, data: RaffleUpdateRequest, db: AsyncSession) -> RaffleDetailResponse:
     """
-    Actualiza una rifa existente de forma segura, cargando todas las relaciones
-    necesarias explícitamente y devolviendo la respuesta detallada completa.
+    Actualiza una rifa existente de forma segura. La validación de tiquetes activos es un
+    EXISTS en SQL; el árbol de tiquetes de la rifa no se carga.
     """
-    # 1. Obtener la rifa cargando sus relaciones de forma explícita (Eager Loading)
-    #    Esto previene el error 'greenlet_spawn'.
-    query = (
-        select(Raffle)
-        .options(
-            selectinload(Raffle.tickets).selectinload(Ticket.numbers), # Carga tiquetes y sus números
-            selectinload(Raffle.owner)                                # Carga el dueño
-        )
-        .where(Raffle.id == raffle_id)
-    )
-    result = await db.execute(query)
-    raffle_in_db = result.scalars().first()
+    raffle_in_db = await get_raffle_by_id(db, raffle_id)
     
     if not raffle_in_db:
         raise ValueError("La rifa no fue encontrada.")
 
     # --- LÓGICA DE VALIDACIÓN MEJORADA ---
     # Se verifica si existe algún tiquete que NO esté cancelado.
-    has_active_tickets = any(ticket.status not in ['cancelled'] for ticket in raffle_in_db.tickets)
+    has_active_tickets = await raffle_has_active_tickets(db, raffle_id)
     # Obtiene un diccionario solo con los campos que el frontend envió
     update_data = data.model_dump(exclude_unset=True)
 
@@ -126,18 +139,24 @@ async def update_raffle_service(raffle_id: str, data: RaffleUpdateRequest, db: A
             setattr(raffle_in_db, key, value)
     
     db.add(raffle_in_db)
+    await bump_raffle_version(db, raffle_id)
     await db.commit()
+
+    # Los dígitos o los excluidos pudieron cambiar: el bitmap y los metadatos se recargan en la próxima consulta.
+    invalidate_availability_index(raffle_id)
+    raffle_meta_cache.invalidate(raffle_id)
     
-    # Se refrescan las relaciones que podrían haber cambiado o que se necesitan para la respuesta
-    await db.refresh(raffle_in_db, attribute_names=['tickets', 'owner'])
-    
-    return _build_raffle_detail_response(raffle_in_db)
+    await db.refresh(raffle_in_db)
+    return await _load_raffle_detail_response(raffle_in_db, db)
 
 # --- FUNCIÓN AUXILIAR CORREGIDA ---
 # Esta función construye la respuesta de una rifa, incluyendo estadísticas y participantes.
 # Se asegura de que los cálculos de estadísticas sean correctos y se manejen adecuadamente los números excluidos.   
-def _build_raffle_response(raffle: Raffle, tickets_sold: int, participants: int) -> RaffleResponse:
-    # --- LÓGICA DE ESTADÍSTICAS CORREGIDA ---
+def _build_raffle_statistics(raffle: Raffle, stats: RaffleStats | None) -> RaffleStatistics:
+    """
+    Combina el universo vendible de la rifa con los contadores mantenidos en raffle_stats.
+    'tickets_sold' cuenta pagados y pendientes, igual en el listado y en el detalle.
+    """
     # 1. Se calcula el universo total de números.
     universo = 10 ** raffle.dijits_per_number if raffle.dijits_per_number else 0
     
@@ -146,14 +165,24 @@ def _build_raffle_response(raffle: Raffle, tickets_sold: int, participants: int)
     
     # 3. Se calcula cuántos tiquetes (paquetes) se pueden vender en total.
     # Se usa división entera (//) por si acaso, aunque la exclusión ya debería garantizarlo.
-    total_tickets_posibles = numeros_vendibles // raffle.numbers_per_ticket
+    total_tickets_posibles = numeros_vendibles // raffle.numbers_per_ticket if raffle.numbers_per_ticket > 0 else 0
 
-    statistics = RaffleStatistics(
-        tickets_sold=tickets_sold,
-        total_tickets=total_tickets_posibles, # <-- Se usa el cálculo correcto.
-        participants=participants
+    if stats is None:
+        # Rifa sin tiquetes todavía: aún no tiene fila en raffle_stats.
+        return RaffleStatistics(tickets_sold=0, total_tickets=total_tickets_posibles, participants=0)
+    return RaffleStatistics(
+        tickets_sold=stats.paid_tickets + stats.pending_tickets,
+        total_tickets=total_tickets_posibles,
+        participants=stats.participants,
+        paid_tickets=stats.paid_tickets,
+        pending_tickets=stats.pending_tickets,
+        cancelled_tickets=stats.cancelled_tickets,
+        revenue=stats.revenue
     )
 
+def _build_raffle_response(raffle: Raffle, stats: RaffleStats | None) -> RaffleResponse:
+    statistics = _build_raffle_statistics(raffle, stats)
+
     # --- RESPUESTA CORREGIDA ---
     return RaffleResponse(
         id=raffle.id,
@@ -178,51 +207,18 @@ def _build_raffle_response(raffle: Raffle, tickets_sold: int, participants: int)
 
 # --- FUNCIÓN AUXILIAR PARA DETALLES DE RIFA ---
 # Esta función construye la respuesta detallada de una rifa, incluyendo estadísticas y tiquetes vendidos.
-def _build_raffle_detail_response(raffle: Raffle) -> RaffleDetailResponse:
+def _build_raffle_detail_response(
+    raffle: Raffle,
+    stats: RaffleStats | None,
+    sold_tickets: list[SoldTicketInfo],
+    sold_tickets_next_cursor: str | None
+) -> RaffleDetailResponse:
     """
-    Construye la respuesta detallada de una rifa, incluyendo estadísticas precisas
-    y una lista completa de los tiquetes activos (pagados y pendientes) con toda
-    la información necesaria para el frontend.
+    Construye la respuesta detallada de una rifa a partir de sus contadores mantenidos
+    y de la primera página de tiquetes activos (pagados y pendientes).
     """
-    # --- LÓGICA DE ESTADÍSTICAS (SIN CAMBIOS) ---
-    universo = 10 ** raffle.dijits_per_number if raffle.dijits_per_number else 0
-    numeros_vendibles = universo - len(raffle.excluded_numbers)
-    total_tickets_posibles = numeros_vendibles // raffle.numbers_per_ticket if raffle.numbers_per_ticket > 0 else 0
-
-    # --- LÓGICA DE FILTRADO Y CONTEO (AJUSTADA) ---
-    
-    # 1. Filtramos para obtener tiquetes que no estén cancelados (es decir, pagados y pendientes)
-    active_tickets = [t for t in raffle.tickets if t.status in ['paid', 'pending']]
-    
-    # 2. El conteo de "tiquetes vendidos" ahora incluye tanto pagados como pendientes para las estadísticas de progreso.
-    tickets_sold_count = len(active_tickets)
-    
-    # 3. El conteo de participantes únicos se basa en los tiquetes activos.
-    participants_count = len(set(t.name for t in active_tickets))
-
-    statistics = RaffleStatistics(
-        tickets_sold=tickets_sold_count,
-        total_tickets=total_tickets_posibles,
-        participants=participants_count
-    )
-    
-    # --- CONSTRUCCIÓN DE LA LISTA DE TIQUETES (CORREGIDA Y ENRIQUECIDA) ---
-    # Aquí está el cambio principal: ahora poblamos el objeto SoldTicketInfo
-    # con todos los datos que el frontend necesita.
-    sold_tickets_info = []
-    for t in active_tickets:
-        sold_tickets_info.append(
-            SoldTicketInfo(
-                id=t.id,
-                name=t.name,
-                numbers=[n.number for n in t.numbers],
-                status=t.status,
-                created_at=t.created_at,
-                responsible=t.user.username if t.user else "Sistema" # Manejo seguro por si no hay usuario
-            )
-        )
+    statistics = _build_raffle_statistics(raffle, stats)
 
-    # --- RESPUESTA FINAL (SIN CAMBIOS ESTRUCTURALES) ---
     return RaffleDetailResponse(
         id=raffle.id,
         short_id=raffle.short_id,
@@ -237,78 +233,151 @@ def _build_raffle_detail_response(raffle: Raffle) -> RaffleDetailResponse:
         numbers_per_ticket=raffle.numbers_per_ticket,
         excluded_numbers=raffle.excluded_numbers,
         statistics=statistics,
-        sold_tickets=sold_tickets_info # <-- Ahora esta lista contiene toda la información
+        sold_tickets=sold_tickets,
+        sold_tickets_next_cursor=sold_tickets_next_cursor
     )
 
+# --- PÁGINA DE TIQUETES VENDIDOS ---
+# Cantidad de tiquetes vendidos que se incluyen directamente en el detalle de la rifa.
+SOLD_TICKETS_PAGE_SIZE = 50
+
+async def _get_sold_tickets_page(
+    raffle_id: str,
+    db: AsyncSession,
+    cursor: str | None,
+    limit: int
+) -> tuple[list[SoldTicketInfo], str | None]:
+    rows, has_more = await get_sold_tickets_page(db, raffle_id, decode_cursor(cursor) if cursor else None, limit)
+    sold_tickets = [
+        SoldTicketInfo(
+            id=row.id,
+            name=row.name,
+            numbers=row.numbers or [],
+            status=row.status,
+            created_at=row.created_at,
+            responsible=row.responsible or "Sistema" # Manejo seguro por si no hay usuario
+        )
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more and rows else None
+    return sold_tickets, next_cursor
+
+async def _load_raffle_detail_response(raffle: Raffle, db: AsyncSession) -> RaffleDetailResponse:
+    stats = await get_raffle_ticket_stats(db, raffle.id)
+    sold_tickets, next_cursor = await _get_sold_tickets_page(raffle.id, db, None, SOLD_TICKETS_PAGE_SIZE)
+    return _build_raffle_detail_response(raffle, stats, sold_tickets, next_cursor)
+
 # --- FUNCIÓN PARA LISTAR LAS RIFAS ---
 async def list_raffles_service(db: AsyncSession) -> list[RaffleResponse]:
-    subquery_tickets_sold = (
-        select(Ticket.raffle_id, func.count(Number.id).label("tickets_sold_count"))
-        .join(Number, Ticket.id == Number.ticket_id)
-        .where(Ticket.status == 'paid')
-        .group_by(Ticket.raffle_id)
-        .subquery()
-    )
-    subquery_participants = (
-        select(Ticket.raffle_id, func.count(func.distinct(Ticket.name)).label("participants_count"))
-        .where(Ticket.status == 'paid')
-        .group_by(Ticket.raffle_id)
-        .subquery()
-    )
+    # Las estadísticas se leen de raffle_stats, mantenida con cada cambio de estado de tiquete;
+    # el listado ya no agrega las tablas 'tickets' y 'numbers' en cada petición.
     query = (
-        select(Raffle,
-               func.coalesce(subquery_tickets_sold.c.tickets_sold_count, 0).label("tickets_sold"),
-               func.coalesce(subquery_participants.c.participants_count, 0).label("participants"))
-        .outerjoin(subquery_tickets_sold, Raffle.id == subquery_tickets_sold.c.raffle_id)
-        .outerjoin(subquery_participants, Raffle.id == subquery_participants.c.raffle_id)
+        select(Raffle, RaffleStats)
+        .outerjoin(RaffleStats, RaffleStats.raffle_id == Raffle.id)
     )
     result = await db.execute(query)
     
-# 1. Primero. creo una lista vacía para almacenar el objeto rifa completo, los tiquetes vendidos y los participantes.
+# 1. Primero. creo una lista vacía para almacenar las respuestas de las rifas.
     raffles_responses = []
-# 2. Obtiene todos los resultados únicos de la consulta de la base de datos.
-#    El resultado es una lista donde cada elemento es una tupla, por ejemplo:
-#    (objeto_Raffle, 10, 5)
-    database_rows = result.unique().all()
+# 2. Cada fila es una tupla (objeto_Raffle, objeto_RaffleStats o None).
+    database_rows = result.all()
 
     for row in database_rows:
-        raffle_object = row.Raffle
-        tickets_sold = row.tickets_sold
-        participants = row.participants
-
-        raffle_response = _build_raffle_response(raffle_object, tickets_sold, participants)
+        raffle_response = _build_raffle_response(row.Raffle, row.RaffleStats)
         raffles_responses.append(raffle_response)
 
     return raffles_responses
 
 # --- FUNCIÓN PARA OBTENER DETALLES DE UNA RIFA ---
 async def get_raffle_service(raffle_id: str, db: AsyncSession) -> RaffleDetailResponse:
-    query = (
-        select(Raffle)
-        .options(
-            selectinload(Raffle.tickets)
-            .selectinload(Ticket.user), # <-- AÑADE ESTA LÍNEA
-            selectinload(Raffle.tickets)
-            .selectinload(Ticket.numbers)
-        )
-        .where(Raffle.id == raffle_id)
-    )
-    result = await db.execute(query)
-    raffle = result.scalars().unique().first()
+    raffle = await get_raffle_by_id(db, raffle_id)
 
     if not raffle:
         raise ValueError("Raffle not found")
-    return _build_raffle_detail_response(raffle)
+    return await _load_raffle_detail_response(raffle, db)
+
+# --- RESPUESTAS CACHEADAS CON ETAG (LISTADO Y DETALLE) ---
+# Los tableros de los vendedores consultan el listado y el detalle continuamente. Con la
+# versión de la rifa (una lectura de raffle_stats) se responde 304 o se reutiliza el cuerpo
+# ya serializado; la respuesta completa solo se reconstruye cuando algo cambió.
+raffle_response_cache = VersionedResponseCache(max_entries=settings.RAFFLE_RESPONSE_CACHE_MAX_ENTRIES)
+
+
+async def _cached_response(key: str, version: str, if_none_match: str | None, build, read_version) -> tuple[CachedResponse, bool]:
+    """
+    Devuelve (respuesta, no_modificada). 'build' construye el modelo de respuesta y
+    'read_version' vuelve a leer la versión: si cambió durante la construcción, el cuerpo
+    se devuelve sin ETag y no se guarda, para no asociar datos nuevos a una versión vieja.
+    """
+    etag = VersionedResponseCache.etag_for(key, version)
+    if etag_matches(if_none_match, etag):
+        raffle_response_cache.record_not_modified()
+        return CachedResponse(etag=etag, body=b""), True
+
+    cached = raffle_response_cache.get(key, version)
+    if cached is not None:
+        return cached, False
+
+    body = model_to_json(await build())
+    if await read_version() != version:
+        return CachedResponse(etag=None, body=body), False
+    return raffle_response_cache.put(key, version, body), False
+
+
+async def list_raffles_cached_service(db: AsyncSession, if_none_match: str | None = None) -> tuple[CachedResponse, bool]:
+    async def build():
+        return RaffleListResponse(raffles=await list_raffles_service(db))
+
+    async def read_version():
+        return await get_raffles_version(db)
+
+    return await _cached_response("raffles", await read_version(), if_none_match, build, read_version)
+
+
+async def get_raffle_cached_service(raffle_id: str, db: AsyncSession, if_none_match: str | None = None) -> tuple[CachedResponse, bool]:
+    version = await get_raffle_version(db, raffle_id)
+    if version is None:
+        raise ValueError("Raffle not found")
+
+    async def build():
+        return await get_raffle_service(raffle_id, db)
+
+    async def read_version():
+        return str(await get_raffle_version(db, raffle_id))
+
+    return await _cached_response(f"raffle:{raffle_id}", str(version), if_none_match, build, read_version)
+
+# --- FUNCIÓN PARA LISTAR LOS TIQUETES VENDIDOS DE UNA RIFA (PAGINADA) ---
+async def list_sold_tickets_service(
+    raffle_id: str,
+    db: AsyncSession,
+    cursor: str | None = None,
+    limit: int = SOLD_TICKETS_PAGE_SIZE
+) -> SoldTicketPage | None:
+    """Devuelve None si la rifa no existe; un cursor inválido lanza ValueError."""
+    if not await raffle_meta_cache.get(db, raffle_id):
+        return None
+    sold_tickets, next_cursor = await _get_sold_tickets_page(raffle_id, db, cursor, limit)
+    return SoldTicketPage(sold_tickets=sold_tickets, next_cursor=next_cursor)
 
 # --- FUNCIÓN PARA VERIFICAR DISPONIBILIDAD DE NÚMERO ---
-# Esta función llama a la función is_number_available del repositorio para verificar si un número está disponible para una rifa específica.
-# Se usa para evitar conflictos de concurrencia y asegurar que el número no esté reservado o asignado.
+# Se responde desde el bitmap de disponibilidad en memoria, sin consultar la base de datos
+# mientras el índice esté vigente. La compra sigue validando contra la base de datos.
 async def check_number_availability_service(raffle_id: str, number_str: str, db: AsyncSession) -> bool:
-    return await is_number_available(db, raffle_id, number_str)
+    index = await get_availability_index(db, raffle_id)
+    return index.is_available(number_str)
+
+# --- FUNCIÓN PARA VERIFICAR VARIOS NÚMEROS A LA VEZ ---
+# Una sola consulta a la base de datos para todo el paquete de números.
+async def check_numbers_status_service(raffle_id: str, numbers: list[str], db: AsyncSession) -> dict[str, str]:
+    statuses = await get_numbers_status(db, raffle_id, numbers)
+    if statuses is None:
+        raise ValueError("Rifa no encontrada.")
+    return statuses
 
 # --- FUNCIÓN PARA OBTENER NÚMEROS ALEATORIOS DISPONIBLES ---
-#Esta funcion llama a la función query_random_available_numbers del repositorio para obtener una cantidad específica de números aleatorios disponibles para una rifa.
-# Se usa para evitar conflictos de concurrencia y asegurar que los números no estén reservados o asignados.
+# Los candidatos salen del índice de disponibilidad en memoria (pick_random_available_numbers)
+# y se confirman contra la tabla 'numbers', así no se devuelven números reservados o asignados.
 async def get_random_available_numbers_service(
     raffle_id: str,
     count: int,
@@ -318,11 +387,30 @@ async def get_random_available_numbers_service(
     Obtiene N números aleatorios y disponibles, delegando la consulta
     a la capa de repositorios y validando el resultado.
     """
-    # 1. La lógica de negocio es llamar al repositorio
-    available_numbers = await query_random_available_numbers(db, raffle_id, count)
+    # 1. Los candidatos salen del bitmap en memoria y se confirman contra la base de datos
+    available_numbers = await pick_random_available_numbers(db, raffle_id, count)
     
     # 2. El servicio se encarga de la validación de negocio
     if len(available_numbers) < count:
         raise ValueError("No se pudieron generar suficientes números aleatorios disponibles.")
         
-    return available_numbers
\ No newline at end of file
+    return available_numbers
+
+# --- FUNCIÓN PARA VERIFICAR LA CONSISTENCIA DEL ÍNDICE DE DISPONIBILIDAD ---
+async def check_availability_index_service(raffle_id: str, db: AsyncSession) -> dict:
+    return await verify_availability_index(db, raffle_id)
+
+# --- FUNCIÓN PARA OBTENER EL TABLERO COMPLETO DE NÚMEROS ---
+async def get_raffle_board_etag_service(raffle_id: str, encoding: str, db: AsyncSession) -> str:
+    """
+    ETag del tablero a partir de raffle_stats.version, que sube con cada cambio de estado de
+    un tiquete y con cada edición de la rifa: se compara sin construir el tablero.
+    """
+    version = await get_raffle_version(db, raffle_id)
+    if version is None:
+        raise ValueError("Rifa no encontrada.")
+    return VersionedResponseCache.etag_for(f"board:{raffle_id}:{encoding}", str(version))
+
+
+async def get_raffle_board_service(raffle_id: str, db: AsyncSession) -> RaffleBoard:
+    return await build_raffle_board(db, raffle_id)
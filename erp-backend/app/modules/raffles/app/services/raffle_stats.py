@@ -0,0 +1,30 @@
+# app/services/raffle_stats.py
+
+import logging
+import time
+
+from app.db.database import async_session_local
+from app.db.repositories.raffle import get_all_raffle_ids
+from app.db.repositories.stats import reconcile_raffle_stats
+
+
+async def reconcile_all_raffle_stats(raffle_ids: list[str] | None = None) -> dict:
+    """
+    Recalcula desde cero raffle_stats y raffle_participants. Cada rifa se reconcilia en su
+    propia transacción para no retener bloqueos de todas las rifas a la vez.
+    """
+    started = time.perf_counter()
+    if raffle_ids is None:
+        async with async_session_local() as session:
+            raffle_ids = await get_all_raffle_ids(session)
+
+    reconciled = 0
+    for raffle_id in raffle_ids:
+        async with async_session_local() as session:
+            async with session.begin():
+                await reconcile_raffle_stats(session, raffle_id)
+        reconciled += 1
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    logging.info(f"Reconciliación de estadísticas: {reconciled} rifas en {duration_ms} ms.")
+    return {"raffles_reconciled": reconciled, "duration_ms": duration_ms}
@@ -0,0 +1,300 @@
+# app/services/receipt_cache.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from app.core.config import settings
+
+# Se incrementa cuando cambia el diseño del comprobante, para no servir renders anteriores.
+RECEIPT_LAYOUT_VERSION = 1
+
+
+def receipt_digest(receipt_data: dict) -> str:
+    """Hash de los campos que se dibujan (y del diseño); dos tiquetes iguales dan el mismo hash."""
+    canonical = json.dumps(
+        {"layout": RECEIPT_LAYOUT_VERSION, **receipt_data}, sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ReceiptCache:
+    """
+    Cache de comprobantes ya codificados, direccionado por contenido: la llave es el hash de
+    los campos renderizados, así que un cambio en el tiquete o la rifa produce otra llave y un
+    render viejo nunca se sirve. Tiene dos niveles:
+      - memoria: LRU acotado por bytes, por worker.
+      - disco: '<dir>/<ticket_id>/<hash>.<variante>', compartido por todos los workers.
+    Cada tiquete conserva solo su versión vigente: al guardar un hash nuevo (o al cambiar el
+    tiquete) se borran las anteriores de ambos niveles. Lo que nadie vuelve a pedir (por
+    ejemplo, tras editar la rifa) lo borra la poda periódica del disco, que además lo
+    mantiene por debajo de 'disk_max_bytes' borrando primero lo usado hace más tiempo.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        memory_max_bytes: int,
+        disk_max_bytes: int,
+        disk_max_age_seconds: float,
+        prune_interval_seconds: float,
+        tracked_tickets_max: int,
+    ):
+        self.directory = Path(directory)
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_max_age_seconds = disk_max_age_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+        self.tracked_tickets_max = tracked_tickets_max
+        self._memory: "OrderedDict[tuple[str, str, str], bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # Último hash guardado por tiquete (LRU acotado). Si un tiquete sale de aquí, su
+        # siguiente 'put' se trata como el primero y limpia las versiones viejas igual.
+        self._digest_by_ticket: "OrderedDict[str, str]" = OrderedDict()
+        self._task: asyncio.Task | None = None
+        self.metrics = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_errors": 0,
+            "prune_runs": 0,
+            "pruned_files": 0,
+            "pruned_bytes": 0,
+            "disk_bytes": None,
+            "last_prune_at": None,
+        }
+
+    def _path(self, ticket_id: str, digest: str, variant: str) -> Path:
+        return self.directory / ticket_id / f"{digest}.{variant}"
+
+    # --- MEMORIA ---
+    def _remember(self, key: tuple[str, str, str], body: bytes):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        if len(body) > self.memory_max_bytes:
+            return
+        self._memory[key] = body
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget_ticket(self, ticket_id: str, keep_digest: str | None = None):
+        for key in [key for key in self._memory if key[0] == ticket_id and key[1] != keep_digest]:
+            self._memory_bytes -= len(self._memory.pop(key))
+
+    # --- DISCO (en un hilo para no bloquear el event loop) ---
+    def _read_file(self, path: Path) -> bytes | None:
+        try:
+            body = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # La fecha de modificación marca el último uso: la poda borra primero lo más viejo.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return body
+
+    def _write_file(self, path: Path, body: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Se escribe a un temporal y se renombra: otro worker nunca lee un archivo a medias.
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temp_path.write_bytes(body)
+        os.replace(temp_path, path)
+
+    def _remove_stale_files(self, ticket_id: str, keep_digest: str | None):
+        ticket_dir = self.directory / ticket_id
+        if keep_digest is None:
+            shutil.rmtree(ticket_dir, ignore_errors=True)
+            return
+        if not ticket_dir.is_dir():
+            return
+        for path in ticket_dir.iterdir():
+            # Los '.tmp' en curso de otros workers se dejan: los renombra quien los escribe.
+            if not path.name.startswith((keep_digest, ".")):
+                path.unlink(missing_ok=True)
+
+    def _remove_tickets(self, ticket_ids: list[str]):
+        for ticket_id in ticket_ids:
+            shutil.rmtree(self.directory / ticket_id, ignore_errors=True)
+
+    def _prune_disk(self) -> tuple[int, int, int]:
+        """
+        Borra los archivos sin uso por más de 'disk_max_age_seconds' y, si el total sigue por
+        encima de 'disk_max_bytes', los usados hace más tiempo. Retorna (archivos borrados,
+        bytes liberados, bytes que quedan en disco).
+        """
+        if not self.directory.is_dir():
+            return 0, 0, 0
+        now = time.time()
+        cutoff = now - self.disk_max_age_seconds
+        removed, freed = 0, 0
+        files: list[tuple[float, int, Path]] = []
+        ticket_dirs = [path for path in self.directory.iterdir() if path.is_dir()]
+        for ticket_dir in ticket_dirs:
+            for path in ticket_dir.iterdir():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime < cutoff:
+                    # Incluye los '.tmp' que dejó un worker que murió a mitad de escritura.
+                    path.unlink(missing_ok=True)
+                    removed, freed = removed + 1, freed + stat.st_size
+                elif not path.name.startswith("."):
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        disk_bytes = sum(size for _, size, _ in files)
+        if disk_bytes > self.disk_max_bytes:
+            files.sort(key=lambda item: item[0])
+            for _, size, path in files:
+                if disk_bytes <= self.disk_max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                disk_bytes -= size
+                removed, freed = removed + 1, freed + size
+
+        for ticket_dir in ticket_dirs:
+            try:
+                # Solo carpetas vacías y quietas, para no chocar con un worker que va a escribir.
+                if ticket_dir.stat().st_mtime < now - 60:
+                    ticket_dir.rmdir()
+            except OSError:
+                pass
+        return removed, freed, disk_bytes
+
+    # --- API ---
+    async def get(self, ticket_id: str, digest: str, variant: str) -> bytes | None:
+        key = (ticket_id, digest, variant)
+        body = self._memory.get(key)
+        if body is not None:
+            self._memory.move_to_end(key)
+            self.metrics["memory_hits"] += 1
+            return body
+
+        try:
+            body = await asyncio.to_thread(self._read_file, self._path(*key))
+        except OSError as e:
+            self.metrics["disk_errors"] += 1
+            logging.warning(f"No se pudo leer el comprobante cacheado de {ticket_id}: {e}")
+            body = None
+        if body is None:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["disk_hits"] += 1
+        self._remember(key, body)
+        return body
+
+    async def put(self, ticket_id: str, digest: str, variant: str, body: bytes):
+        previous_digest = self._digest_by_ticket.pop(ticket_id, None)
+        self._digest_by_ticket[ticket_id] = digest
+        while len(self._digest_by_ticket) > self.tracked_tickets_max:
+            self._digest_by_ticket.popitem(last=False)
+        self._remember((ticket_id, digest, variant), body)
+        self.metrics["stores"] += 1
+        try:
+            await asyncio.to_thread(self._write_file, self._path(ticket_id, digest, variant), body)
+            if previous_digest != digest:
+                # El tiquete cambió desde la última vez (o es la primera en este worker).
+                self._forget_ticket(ticket_id, keep_digest=digest)
+                await asyncio.to_thread(self._remove_stale_files, ticket_id, digest)
+        except OSError as e:
+            self.metrics["disk_errors"] += 1
+            logging.warning(f"No se pudo guardar el comprobante cacheado de {ticket_id}: {e}")
+
+    async def evict_ticket(self, ticket_id: str):
+        """Borra todas las versiones de un tiquete; se llama cuando cambia su estado."""
+        self._digest_by_ticket.pop(ticket_id, None)
+        self._forget_ticket(ticket_id)
+        self.metrics["evictions"] += 1
+        try:
+            await asyncio.to_thread(self._remove_stale_files, ticket_id, None)
+        except OSError as e:
+            self.metrics["disk_errors"] += 1
+            logging.warning(f"No se pudo borrar el comprobante cacheado de {ticket_id}: {e}")
+
+    async def evict_tickets(self, ticket_ids: list[str]):
+        """Como 'evict_ticket' para un lote (p. ej. los tiquetes que venció el barrido)."""
+        if not ticket_ids:
+            return
+        for ticket_id in ticket_ids:
+            self._digest_by_ticket.pop(ticket_id, None)
+            self._forget_ticket(ticket_id)
+        self.metrics["evictions"] += len(ticket_ids)
+        try:
+            await asyncio.to_thread(self._remove_tickets, ticket_ids)
+        except OSError as e:
+            self.metrics["disk_errors"] += 1
+            logging.warning(f"No se pudieron borrar {len(ticket_ids)} comprobantes cacheados: {e}")
+
+    # --- PODA PERIÓDICA DEL DISCO ---
+    async def prune(self) -> int:
+        removed, freed, disk_bytes = await asyncio.to_thread(self._prune_disk)
+        self.metrics["prune_runs"] += 1
+        self.metrics["pruned_files"] += removed
+        self.metrics["pruned_bytes"] += freed
+        self.metrics["disk_bytes"] = disk_bytes
+        self.metrics["last_prune_at"] = time.time()
+        if removed:
+            logging.info(f"Poda del cache de comprobantes: {removed} archivos ({freed} bytes) borrados.")
+        return removed
+
+    async def _run_forever(self):
+        # Retardo inicial aleatorio para que los workers no poden todos en el mismo instante.
+        await asyncio.sleep(random.uniform(0, self.prune_interval_seconds))
+        while True:
+            try:
+                await self.prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["disk_errors"] += 1
+                logging.error(f"Error en la poda del cache de comprobantes: {e}", exc_info=True)
+            await asyncio.sleep(self.prune_interval_seconds)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever(), name="receipt-cache-pruner")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_metrics(self) -> dict:
+        lookups = self.metrics["memory_hits"] + self.metrics["disk_hits"] + self.metrics["misses"]
+        hits = self.metrics["memory_hits"] + self.metrics["disk_hits"]
+        return {
+            **self.metrics,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "tracked_tickets": len(self._digest_by_ticket),
+        }
+
+
+receipt_cache = ReceiptCache(
+    directory=settings.RECEIPT_CACHE_DIR,
+    memory_max_bytes=settings.RECEIPT_CACHE_MEMORY_MAX_BYTES,
+    disk_max_bytes=settings.RECEIPT_CACHE_DISK_MAX_BYTES,
+    disk_max_age_seconds=settings.RECEIPT_CACHE_DISK_MAX_AGE_SECONDS,
+    prune_interval_seconds=settings.RECEIPT_CACHE_PRUNE_INTERVAL_SECONDS,
+    tracked_tickets_max=settings.RECEIPT_CACHE_TRACKED_TICKETS,
+)
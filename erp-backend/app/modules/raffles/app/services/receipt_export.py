@@ -0,0 +1,224 @@
+# app/services/receipt_export.py
+
+import asyncio
+import logging
+import time
+import uuid
+import zipfile
+from collections import deque
+from typing import AsyncIterator
+
+import anyio
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.db.database import async_session_local
+from app.db.models import ReceiptExportJob
+from app.db.repositories.raffle import get_raffle_by_id
+from app.db.repositories.receipt_export import create_export_job, get_export_job, update_export_job
+from app.db.repositories.ticket import count_ticket_rows, stream_ticket_rows
+from app.schemas.ticket import TicketFilters
+from app.services.receipt_cache import receipt_digest
+from app.services.receipt_service import get_or_render_receipt, receipt_data_from_row
+from app.utils.pagination import decode_cursor, encode_cursor
+
+# Por defecto se exportan los tiquetes activos; un comprobante de un tiquete cancelado no sirve.
+EXPORT_STATUSES = ('paid', 'pending')
+# Cada cuánto se guarda el avance en la base de datos.
+PROGRESS_EVERY_TICKETS = 50
+PROGRESS_EVERY_SECONDS = 2.0
+# Reintentos cuando el pool de render está lleno (503): la exportación espera, no falla.
+BUSY_RETRIES = 20
+BUSY_RETRY_SECONDS = 0.5
+# Tiempo máximo del guardado final, que corre protegido de la cancelación.
+FINAL_SAVE_TIMEOUT_SECONDS = 10.0
+
+
+class _ZipSink:
+    """Destino de escritura del ZipFile sin seek: acumula bytes hasta que el generador los entrega."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _render_for_export(row) -> bytes:
+    receipt_data = receipt_data_from_row(row)
+    for _ in range(BUSY_RETRIES):
+        try:
+            return await get_or_render_receipt(row.id, receipt_digest(receipt_data), receipt_data)
+        except HTTPException as e:
+            if e.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+                raise
+            await asyncio.sleep(BUSY_RETRY_SECONDS)
+    raise RuntimeError("El pool de render siguió ocupado durante toda la espera.")
+
+
+def _zip_entry(row) -> zipfile.ZipInfo:
+    entry = zipfile.ZipInfo(f"Ticket_{row.id}.jpg", date_time=row.created_at.timetuple()[:6])
+    # Los JPEG ya vienen comprimidos: se guardan tal cual.
+    entry.compress_type = zipfile.ZIP_STORED
+    return entry
+
+
+# --- INICIO DE LA EXPORTACIÓN ---
+async def start_receipt_export(
+    raffle_id: str,
+    ticket_status: str | None = None,
+    resume_job_id: str | None = None
+) -> tuple[ReceiptExportJob, AsyncIterator[bytes]] | None:
+    """
+    Registra el trabajo y devuelve (trabajo, generador del ZIP), o None si la rifa no
+    existe. Con 'resume_job_id' el ZIP contiene los tiquetes posteriores al último que ese
+    trabajo alcanzó a escribir, más los que fallaron en él.
+    """
+    filters = TicketFilters(raffle_id=raffle_id, status=ticket_status)
+    statuses = None if ticket_status else EXPORT_STATUSES
+    after, retry_ids = None, None
+
+    async with async_session_local() as session:
+        async with session.begin():
+            if await get_raffle_by_id(session, raffle_id) is None:
+                return None
+            if resume_job_id:
+                previous = await get_export_job(session, resume_job_id)
+                if previous is None or previous.raffle_id != raffle_id:
+                    raise ValueError(f"La exportación {resume_job_id} no existe para esta rifa.")
+                if previous.resume_cursor:
+                    after = decode_cursor(previous.resume_cursor)
+                retry_ids = list(previous.failed_ticket_ids or [])
+            total = await count_ticket_rows(session, filters, after=after, statuses=statuses, include_ids=retry_ids)
+            job = await create_export_job(session, str(uuid.uuid4()), raffle_id, total)
+
+    logging.info(f"Exportación de comprobantes {job.id} iniciada para la rifa {raffle_id}: {total} tiquetes.")
+    return job, _export_receipts_zip(job.id, filters, statuses, after, retry_ids)
+
+
+async def get_receipt_export_job(raffle_id: str, job_id: str) -> ReceiptExportJob | None:
+    async with async_session_local() as session:
+        job = await get_export_job(session, job_id)
+    return job if job is not None and job.raffle_id == raffle_id else None
+
+
+async def _save_progress(job_id: str, finished: bool = False, **values):
+    try:
+        async with async_session_local() as session:
+            async with session.begin():
+                await update_export_job(session, job_id, finished=finished, **values)
+    except Exception as e:
+        logging.warning(f"No se pudo guardar el avance de la exportación {job_id}: {e}")
+
+
+# --- GENERADOR DEL ZIP ---
+async def _export_receipts_zip(
+    job_id: str,
+    filters: TicketFilters,
+    statuses: tuple[str, ...] | None,
+    after: tuple | None,
+    retry_ids: list[str] | None = None
+) -> AsyncIterator[bytes]:
+    """
+    Renderiza los comprobantes en paralelo (una ventana deslizante de renders en el pool de
+    procesos, que además llena el cache) y los escribe al ZIP en orden de (created_at, id)
+    a medida que terminan. En memoria solo está la ventana, nunca el archivo completo.
+    El avance guardado nunca va por delante de lo entregado: al reanudar se pueden repetir
+    algunos comprobantes, pero nunca se salta ninguno. Un render fallido no detiene el
+    cursor: su id se guarda con el avance y la reanudación lo vuelve a incluir.
+    Los reintentos ('retry_ids') llegan antes que 'after' en el orden del ZIP, así que no
+    mueven el cursor; mientras no se escriban siguen guardados como fallidos.
+    """
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    window: deque = deque()
+    exported, failed_ids = 0, []
+    pending_retry_ids = list(retry_ids or [])
+    # Llave del último tiquete cuyo bloque ya se entregó al cliente (el generador solo se
+    # reanuda después de que el servidor envió lo que produjo en el 'yield' anterior).
+    # Parte de 'after' para que una interrupción temprana no reinicie la exportación.
+    resume_key = after
+    last_saved_at, last_saved_count = time.monotonic(), 0
+    outcome = {"status": "interrupted", "error": "El cliente cerró la descarga"}
+
+    def progress() -> dict:
+        return dict(
+            exported_tickets=exported,
+            failed_tickets=len(failed_ids),
+            failed_ticket_ids=failed_ids + [i for i in pending_retry_ids if i not in failed_ids],
+            resume_cursor=encode_cursor(*resume_key) if resume_key else None,
+        )
+
+    async def write_oldest() -> tuple[bytes, tuple]:
+        nonlocal exported
+        row, task = window.popleft()
+        try:
+            body = await task
+        except Exception as e:
+            logging.error(f"Exportación {job_id}: no se pudo renderizar el tiquete {row.id}: {e}")
+            failed_ids.append(row.id)
+        else:
+            archive.writestr(_zip_entry(row), body)
+            exported += 1
+        return sink.drain(), (row.created_at, row.id)
+
+    def delivered(key: tuple) -> None:
+        # Se llama después del 'yield': el bloque de ese tiquete ya salió hacia el cliente.
+        nonlocal resume_key
+        if key[1] in pending_retry_ids:
+            pending_retry_ids.remove(key[1])
+        if resume_key is None or key > resume_key:
+            resume_key = key
+
+    try:
+        async with async_session_local() as session:
+            async for rows in stream_ticket_rows(
+                session, filters, chunk_size=200, after=after, statuses=statuses, include_ids=retry_ids
+            ):
+                for row in rows:
+                    window.append((row, asyncio.create_task(_render_for_export(row))))
+                    if len(window) >= settings.RECEIPT_EXPORT_WINDOW:
+                        chunk, key = await write_oldest()
+                        yield chunk
+                        delivered(key)
+
+                    processed = exported + len(failed_ids)
+                    if processed - last_saved_count >= PROGRESS_EVERY_TICKETS or time.monotonic() - last_saved_at >= PROGRESS_EVERY_SECONDS:
+                        await _save_progress(job_id, **progress())
+                        last_saved_at, last_saved_count = time.monotonic(), processed
+
+        while window:
+            chunk, key = await write_oldest()
+            yield chunk
+            delivered(key)
+        # Los reintentos que la consulta ya no devolvió (cancelados, borrados) no se arrastran.
+        pending_retry_ids.clear()
+
+        if failed_ids:
+            archive.writestr("fallidos.txt", "\n".join(failed_ids) + "\n")
+        archive.close()
+        yield sink.drain()
+        outcome = {"status": "completed", "error": None}
+        logging.info(f"Exportación de comprobantes {job_id} completada: {exported} escritos, {len(failed_ids)} fallidos.")
+    except Exception as e:
+        outcome = {"status": "failed", "error": str(e)}
+        logging.error(f"Exportación de comprobantes {job_id} falló: {e}", exc_info=True)
+        raise
+    finally:
+        # Si el cliente se desconecta, los renders pendientes se cancelan (los que ya están en
+        # un proceso terminan y quedan en el cache, así que la reanudación los aprovecha).
+        for _, task in window:
+            task.cancel()
+        # Al desconectarse el cliente, Starlette cancela esta tarea y cualquier 'await' aquí
+        # recibiría CancelledError: el guardado final corre en un scope protegido.
+        with anyio.move_on_after(FINAL_SAVE_TIMEOUT_SECONDS, shield=True):
+            await _save_progress(job_id, finished=True, **progress(), **outcome)
@@ -0,0 +1,147 @@
+# app/services/receipt_pool.py
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.services.generate_image import derive_receipt_variant, init_receipt_renderer
+
+
+# --- FUNCIONES QUE CORREN EN LOS PROCESOS HIJOS ---
+def _init_render_process():
+    # Cada proceso carga su propia plantilla y fuentes una sola vez.
+    init_receipt_renderer()
+
+
+def _render_receipt_jpeg(ticket_data: dict, quality: int) -> tuple[bytes, float]:
+    started = time.perf_counter()
+    body = init_receipt_renderer().render_jpeg(ticket_data, quality=quality)
+    return body, (time.perf_counter() - started) * 1000
+
+
+def _derive_variant(master_jpeg: bytes, max_width: int | None, image_format: str, quality: int) -> tuple[bytes, float]:
+    started = time.perf_counter()
+    body = derive_receipt_variant(master_jpeg, max_width, image_format, quality)
+    return body, (time.perf_counter() - started) * 1000
+
+
+class ReceiptRenderPool:
+    """
+    Pool de procesos para el render de comprobantes (Pillow es CPU y no debe correr en el
+    event loop). La cola está acotada: si ya hay 'max_pending' renders en curso o en espera
+    se responde 503 de inmediato, y si un render no termina en 'timeout_seconds' se responde 504.
+    Si un proceso hijo muere (OOM, fallo de Pillow) el executor queda roto para siempre: se
+    descarta y se crea otro, y los renders que estaban en él responden 503.
+    """
+
+    def __init__(self, processes: int, max_pending: int, timeout_seconds: float):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self.metrics = {"rendered": 0, "rejected": 0, "timeouts": 0, "errors": 0, "pool_restarts": 0, "total_render_ms": 0.0}
+
+    def start(self):
+        if self._executor is None:
+            # 'spawn' evita heredar por fork el estado del event loop y de los hilos del worker.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_render_process,
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        # Varias peticiones pueden ver el mismo executor roto: solo la primera lo reemplaza.
+        if self._executor is not broken:
+            return
+        logging.error("El pool de render de comprobantes quedó roto (murió un proceso hijo); se recrea.")
+        self.metrics["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.start()
+
+    def _release(self):
+        self._pending -= 1
+
+    async def render_jpeg(self, ticket_data: dict, quality: int = 95) -> bytes:
+        return await self._submit(ticket_data.get("ticket_id"), _render_receipt_jpeg, ticket_data, quality)
+
+    async def derive_variant(self, master_jpeg: bytes, max_width: int | None, image_format: str, quality: int) -> bytes:
+        """Variante (tamaño y/o formato) a partir del JPEG maestro, también fuera del event loop."""
+        return await self._submit(None, _derive_variant, master_jpeg, max_width, image_format, quality)
+
+    async def _submit(self, ticket_id: str | None, func, *args) -> bytes:
+        if self._pending >= self.max_pending:
+            self.metrics["rejected"] += 1
+            logging.warning(f"Render de comprobante rechazado: {self._pending} renders en cola.")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Receipt renderer is busy, try again shortly",
+                headers={"Retry-After": "2"},
+            )
+        self.start()
+
+        # La cola se libera cuando el proceso termina, no cuando el cliente deja de esperar.
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            # Un proceso murió en un render anterior: se intenta una vez con un pool nuevo.
+            self._restart(executor)
+            executor = self._executor
+            future = executor.submit(func, *args)
+        self._pending += 1
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            body, render_ms = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout_seconds)
+        except BrokenProcessPool:
+            # El proceso murió durante este render (o uno vecino): se recrea el pool y se
+            # responde 503 para que el cliente (o la exportación) reintente.
+            self.metrics["errors"] += 1
+            self._restart(executor)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Receipt renderer restarted, try again shortly",
+                headers={"Retry-After": "2"},
+            )
+        except asyncio.TimeoutError:
+            self.metrics["timeouts"] += 1
+            logging.error(f"Render del comprobante {ticket_id or ''} superó {self.timeout_seconds} s.")
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Receipt rendering timed out")
+        except Exception:
+            self.metrics["errors"] += 1
+            raise
+
+        self.metrics["rendered"] += 1
+        self.metrics["total_render_ms"] += render_ms
+        return body
+
+    def get_metrics(self) -> dict:
+        rendered = self.metrics["rendered"]
+        return {
+            **self.metrics,
+            "avg_render_ms": round(self.metrics["total_render_ms"] / rendered, 2) if rendered else None,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "processes": self.processes,
+        }
+
+
+receipt_render_pool = ReceiptRenderPool(
+    processes=settings.RECEIPT_RENDER_PROCESSES,
+    max_pending=settings.RECEIPT_RENDER_MAX_PENDING,
+    timeout_seconds=settings.RECEIPT_RENDER_TIMEOUT_SECONDS,
+)
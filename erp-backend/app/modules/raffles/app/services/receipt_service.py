@@ -0,0 +1,130 @@
+# app/services/receipt_service.py
+
+from dataclasses import dataclass
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.repositories.ticket import get_ticket_row
+from app.services.generate_image import IMAGE_FORMATS
+from app.services.receipt_cache import receipt_cache, receipt_digest
+from app.services.receipt_pool import receipt_render_pool
+from app.utils.http_cache import etag_matches
+
+RECEIPT_JPEG_QUALITY = 95
+
+# Variantes de tamaño: nombre -> (ancho máximo, calidad). 'full' en JPEG es el maestro tal cual;
+# las demás se derivan de él y se cachean aparte.
+RECEIPT_VARIANTS = {
+    "full": (None, RECEIPT_JPEG_QUALITY),
+    "preview": (720, 80),  # Vista previa de WhatsApp y pantallas de celular
+    "thumb": (240, 70),  # Miniatura para listados
+}
+
+
+@dataclass(frozen=True)
+class ReceiptImage:
+    etag: str
+    filename: str
+    media_type: str
+    body: bytes | None  # None cuando el cliente ya tiene esta versión (304)
+
+
+class ReceiptVariantStats:
+    """Bytes servidos por variante frente a lo que habría costado enviar el maestro, por worker."""
+
+    def __init__(self):
+        self._stats: dict[str, dict] = {}
+
+    def record(self, variant_key: str, served_bytes: int, master_bytes: int):
+        stats = self._stats.setdefault(variant_key, {"served": 0, "bytes": 0, "master_bytes": 0})
+        stats["served"] += 1
+        stats["bytes"] += served_bytes
+        stats["master_bytes"] += master_bytes
+
+    def get_metrics(self) -> dict:
+        return {
+            variant_key: {
+                **stats,
+                "avg_bytes": round(stats["bytes"] / stats["served"]),
+                "saved_pct": round(100 * (1 - stats["bytes"] / stats["master_bytes"]), 1) if stats["master_bytes"] else None,
+            }
+            for variant_key, stats in self._stats.items()
+        }
+
+
+receipt_variant_stats = ReceiptVariantStats()
+
+
+def negotiate_image_format(requested: str, accept: str | None) -> str:
+    """'auto' elige WebP si el cliente lo declara en Accept; si no, JPEG, que todos soportan."""
+    if requested != "auto":
+        return requested
+    return "webp" if accept and "image/webp" in accept else "jpeg"
+
+
+def receipt_data_from_row(row) -> dict:
+    """Campos del comprobante a partir de la fila proyectada del tiquete (get_ticket_row)."""
+    return {
+        "ticket_id": row.id,
+        "buyer_name": row.name,
+        "status": row.status,
+        "raffle_name": row.raffle_name,
+        # Se usa payment_date para mayor precisión y se formatea.
+        "purchase_date": row.payment_date.strftime("%d de %B de %Y") if row.payment_date else "N/A",
+        "draw_date": row.raffle_end_date.strftime("%d de %B de %Y") if row.raffle_end_date else "Por definir",
+        # El total pagado es el precio de la rifa.
+        "total_price": row.raffle_price,
+        "numbers": list(row.numbers or []),
+    }
+
+
+def receipt_filename(row, extension: str = "jpg") -> str:
+    return f"Rifa_{row.raffle_name.replace(' ', '_')}_Ticket_{row.id[:8]}.{extension}"
+
+
+async def get_ticket_receipt(
+    db: AsyncSession,
+    ticket_id: str,
+    if_none_match: str | None = None,
+    variant: str = "full",
+    image_format: str = "jpeg"
+) -> ReceiptImage | None:
+    """
+    Comprobante del tiquete en la variante y formato pedidos, o None si no existe. El ETag es
+    el hash de los campos dibujados (más la variante): si el cliente ya lo tiene se responde
+    304 sin leer la imagen; si no, se sirve desde el cache (memoria o disco) y solo se
+    renderiza o deriva en el pool de procesos cuando no está.
+    """
+    row = await get_ticket_row(db, ticket_id)
+    if row is None:
+        return None
+
+    _, media_type, extension = IMAGE_FORMATS[image_format]
+    is_master = variant == "full" and image_format == "jpeg"
+    receipt_data = receipt_data_from_row(row)
+    digest = receipt_digest(receipt_data)
+    # El maestro conserva el ETag de siempre; cada variante tiene el suyo (ETag fuerte por representación).
+    etag = f'"{digest}"' if is_master else f'"{digest}.{variant}.{extension}"'
+    filename = receipt_filename(row, extension)
+    if etag_matches(if_none_match, etag):
+        return ReceiptImage(etag=etag, filename=filename, media_type=media_type, body=None)
+
+    master = await get_or_render_receipt(row.id, digest, receipt_data)
+    body = master
+    if not is_master:
+        variant_key = f"{variant}.{extension}"
+        body = await receipt_cache.get(row.id, digest, variant_key)
+        if body is None:
+            max_width, quality = RECEIPT_VARIANTS[variant]
+            body = await receipt_render_pool.derive_variant(master, max_width, image_format, quality)
+            await receipt_cache.put(row.id, digest, variant_key, body)
+    receipt_variant_stats.record(f"{variant}.{extension}", len(body), len(master))
+    return ReceiptImage(etag=etag, filename=filename, media_type=media_type, body=body)
+
+
+async def get_or_render_receipt(ticket_id: str, digest: str, receipt_data: dict) -> bytes:
+    """JPEG del comprobante desde el cache; si no está, se renderiza en el pool y se guarda."""
+    body = await receipt_cache.get(ticket_id, digest, "jpg")
+    if body is None:
+        body = await receipt_render_pool.render_jpeg(receipt_data, quality=RECEIPT_JPEG_QUALITY)
+        await receipt_cache.put(ticket_id, digest, "jpg", body)
+    return body
@@ -0,0 +1,109 @@
+# app/services/reservation_sweeper.py
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.db.database import async_session_local
+from app.db.repositories.ticket import expire_pending_tickets_batch
+from app.services.availability_index import mark_numbers_available
+from app.services.receipt_cache import receipt_cache
+
+
+class ReservationSweeper:
+    """
+    Tarea periódica en el event loop que cancela los tiquetes 'pending' vencidos y libera
+    sus números. Cada lote es una transacción independiente y acotada; el bloqueo con
+    SKIP LOCKED permite que todos los workers de gunicorn la ejecuten a la vez.
+    """
+
+    def __init__(self, interval_seconds: int, batch_size: int, max_batches_per_run: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_batches_per_run = max_batches_per_run
+        self._task: asyncio.Task | None = None
+        self.metrics = {
+            "runs": 0,
+            "batches": 0,
+            "tickets_expired": 0,
+            "numbers_released": 0,
+            "errors": 0,
+            "last_run_at": None,
+            "last_run_duration_ms": None,
+            "last_run_tickets_expired": 0,
+            "last_error": None,
+        }
+
+    async def run_once(self) -> int:
+        """Ejecuta un barrido completo (varios lotes) y devuelve los tiquetes expirados."""
+        started = time.perf_counter()
+        expired_in_run = 0
+
+        for _ in range(self.max_batches_per_run):
+            async with async_session_local() as session:
+                async with session.begin():
+                    ticket_ids, released = await expire_pending_tickets_batch(session, self.batch_size)
+
+            self.metrics["batches"] += 1
+            self.metrics["tickets_expired"] += len(ticket_ids)
+            self.metrics["numbers_released"] += len(released)
+            expired_in_run += len(ticket_ids)
+
+            released_by_raffle: dict[str, list[str]] = {}
+            for raffle_id, number_str in released:
+                released_by_raffle.setdefault(raffle_id, []).append(number_str)
+            for raffle_id, numbers in released_by_raffle.items():
+                mark_numbers_available(raffle_id, numbers)
+            # El comprobante muestra el estado: los de tiquetes cancelados ya no sirven.
+            await receipt_cache.evict_tickets(ticket_ids)
+
+            if len(ticket_ids) < self.batch_size:
+                break
+
+        self.metrics["runs"] += 1
+        self.metrics["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        self.metrics["last_run_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self.metrics["last_run_tickets_expired"] = expired_in_run
+        if expired_in_run:
+            logging.info(f"Barrido de reservas: {expired_in_run} tiquetes vencidos cancelados.")
+        return expired_in_run
+
+    async def _run_forever(self):
+        # Retardo inicial aleatorio para que los workers no barran todos en el mismo instante.
+        await asyncio.sleep(random.uniform(0, self.interval_seconds))
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["errors"] += 1
+                self.metrics["last_error"] = str(e)
+                logging.error(f"Error en el barrido de reservas vencidas: {e}", exc_info=True)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever(), name="reservation-sweeper")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_metrics(self) -> dict:
+        return {**self.metrics, "running": self._task is not None and not self._task.done()}
+
+
+reservation_sweeper = ReservationSweeper(
+    interval_seconds=settings.RESERVATION_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.RESERVATION_SWEEP_BATCH_SIZE,
+    max_batches_per_run=settings.RESERVATION_SWEEP_MAX_BATCHES,
+)
@@ -0,0 +1,54 @@
+# app/services/response_cache.py
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    etag: str | None  # None si la versión cambió mientras se construía la respuesta
+    body: bytes
+
+
+class VersionedResponseCache:
+    """
+    Cache en memoria de cuerpos JSON ya serializados, indexados por (clave, versión).
+    La versión la lleva la base de datos (raffle_stats.version), así que todos los workers
+    calculan el mismo ETag y una entrada vieja nunca se sirve: al cambiar la versión
+    simplemente deja de coincidir y se descarta por LRU.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[str, CachedResponse]]" = OrderedDict()
+        self.metrics = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0}
+
+    @staticmethod
+    def etag_for(key: str, version: str) -> str:
+        digest = hashlib.blake2b(f"{key}:{version}".encode(), digest_size=12)
+        return f'"{digest.hexdigest()}"'
+
+    def get(self, key: str, version: str) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.metrics["hits"] += 1
+        return entry[1]
+
+    def put(self, key: str, version: str, body: bytes) -> CachedResponse:
+        cached = CachedResponse(etag=self.etag_for(key, version), body=body)
+        self._entries[key] = (version, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.metrics["stores"] += 1
+        return cached
+
+    def record_not_modified(self):
+        self.metrics["not_modified"] += 1
+
+    def get_metrics(self) -> dict:
+        return {**self.metrics, "entries": len(self._entries), "max_entries": self.max_entries}
@@ -0,0 +1,93 @@
+# app/services/sales_service.py
+
+import logging
+import time
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import async_session_local
+from app.db.repositories.sales import (
+    SALES_DIMENSIONS,
+    get_daily_sales_by_seller,
+    get_sales_buckets,
+    rebuild_sales_rollup,
+)
+from app.schemas.sales import SalesAnalyticsResponse, SalesBucket
+
+SALES_GRANULARITIES = ("day", "week", "month")
+# Rango máximo por consulta; con el rollup son a lo sumo unas pocas filas por día.
+MAX_ANALYTICS_RANGE_DAYS = 366 * 3
+
+
+def _parse_group_by(group_by: str | None) -> list[str]:
+    dimensions = [part.strip() for part in (group_by or "").split(",") if part.strip()]
+    invalid = [dimension for dimension in dimensions if dimension not in SALES_DIMENSIONS]
+    if invalid:
+        raise ValueError(f"Dimensiones no válidas: {', '.join(invalid)}. Use: {', '.join(SALES_DIMENSIONS)}.")
+    return list(dict.fromkeys(dimensions))
+
+
+# --- ANALÍTICA DE VENTAS POR CUBETAS ---
+async def get_sales_analytics_service(
+    db: AsyncSession,
+    granularity: str,
+    date_from: date | None,
+    date_to: date | None,
+    group_by: str | None = None,
+    raffle_id: str | None = None,
+    user_id: int | None = None,
+    payment_type: str | None = None
+) -> SalesAnalyticsResponse:
+    """
+    Ventas pagadas agrupadas por día, semana o mes (según la fecha de pago) y, opcionalmente,
+    por vendedor, rifa y/o tipo de pago. Se lee del rollup diario, no de 'tickets'.
+    """
+    if granularity not in SALES_GRANULARITIES:
+        raise ValueError(f"Granularidad no válida: {granularity}. Use: {', '.join(SALES_GRANULARITIES)}.")
+    dimensions = _parse_group_by(group_by)
+
+    date_to = date_to or date.today()
+    date_from = date_from or date_to.replace(day=1)
+    if date_from > date_to:
+        raise ValueError("'date_from' no puede ser posterior a 'date_to'.")
+    if (date_to - date_from).days > MAX_ANALYTICS_RANGE_DAYS:
+        raise ValueError(f"El rango no puede superar {MAX_ANALYTICS_RANGE_DAYS} días.")
+
+    rows = await get_sales_buckets(
+        db, granularity, date_from, date_to, dimensions,
+        raffle_id=raffle_id, user_id=user_id, payment_type=payment_type,
+    )
+    buckets = [
+        SalesBucket(**{**row._asdict(), "tickets_sold": int(row.tickets_sold), "revenue": int(row.revenue)})
+        for row in rows
+    ]
+    return SalesAnalyticsResponse(
+        granularity=granularity,
+        date_from=date_from,
+        date_to=date_to,
+        group_by=dimensions,
+        buckets=buckets,
+        total_tickets_sold=sum(bucket.tickets_sold for bucket in buckets),
+        total_revenue=sum(bucket.revenue for bucket in buckets),
+    )
+
+
+async def get_monthly_sales_summary_service(db: AsyncSession) -> list[dict]:
+    """Tiquetes pagados del mes actual por día de pago y vendedor (mismo formato de siempre)."""
+    rows = await get_daily_sales_by_seller(db, date.today().replace(day=1))
+    return [
+        {"sale_date": row.sale_date, "seller": row.seller, "tickets_sold": int(row.tickets_sold)}
+        for row in rows
+    ]
+
+
+# --- RECONSTRUCCIÓN DEL ROLLUP ---
+async def rebuild_sales_rollup_job(date_from: date | None = None) -> dict:
+    """Reconstruye el rollup de ventas en su propia sesión y transacción."""
+    started = time.perf_counter()
+    async with async_session_local() as session:
+        async with session.begin():
+            rows = await rebuild_sales_rollup(session, date_from)
+    duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    logging.info(f"Reconstrucción del rollup de ventas: {rows} filas en {duration_ms} ms.")
+    return {"rows": rows, "duration_ms": duration_ms}
@@ -1,23 +1,151 @@
 import aiohttp
+import asyncio
 import json
+import logging
+import time
+from dataclasses import dataclass, replace
+
+from app.core.config import settings
 
 # Configuration
 ACCESS_TOKEN = "EAAKaX4DAZCwcBO2PoU05EAtOKmj0skRQbpNl9wi53riogjWkE5bNXenKLBtfoLtFsRt4lEwhtA0f7A9Pmkyu2wcZAy92A8dB3pt5nBX4g6NqCkKPY9exiw8Hn2u9kOm9nsw9LRSx1DKZCdnvZCgCUh7Dr0KhvMPc8C0mZBwG0ZBuSx4dV9sdAb7FWaH1hmDQZDZD"
-PHONE_NUMBER_ID = "649273224941709" 
+PHONE_NUMBER_ID = "649273224941709"
 API_VERSION = "v22.0"  # Current API version
- 
-async def send_purchase_notification(recipient, name_param, receipt_param):
-    # Purchase notification function
-    #   Args:
-    #   recipient: Phone number of the recipient
-    #   name_param: Name of the client
-    #   receipt_param: Parameter for the receipt (TODO: Change to the actual receipt)
 
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-    }
 
+@dataclass(frozen=True)
+class NotificationResult:
+    """Resultado de un envío. 'retryable' indica si tiene sentido reintentar (red, 429 o 5xx)."""
+    ok: bool
+    status: int | None = None
+    message_id: str | None = None
+    error: str | None = None
+    retryable: bool = False
+    duration_ms: float = 0.0
+
+
+class WhatsAppClient:
+    """
+    Cliente HTTP de la Graph API con una sola ClientSession por worker: las conexiones
+    TCP+TLS se reutilizan (keep-alive) entre mensajes, con límite de conexiones por host y
+    tiempos máximos de conexión y lectura. Se crea al iniciar la app y se cierra al apagarla.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        access_token: str,
+        phone_number_id: str,
+        api_version: str,
+        max_connections: int,
+        max_connections_per_host: int,
+        connect_timeout_seconds: float,
+        read_timeout_seconds: float,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.access_token = access_token
+        self.phone_number_id = phone_number_id
+        self.api_version = api_version
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = aiohttp.ClientTimeout(
+            total=connect_timeout_seconds + read_timeout_seconds,
+            sock_connect=connect_timeout_seconds,
+            sock_read=read_timeout_seconds,
+        )
+        self._session: aiohttp.ClientSession | None = None
+        self.metrics = {"sent": 0, "failed": 0, "timeouts": 0, "connection_errors": 0, "total_ms": 0.0, "last_error": None}
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.access_token}"},
+            )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def messages_url(self) -> str:
+        return f"{self.base_url}/{self.api_version}/{self.phone_number_id}/messages"
+
+    async def send_template(self, payload: dict) -> NotificationResult:
+        if self._session is None or self._session.closed:
+            # Por si se usa fuera de la app (scripts) o antes del startup.
+            await self.start()
+
+        started = time.perf_counter()
+        try:
+            async with self._session.post(self.messages_url, json=payload) as response:
+                if response.status == 200:
+                    # Meta ya aceptó el mensaje: un cuerpo inesperado no lo vuelve un error
+                    # (si se marcara reintentable, la bandeja de salida lo enviaría otra vez).
+                    result = NotificationResult(ok=True, status=200, message_id=_message_id(await response.read()))
+                else:
+                    error = await response.text()
+                    result = NotificationResult(
+                        ok=False,
+                        status=response.status,
+                        error=error[:500],
+                        retryable=response.status == 429 or response.status >= 500,
+                    )
+        except asyncio.TimeoutError:
+            self.metrics["timeouts"] += 1
+            result = NotificationResult(ok=False, error="Tiempo de espera agotado", retryable=True)
+        except aiohttp.ClientError as e:
+            self.metrics["connection_errors"] += 1
+            result = NotificationResult(ok=False, error=f"Error de conexión: {e}", retryable=True)
+
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.metrics["total_ms"] += duration_ms
+        if result.ok:
+            self.metrics["sent"] += 1
+        else:
+            self.metrics["failed"] += 1
+            self.metrics["last_error"] = result.error
+            logging.warning(f"Notificación de WhatsApp fallida ({result.status}): {result.error}")
+        return replace(result, duration_ms=duration_ms)
+
+    def get_metrics(self) -> dict:
+        attempts = self.metrics["sent"] + self.metrics["failed"]
+        return {
+            **self.metrics,
+            "avg_ms": round(self.metrics["total_ms"] / attempts, 2) if attempts else None,
+            "max_connections_per_host": self.max_connections_per_host,
+        }
+
+
+def _message_id(body: bytes) -> str | None:
+    try:
+        return json.loads(body)["messages"][0]["id"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        logging.warning(f"Respuesta 200 de WhatsApp sin id de mensaje: {body[:200]!r}")
+        return None
+
+
+whatsapp_client = WhatsAppClient(
+    base_url=settings.WHATSAPP_GRAPH_API_BASE_URL,
+    access_token=settings.WHATSAPP_ACCESS_TOKEN or ACCESS_TOKEN,
+    phone_number_id=settings.WHATSAPP_PHONE_NUMBER_ID or PHONE_NUMBER_ID,
+    api_version=API_VERSION,
+    max_connections=settings.WHATSAPP_MAX_CONNECTIONS,
+    max_connections_per_host=settings.WHATSAPP_MAX_CONNECTIONS_PER_HOST,
+    connect_timeout_seconds=settings.WHATSAPP_CONNECT_TIMEOUT_SECONDS,
+    read_timeout_seconds=settings.WHATSAPP_READ_TIMEOUT_SECONDS,
+)
+
+
+def build_purchase_payload(recipient, name_param, receipt_param) -> dict:
     components = [
         {
             "type": "body",
@@ -36,7 +164,7 @@ async def send_purchase_notification(recipient, name_param, receipt_param):
         }
     ]
 
-    payload = {
+    return {
         "messaging_product": "whatsapp",
         "recipient_type": "individual",
         "to": recipient,
@@ -48,21 +176,14 @@ async def send_purchase_notification(recipient, name_param, receipt_param):
         }
     }
 
-    url = f"https://graph.facebook.com/{API_VERSION}/{PHONE_NUMBER_ID}/messages"
-
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(url, data=json.dumps(payload), headers=headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    print("Message sent successfully!")
-                    print(f"Message ID: {result['messages'][0]['id']}")
-                    return result
-                else:
-                    error = await response.text()
-                    print(f"Error {response.status}: {error}")
-                    return None
-        except aiohttp.ClientConnectorError as e:
-            print(f'Connection Error: {str(e)}')
-            return None
 
+async def send_purchase_notification(recipient, name_param, receipt_param) -> NotificationResult:
+    # Purchase notification function
+    #   Args:
+    #   recipient: Phone number of the recipient
+    #   name_param: Name of the client
+    #   receipt_param: Parameter for the receipt (TODO: Change to the actual receipt)
+    result = await whatsapp_client.send_template(build_purchase_payload(recipient, name_param, receipt_param))
+    if result.ok:
+        logging.info(f"Notificación de WhatsApp enviada a {recipient}: {result.message_id} ({result.duration_ms} ms).")
+    return result
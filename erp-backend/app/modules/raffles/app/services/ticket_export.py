@@ -0,0 +1,72 @@
+# app/services/ticket_export.py
+
+import csv
+import enum
+import io
+import json
+import logging
+from datetime import date, datetime
+from typing import AsyncIterator
+
+from app.db.database import async_session_local
+from app.db.repositories.ticket import stream_ticket_rows
+from app.schemas.ticket import TicketFilters, TicketInfo
+
+# Mismas columnas y en el mismo orden que TicketInfo.
+EXPORT_COLUMNS = list(TicketInfo.model_fields)
+LIST_COLUMNS = {"numbers", "number_ids"}
+
+
+def _json_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        # Las listas (números) se escriben separadas por espacios dentro de una sola celda.
+        return " ".join(str(item) for item in value)
+    return _json_value(value)
+
+
+def _row_values(row) -> dict:
+    values = dict(row._mapping)
+    for column in LIST_COLUMNS:
+        if values[column] is None:
+            values[column] = []
+    return values
+
+
+async def export_tickets(filters: TicketFilters, export_format: str) -> AsyncIterator[bytes]:
+    """
+    Genera la exportación bloque por bloque. Abre su propia sesión porque el cuerpo se
+    transmite después de que la dependencia get_db de la petición ya terminó.
+    """
+    exported = 0
+    async with async_session_local() as session:
+        if export_format == "csv":
+            header = io.StringIO()
+            csv.writer(header).writerow(EXPORT_COLUMNS)
+            yield header.getvalue().encode("utf-8")
+
+        async for rows in stream_ticket_rows(session, filters):
+            buffer = io.StringIO()
+            if export_format == "csv":
+                writer = csv.writer(buffer)
+                for row in rows:
+                    values = _row_values(row)
+                    writer.writerow([_csv_value(values[column]) for column in EXPORT_COLUMNS])
+            else:
+                for row in rows:
+                    values = _row_values(row)
+                    buffer.write(json.dumps({column: _json_value(values[column]) for column in EXPORT_COLUMNS}, ensure_ascii=False))
+                    buffer.write("\n")
+            exported += len(rows)
+            yield buffer.getvalue().encode("utf-8")
+
+    logging.info(f"Exportación {export_format} finalizada: {exported} tiquetes.")
@@ -9,48 +9,55 @@ from sqlalchemy.orm import selectinload
 from zoneinfo import ZoneInfo
 
 from app.db.repositories.ticket import (
-    get_raffle_by_id,
-    find_and_lock_numbers,
     save_new_ticket,
-    get_all_tickets_with_numbers_and_raffle,
+    record_new_ticket,
+    insert_ticket,
+    claim_numbers,
+    try_lock_free_numbers,
+    set_ticket_numbers_snapshot,
+    get_ticket_rows_page,
+    get_ticket_row,
+    search_ticket_rows,
     get_ticket_with_numbers_and_raffle,
     cancel_ticket_and_release_numbers,
     confirm_ticket_payment,
 )
+from app.db.database import on_commit
 from app.db.models import Ticket, User
-from app.schemas.ticket import TicketCreateRequest, TicketInfo
-from app.modules.raffles.app.services.send_whatsapp_message import send_purchase_notification
+from app.schemas.ticket import TicketCreateRequest, TicketAllocateRequest, TicketFilters, TicketInfo
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.normalization import normalize_phone, normalize_name, looks_like_phone
+from app.services.notification_outbox import enqueue_purchase_notification
+from app.services.availability_index import get_availability_index, mark_numbers_available, mark_numbers_unavailable
+from app.services.raffle_meta_cache import RaffleMeta, raffle_meta_cache
+from app.services.receipt_cache import receipt_cache
 
 # --- Configuración básica de logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - SERVICE - %(message)s')
 
+# Rondas de muestreo antes de declarar que no hay suficientes números para la asignación aleatoria.
+ALLOCATION_MAX_ATTEMPTS = 5
 
-async def create_ticket_service(data: TicketCreateRequest, db: AsyncSession, user: User) -> Ticket:
-    """
-    Orquesta la creación de un tiquete. La transacción es manejada por la dependencia get_db.
-    """
-    logging.info(f"Iniciando create_ticket_service para la rifa ID: {data.raffle_id} por el usuario '{user.username}'.")
-    
-    # --- Se elimina el bloque 'async with db.begin()' ---
-    
-    raffle = await get_raffle_by_id(db, data.raffle_id)
-    if not raffle or raffle.status.lower() not in ['active', 'open']:
-        logging.error(f"Validación fallida: La rifa {data.raffle_id} no existe o no está activa.")
+
+# --- FUNCIONES AUXILIARES COMPARTIDAS POR LA COMPRA Y LA ASIGNACIÓN ALEATORIA ---
+async def _get_raffle_for_sale(db: AsyncSession, raffle_id: str) -> RaffleMeta:
+    # Los metadatos salen del cache en memoria; la disponibilidad real la decide el upsert.
+    raffle = await raffle_meta_cache.get(db, raffle_id)
+    if not raffle or not raffle.is_on_sale:
+        logging.error(f"Validación fallida: La rifa {raffle_id} no existe o no está activa.")
         raise ValueError("La rifa no existe o no está activa.")
     logging.info("Validación de rifa exitosa.")
+    return raffle
 
-    existing_numbers = await find_and_lock_numbers(db, data.raffle_id, data.numbers)
-    for num in existing_numbers:
-        if num.status != 'available':
-            logging.error(f"Validación fallida: El número {num.number} ya no está disponible.")
-            raise ValueError(f"El número {num.number} ya no está disponible.")
-    logging.info("Validación de disponibilidad de números exitosa.")
 
-    
+def _resolve_status_and_expiration(status: str, payment_date) -> tuple[str, datetime | None]:
+    """
+    Valida el estado enviado por el frontend y calcula la expiración de la reserva.
+    """
     # --- NUEVA LÓGICA ---
     # Confiamos directamente en el estado que nos envía el frontend.
     # Se realiza una validación simple para asegurar que el valor sea uno de los esperados.
-    ticket_status = data.status.lower()
+    ticket_status = status.lower()
     if ticket_status not in ['paid', 'pending']:
         logging.error(f"Estado '{ticket_status}' no válido enviado desde el frontend.")
         raise ValueError("El estado del tiquete proporcionado no es válido.")
@@ -59,9 +66,9 @@ async def create_ticket_service(data: TicketCreateRequest, db: AsyncSession, use
    # --- BLOQUE DE LÓGICA MODIFICADO ---
     expiration_time = None
     if ticket_status == "pending":
-        if data.payment_date:
+        if payment_date:
             # Si el tiquete es pendiente y el usuario dio una fecha, la usamos.
-            logging.info(f"Tiquete 'pending' con fecha de pago programada: {data.payment_date}.")
+            logging.info(f"Tiquete 'pending' con fecha de pago programada: {payment_date}.")
             try:
                 # Zona horaria de Cali/Colombia
                 colombia_tz = ZoneInfo("America/Bogota")
@@ -70,7 +77,7 @@ async def create_ticket_service(data: TicketCreateRequest, db: AsyncSession, use
                 end_of_day_time = datetime.max.time().replace(microsecond=0)
                 
                 # Combinamos la fecha del usuario con la hora de fin del día.
-                naive_datetime = datetime.combine(data.payment_date, end_of_day_time)
+                naive_datetime = datetime.combine(payment_date, end_of_day_time)
                 
                 # Asignamos la zona horaria correcta, creando un datetime "aware".
                 expiration_time = naive_datetime.astimezone(colombia_tz)
@@ -87,125 +94,213 @@ async def create_ticket_service(data: TicketCreateRequest, db: AsyncSession, use
             logging.warning("Tiquete 'pending' sin fecha de pago especificada. Usando expiración de 15 minutos por defecto.")
             expiration_time = datetime.now(timezone.utc) + timedelta(minutes=15)
     # --- FIN DEL BLOQUE MODIFICADO ---
-    
+    return ticket_status, expiration_time
 
-    new_ticket_obj = Ticket(
+
+def _build_ticket_values(data, ticket_status: str, user: User, numbers: list[str]) -> dict:
+    return dict(
         id=str(uuid.uuid4()),
         raffle_id=data.raffle_id,
         user_id=user.id,
         name=data.name,
         phone=data.phone,
+        phone_normalized=normalize_phone(data.phone),
+        name_search=normalize_name(data.name),
         status=ticket_status,
         payment_type=data.payment_type,
         payment_date=data.payment_date,
         payment_proof_url=data.payment_proof_url,
-        numbers_snapshot=data.numbers # <-- ¡AQUÍ GUARDAS LA FOTOGRAFÍA!
+        numbers_snapshot=numbers # <-- ¡AQUÍ GUARDAS LA FOTOGRAFÍA!
     )
 
-    existing_numbers_map = {n.number for n in existing_numbers}
-    new_number_strings = set(data.numbers) - existing_numbers_map
-    logging.info(f"Preparando para guardar {len(existing_numbers)} números existentes y {len(new_number_strings)} números nuevos.")
 
-    created_ticket = await save_new_ticket(
-        db=db,
-        ticket_data=new_ticket_obj,
-        existing_numbers=existing_numbers,
-        new_number_strings=new_number_strings,
-        expiration_time=expiration_time
+# --- CONSTRUCCIÓN DE TicketInfo SIN REVALIDAR ---
+# Los datos salen de la base de datos o ya fueron validados en la petición, así que se usa
+# model_construct: no se repite la validación de Pydantic campo por campo. Los únicos ajustes
+# son los que la validación hacía antes: listas vacías en lugar de NULL y el precio como float.
+def _ticket_info_from_row(row) -> TicketInfo:
+    values = dict(row._mapping)
+    values["numbers"] = values["numbers"] or []
+    values["number_ids"] = values["number_ids"] or []
+    values["raffle_price"] = float(values["raffle_price"])
+    return TicketInfo.model_construct(**values)
+
+
+def _build_created_ticket_info(ticket_values: dict, ticket_row, numbers: list[str], number_ids: dict[str, int], raffle: RaffleMeta, user: User) -> TicketInfo:
+    # La respuesta se construye con las filas devueltas, sin refrescar el ORM ni revalidar.
+    return TicketInfo.model_construct(
+        **ticket_values,
+        responsible=user.username,
+        created_at=ticket_row.created_at,
+        updated_at=ticket_row.updated_at,
+        numbers=numbers,
+        number_ids=[number_ids[n] for n in numbers],
+        raffle_name=raffle.name,
+        raffle_status=raffle.status,
+        raffle_short_id=raffle.short_id,
+        raffle_end_date=raffle.end_date,
+        raffle_price=float(raffle.price),
     )
+
+
+async def create_ticket_service(data: TicketCreateRequest, db: AsyncSession, user: User) -> TicketInfo:
+    """
+    Orquesta la creación de un tiquete. La transacción es manejada por la dependencia get_db.
+    """
+    logging.info(f"Iniciando create_ticket_service para la rifa ID: {data.raffle_id} por el usuario '{user.username}'.")
     
-    await db.flush()
-        
-    await db.refresh(created_ticket, attribute_names=['numbers', 'user'])
-    
-    # La notificación se envía después de que la transacción (manejada por get_db) sea exitosa.
-    if created_ticket.status == 'paid':
-        logging.info(f"Tiquete pagado. Enviando notificación de WhatsApp al número {created_ticket.phone}.")
-        await send_purchase_notification(
-            created_ticket.phone, 
-            created_ticket.name, 
-            created_ticket.id
-        )
+    # --- Se elimina el bloque 'async with db.begin()' ---
     
+    raffle = await _get_raffle_for_sale(db, data.raffle_id)
+
+    # Se eliminan duplicados conservando el orden y se validan formato y exclusiones
+    # antes de ir a la base de datos. La disponibilidad real la decide el upsert.
+    requested_numbers = list(dict.fromkeys(data.numbers))
+    if not requested_numbers:
+        raise ValueError("Debe seleccionar al menos un número.")
+    for num_str in requested_numbers:
+        if len(num_str) != raffle.dijits_per_number or not num_str.isdigit():
+            raise ValueError(f"El número {num_str} no es válido para esta rifa.")
+        if num_str in raffle.excluded_numbers:
+            raise ValueError(f"El número {num_str} ya no está disponible.")
+
+    ticket_status, expiration_time = _resolve_status_and_expiration(data.status, data.payment_date)
+    ticket_values = _build_ticket_values(data, ticket_status, user, requested_numbers)
+
+    # Un solo INSERT ... ON CONFLICT ... RETURNING reclama todos los números.
+    ticket_row, claimed_rows = await save_new_ticket(
+        db=db,
+        ticket_values=ticket_values,
+        numbers=requested_numbers,
+        expiration_time=expiration_time,
+        raffle_price=raffle.price
+    )
+    number_ids = {row.number: row.id for row in claimed_rows}
+    unavailable = [n for n in requested_numbers if n not in number_ids]
+    if unavailable:
+        # La transacción se revierte en get_db, incluido el tiquete recién insertado.
+        logging.error(f"Validación fallida: Los números {unavailable} ya no están disponibles.")
+        if len(unavailable) == 1:
+            raise ValueError(f"El número {unavailable[0]} ya no está disponible.")
+        raise ValueError(f"Los números {', '.join(unavailable)} ya no están disponibles.")
+    logging.info("Validación de disponibilidad de números exitosa.")
+
+    # El bitmap cambia solo si get_db confirma la transacción.
+    on_commit(db, lambda: mark_numbers_unavailable(data.raffle_id, requested_numbers))
+    created_ticket = _build_created_ticket_info(ticket_values, ticket_row, requested_numbers, number_ids, raffle, user)
+    # La notificación queda en la bandeja de salida, en la misma transacción del tiquete.
+    await enqueue_purchase_notification(db, created_ticket)
+
     logging.info(f"Servicio finalizado. Devolviendo tiquete ID: {created_ticket.id}")
     return created_ticket
 
 
-async def list_tickets_service(db: AsyncSession) -> list[TicketInfo]:
+async def allocate_random_ticket_service(data: TicketAllocateRequest, db: AsyncSession, user: User) -> TicketInfo:
+    """
+    Elige N números disponibles al azar y los reserva para un tiquete nuevo en una sola
+    transacción. Los asignadores concurrentes nunca chocan: cada candidato se toma con un
+    bloqueo asesor que se salta si otro ya lo tiene (semántica SKIP LOCKED).
+    """
+    logging.info(f"Iniciando allocate_random_ticket_service para la rifa ID: {data.raffle_id} por el usuario '{user.username}'.")
+    raffle = await _get_raffle_for_sale(db, data.raffle_id)
+
+    count = data.count or raffle.numbers_per_ticket
+    if count <= 0 or count % raffle.numbers_per_ticket != 0:
+        raise ValueError(f"La cantidad de números debe ser múltiplo de {raffle.numbers_per_ticket} (números por tiquete).")
+
+    index = await get_availability_index(db, data.raffle_id)
+    if count > index.available_count:
+        raise ValueError("No hay suficientes números disponibles para completar el tiquete.")
+
+    ticket_status, expiration_time = _resolve_status_and_expiration(data.status, data.payment_date)
+    ticket_values = _build_ticket_values(data, ticket_status, user, [])
+    ticket_row = await insert_ticket(db, ticket_values)
+
+    number_ids: dict[str, int] = {}
+    # Los excluidos se saltan aquí y no solo en el índice: editar 'excluded_numbers' no crea
+    # filas en 'numbers', así que el bloqueo y el upsert no los rechazarían.
+    tried: set[str] = set(raffle.excluded_numbers)
+    for attempt in range(ALLOCATION_MAX_ATTEMPTS):
+        missing = count - len(number_ids)
+        # Se piden más candidatos de los necesarios para absorber los que otro asignador ya tomó.
+        candidates = index.sample(missing * 2, skip=tried)
+        if not candidates:
+            break
+        tried.update(candidates)
+
+        locked = await try_lock_free_numbers(db, data.raffle_id, candidates)
+        claimed_rows = await claim_numbers(db, data.raffle_id, ticket_values['id'], locked[:missing], ticket_status, expiration_time)
+        number_ids.update({row.number: row.id for row in claimed_rows})
+        logging.info(f"Intento {attempt + 1}: {len(candidates)} candidatos, {len(locked)} bloqueados, {len(claimed_rows)} reclamados.")
+        if len(number_ids) >= count:
+            break
+
+    if len(number_ids) < count:
+        # La transacción se revierte en get_db, incluido el tiquete recién insertado.
+        logging.error(f"No se pudieron asignar {count} números aleatorios para la rifa {data.raffle_id}.")
+        raise ValueError("No hay suficientes números disponibles para completar el tiquete.")
+
+    allocated_numbers = sorted(number_ids)
+    await set_ticket_numbers_snapshot(db, ticket_values['id'], allocated_numbers)
+    await record_new_ticket(db, ticket_values, raffle.price)
+    ticket_values['numbers_snapshot'] = allocated_numbers
+    on_commit(db, lambda: mark_numbers_unavailable(data.raffle_id, allocated_numbers))
+
+    created_ticket = _build_created_ticket_info(ticket_values, ticket_row, allocated_numbers, number_ids, raffle, user)
+    await enqueue_purchase_notification(db, created_ticket)
+    logging.info(f"Asignación finalizada. Devolviendo tiquete ID: {created_ticket.id} con números {allocated_numbers}")
+    return created_ticket
+
+
+async def list_tickets_service(
+    db: AsyncSession,
+    filters: TicketFilters,
+    cursor: str | None = None,
+    limit: int = 100
+) -> tuple[list[TicketInfo], str | None]:
     logging.info("Iniciando list_tickets_service...")
-    # La limpieza de tiquetes expirados se puede añadir aquí si se retoma la lógica de 'pending'
-    # await cleanup_expired_tickets(db)
-    
-    tickets = await get_all_tickets_with_numbers_and_raffle(db)
-    logging.info(f"Se obtuvieron {len(tickets)} tiquetes del repositorio. Mapeando a TicketInfo...")
-    
-    ticket_responses = []
-    for ticket in tickets:
-        # Un tiquete cancelado no tendrá números, pero sigue siendo válido para listar.
-        # Solo omitimos si falta la rifa, lo que indica un error de datos.
-        if not ticket.raffle:
-            logging.warning(f"Omitiendo tiquete ID {ticket.id} por no tener una rifa asociada.")
-            continue
-            
-        raffle = ticket.raffle
-        ticket_info = TicketInfo(
-            id=ticket.id,
-            name=ticket.name,
-            phone=ticket.phone,
-            raffle_id=ticket.raffle_id,
-            status=ticket.status,
-            responsible=ticket.user.username if ticket.user else None,
-            created_at=ticket.created_at,
-            updated_at=ticket.updated_at,
-            payment_type=ticket.payment_type,
-            payment_date=ticket.payment_date,
-            payment_proof_url=ticket.payment_proof_url,
-            numbers=[n.number for n in ticket.numbers],
-            numbers_snapshot=ticket.numbers_snapshot,  # <-- AÑADIR ESTA LÍNE
-            number_ids=[n.id for n in ticket.numbers],
-            raffle_name=raffle.name,
-            raffle_status=raffle.status,
-            raffle_short_id=raffle.short_id,
-            raffle_end_date=raffle.end_date,
-            raffle_price=raffle.price
-        )
-        ticket_responses.append(ticket_info)
-    
-    logging.info(f"Mapeo completado. Devolviendo {len(ticket_responses)} tiquetes.")
-    return ticket_responses
+    # La expiración de tiquetes 'pending' vencidos la hace el barrido periódico
+    # de services/reservation_sweeper.py, fuera de la petición.
+
+    decoded_cursor = decode_cursor(cursor) if cursor else None
+    rows, has_more = await get_ticket_rows_page(db, filters, decoded_cursor, limit)
+    ticket_responses = [_ticket_info_from_row(row) for row in rows]
+
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    logging.info(f"Devolviendo {len(ticket_responses)} tiquetes.")
+    return ticket_responses, next_cursor
+
+
+async def search_tickets_service(
+    db: AsyncSession,
+    query: str,
+    raffle_id: str | None = None,
+    status: str | None = None,
+    limit: int = 50
+) -> list[TicketInfo]:
+    """
+    Busca tiquetes por coincidencia parcial del teléfono (si la consulta parece un número)
+    o del nombre, sobre las columnas normalizadas indexadas con trigramas.
+    """
+    if looks_like_phone(query):
+        field, term = "phone", normalize_phone(query)
+    else:
+        field, term = "name", normalize_name(query)
+    if len(term) < 3:
+        raise ValueError("La búsqueda debe tener al menos 3 caracteres o dígitos.")
+
+    logging.info(f"Buscando tiquetes por {field} '{term}' (rifa={raffle_id}, estado={status}).")
+    rows = await search_ticket_rows(db, field, term, raffle_id, status, limit)
+    return [_ticket_info_from_row(row) for row in rows]
 
 
 async def get_ticket_by_id_service(ticket_id: str, db: AsyncSession) -> TicketInfo | None:
     logging.info(f"Iniciando get_ticket_by_id_service para el ID: {ticket_id}")
-    ticket = await get_ticket_with_numbers_and_raffle(db, ticket_id)
-    if not ticket: 
+    row = await get_ticket_row(db, ticket_id)
+    if not row:
         logging.warning(f"Tiquete con ID {ticket_id} no fue encontrado en el repositorio.")
         return None
-        
-    logging.info("Tiquete encontrado. Mapeando a TicketInfo...")
-    raffle = ticket.raffle
-    ticket_info = TicketInfo(
-        id=ticket.id,
-        name=ticket.name,
-        phone=ticket.phone,
-        raffle_id=ticket.raffle_id,
-        status=ticket.status,
-        responsible=ticket.user.username if ticket.user else None,
-        created_at=ticket.created_at,
-        updated_at=ticket.updated_at,
-        payment_type=ticket.payment_type,
-        payment_date=ticket.payment_date,
-        payment_proof_url=ticket.payment_proof_url,
-        numbers=[n.number for n in ticket.numbers],
-        number_ids=[n.id for n in ticket.numbers],
-        raffle_name=raffle.name,
-        raffle_status=raffle.status,
-        raffle_short_id=raffle.short_id,
-        raffle_end_date=raffle.end_date,
-        raffle_price=raffle.price,
-    )
-    logging.info("Mapeo completado. Devolviendo tiquete.")
-    return ticket_info
+    return _ticket_info_from_row(row)
 
 
 async def cancel_ticket_service(ticket_id: str, db: AsyncSession):
@@ -221,7 +316,11 @@ async def cancel_ticket_service(ticket_id: str, db: AsyncSession):
         raise ValueError(f"El tiquete con ID {ticket_id} no fue encontrado.")
     
     logging.info("Tiquete encontrado. Llamando al repositorio para cancelar y liberar números.")
-    await cancel_ticket_and_release_numbers(db, ticket)
+    released = await cancel_ticket_and_release_numbers(db, ticket)
+    released_numbers = [number_str for _, number_str in released]
+    raffle_id = ticket.raffle_id
+    on_commit(db, lambda: mark_numbers_available(raffle_id, released_numbers))
+    await receipt_cache.evict_ticket(ticket_id)
     logging.info("Operaciones de cancelación completadas, esperando commit de get_db.")
 
 async def confirm_payment_service(ticket_id: str, db: AsyncSession):
@@ -242,4 +341,9 @@ async def confirm_payment_service(ticket_id: str, db: AsyncSession):
         
     logging.info("Tiquete encontrado y validado. Llamando al repositorio para confirmar pago.")
     await confirm_ticket_payment(db, ticket)
+    # 'reserved' -> 'assigned': siguen sin estar disponibles; se reafirma en el índice.
+    confirmed_numbers = [n.number for n in ticket.numbers]
+    raffle_id = ticket.raffle_id
+    on_commit(db, lambda: mark_numbers_unavailable(raffle_id, confirmed_numbers))
+    await receipt_cache.evict_ticket(ticket_id)
     logging.info("Operaciones de confirmación de pago completadas, esperando commit de get_db.")
@@ -0,0 +1,12 @@
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Indica si el encabezado If-None-Match del cliente coincide con el ETag actual.
+    Acepta listas separadas por comas, '*' y la forma débil W/"...".
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    bare_etag = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == bare_etag for tag in candidates)
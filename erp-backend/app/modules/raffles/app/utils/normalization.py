@@ -0,0 +1,32 @@
+import re
+import unicodedata
+
+
+# --- NORMALIZACIÓN PARA LA BÚSQUEDA DE PARTICIPANTES ---
+# Se aplica igual al guardar el tiquete (columnas phone_normalized y name_search) y al
+# buscar, para que "+57 300-123 4567" y "3001234567", o "José" y "jose", coincidan.
+
+_NON_DIGITS = re.compile(r"\D+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_phone(phone: str | None) -> str:
+    """Deja solo los dígitos del teléfono."""
+    return _NON_DIGITS.sub("", phone or "")
+
+
+def normalize_name(name: str | None) -> str:
+    """Minúsculas, sin tildes ni diéresis y con los espacios colapsados."""
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    without_marks = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _WHITESPACE.sub(" ", without_marks).strip().lower()
+
+
+def looks_like_phone(query: str) -> bool:
+    """Una búsqueda se trata como teléfono si solo tiene dígitos, espacios, '+', '-' o paréntesis."""
+    return bool(normalize_phone(query)) and not re.search(r"[^\d\s+\-()]", query)
+
+
+def escape_like(value: str) -> str:
+    """Escapa los comodines de LIKE (la barra invertida es el escape por defecto en PostgreSQL)."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,20 @@
+import base64
+from datetime import datetime
+
+
+# --- CURSORES PARA PAGINACIÓN POR CONJUNTO DE LLAVES (KEYSET) ---
+# El cursor es opaco para el cliente: codifica la llave (created_at, id) del último
+# elemento de la página en base64 URL-safe.
+
+def encode_cursor(created_at: datetime, item_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at_str, item_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at_str), item_id
+    except Exception:
+        raise ValueError("El cursor de paginación no es válido.")
@@ -0,0 +1,45 @@
+import re
+import unicodedata
+from typing import Any
+from urllib.parse import quote
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+# --- RESPUESTA JSON SERIALIZADA CON PYDANTIC-CORE ---
+# La ruta por defecto de FastAPI vuelca el modelo, lo valida otra vez contra response_model,
+# lo recorre con jsonable_encoder en Python puro y termina en json.dumps. Esta clase va del
+# modelo Pydantic a bytes con el serializador en Rust de pydantic-core. La salida es la misma:
+# JSON compacto, UTF-8 sin escapar y fechas en ISO 8601.
+
+def model_to_json(model: BaseModel) -> bytes:
+    """Serializa un modelo directamente a bytes JSON (equivale a model_dump_json().encode())."""
+    return model.__pydantic_serializer__.to_json(model)
+
+
+class PydanticJSONResponse(JSONResponse):
+    """
+    Respuesta JSON rápida. Los endpoints con respuestas grandes la devuelven directamente con
+    el modelo ya construido (FastAPI no vuelve a validar ni a codificar un Response); en el
+    resto actúa como clase de respuesta por defecto de la aplicación.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return model_to_json(content)
+        return pydantic_core.to_json(content)
+
+
+# --- CONTENT-DISPOSITION CON NOMBRES NO ASCII ---
+# Starlette codifica los encabezados en latin-1: un nombre con emoji o "€" haría fallar la
+# respuesta. Se envía un nombre ASCII de respaldo y el nombre real en 'filename*' (RFC 5987),
+# como lo hace FileResponse.
+
+def attachment_disposition(filename: str) -> str:
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode()
+    ascii_name = re.sub(r'[^A-Za-z0-9._-]', "_", ascii_name) or "download"
+    if ascii_name == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename, safe='')}"
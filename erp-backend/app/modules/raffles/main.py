@@ -1,18 +1,31 @@
 from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional, Annotated
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.db.database import engine
+from app.db.database import engine, async_session_local
 from app.db.base import Base 
 import app.db.models as models
 from app.api.v1 import router as api_router
 from fastapi.staticfiles import StaticFiles
 import os
 from app.modules.raffles.app.api.v1.uploads import router as uploads_router
+from app.db.repositories.raffle import get_all_raffle_ids
+from app.services.availability_index import rebuild_all_availability_indexes
+from app.services.reservation_sweeper import reservation_sweeper
+from app.core.security import password_hasher
+from app.services.generate_image import init_receipt_renderer
+from app.services.receipt_pool import receipt_render_pool
+from app.services.receipt_cache import receipt_cache
+from app.services.send_whatsapp_message import whatsapp_client
+from app.services.notification_outbox import notification_dispatcher
+from app.services.raffle_stats import reconcile_all_raffle_stats
+from app.services.sales_service import rebuild_sales_rollup_job
+from app.utils.responses import PydanticJSONResponse
 
-app = FastAPI(title=settings.PROJECT_NAME)
+app = FastAPI(title=settings.PROJECT_NAME, default_response_class=PydanticJSONResponse)
 
 
 
@@ -27,9 +40,60 @@ async def startup_event():
         # Esto imprimirá el SQL que se ejecutará
         print("Dropping and recreating tables...")
         await conn.run_sync(Base.metadata.drop_all)
+        # Los índices de búsqueda de participantes usan trigramas.
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all, checkfirst=True)
     print("Database tables created")
 
+    # Se reconstruyen los bitmaps de disponibilidad desde la tabla 'numbers'.
+    async with async_session_local() as session:
+        raffle_ids = await get_all_raffle_ids(session)
+        rebuilt = await rebuild_all_availability_indexes(session, raffle_ids)
+    print(f"Availability indexes rebuilt for {rebuilt} raffles")
+
+    # Los contadores de raffle_stats se recalculan desde cero por si quedaron desfasados.
+    reconciled = await reconcile_all_raffle_stats(raffle_ids)
+    print(f"Raffle statistics reconciled for {reconciled['raffles_reconciled']} raffles")
+
+    # El rollup diario de ventas también se reconstruye desde 'tickets'.
+    rollup = await rebuild_sales_rollup_job()
+    print(f"Sales rollup rebuilt with {rollup['rows']} rows")
+
+    # La plantilla y las fuentes del comprobante se cargan una sola vez por worker; los
+    # procesos del pool de render cargan las suyas al arrancar.
+    try:
+        init_receipt_renderer()
+        print("Receipt renderer initialized")
+    except FileNotFoundError as e:
+        print(f"Warning: receipt template not found, /image will fail: {e}")
+    receipt_render_pool.start()
+    print(f"Receipt render pool started with {receipt_render_pool.processes} processes")
+    receipt_cache.start()
+    print("Receipt cache pruner started")
+
+    # Sesión HTTP compartida (keep-alive) para las notificaciones de WhatsApp.
+    await whatsapp_client.start()
+    print("WhatsApp client started")
+
+    if settings.RESERVATION_SWEEPER_ENABLED:
+        reservation_sweeper.start()
+        print("Reservation sweeper started")
+
+    if settings.NOTIFICATION_DISPATCHER_ENABLED:
+        notification_dispatcher.start()
+        print("Notification dispatcher started")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await reservation_sweeper.stop()
+    # El despachador se detiene antes de cerrar la sesión HTTP que usa.
+    await notification_dispatcher.stop()
+    password_hasher.shutdown()
+    receipt_render_pool.shutdown()
+    await receipt_cache.stop()
+    await whatsapp_client.close()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,85 @@
+# scripts/bench_allocate.py
+#
+# Prueba de contención de la asignación aleatoria atómica (POST /tickets/allocate).
+# Lanza N asignadores concurrentes contra la misma rifa, cada uno en su propia transacción,
+# y verifica que ningún número quede asignado a dos tiquetes.
+#
+# ATENCIÓN: crea tiquetes reales ('pending'). Úsese solo contra una base de pruebas.
+#
+# Uso (desde la raíz del módulo de rifas):
+#   python -m scripts.bench_allocate <raffle_id> <username> [asignadores] [rondas]
+
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+
+from sqlalchemy import select
+
+from app.db.database import async_session_local
+from app.db.models import User
+from app.schemas.ticket import PaymentType, TicketAllocateRequest
+from app.services.ticket_service import allocate_random_ticket_service
+
+
+async def allocate_once(raffle_id: str, user: User, index: int) -> tuple[float, list[str] | None, str | None]:
+    request = TicketAllocateRequest(
+        raffle_id=raffle_id,
+        name=f"Benchmark {index}",
+        phone="0000000000",
+        payment_type=PaymentType.efectivo,
+        status="pending",
+    )
+    start = time.perf_counter()
+    try:
+        async with async_session_local() as session:
+            async with session.begin():
+                ticket = await allocate_random_ticket_service(request, session, user)
+        return time.perf_counter() - start, ticket.numbers, None
+    except Exception as e:
+        return time.perf_counter() - start, None, str(e)
+
+
+async def run_benchmark(raffle_id: str, username: str, allocators: int, rounds: int):
+    async with async_session_local() as session:
+        user = (await session.execute(select(User).where(User.username == username))).scalars().first()
+    if user is None:
+        print(f"El usuario {username} no existe.")
+        return
+
+    latencies, failures, allocated = [], Counter(), Counter()
+    started = time.perf_counter()
+    for round_index in range(rounds):
+        results = await asyncio.gather(*[
+            allocate_once(raffle_id, user, round_index * allocators + i) for i in range(allocators)
+        ])
+        for elapsed, numbers, error in results:
+            latencies.append(elapsed * 1000)
+            if error:
+                failures[error] += 1
+            else:
+                allocated.update(numbers)
+    total_time = time.perf_counter() - started
+
+    duplicated = [n for n, times in allocated.items() if times > 1]
+    ordered = sorted(latencies)
+    print(f"Rifa {raffle_id} | {allocators} asignadores concurrentes x {rounds} rondas")
+    print(f"asignaciones exitosas: {len(latencies) - sum(failures.values())}  fallidas: {sum(failures.values())}")
+    print(f"throughput: {len(latencies) / total_time:.1f} asignaciones/s")
+    print(f"latencia mediana={statistics.median(ordered):.1f} ms  p95={ordered[int(len(ordered) * 0.95) - 1]:.1f} ms  p99={ordered[int(len(ordered) * 0.99) - 1]:.1f} ms")
+    print(f"números duplicados entre tiquetes: {len(duplicated)}")
+    for error, times in failures.most_common(5):
+        print(f"  {times}x {error}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python -m scripts.bench_allocate <raffle_id> <username> [asignadores] [rondas]")
+        sys.exit(1)
+    asyncio.run(run_benchmark(
+        sys.argv[1],
+        sys.argv[2],
+        int(sys.argv[3]) if len(sys.argv) > 3 else 50,
+        int(sys.argv[4]) if len(sys.argv) > 4 else 10,
+    ))
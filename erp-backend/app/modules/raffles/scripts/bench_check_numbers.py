@@ -0,0 +1,57 @@
+# scripts/bench_check_numbers.py
+#
+# Compara la verificación número por número (is_number_available, 2 consultas por número)
+# contra la verificación en lote (get_numbers_status, 1 consulta por paquete).
+#
+# Uso (desde la raíz del módulo de rifas, con DATABASE_URL apuntando a una base con datos):
+#   python -m scripts.bench_check_numbers <raffle_id> [tamaño_paquete] [repeticiones]
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from app.db.database import async_session_local
+from app.db.models import Raffle
+from app.db.repositories.raffle import get_numbers_status, is_number_available
+
+
+async def run_benchmark(raffle_id: str, package_size: int, repetitions: int):
+    async with async_session_local() as session:
+        raffle = await session.get(Raffle, raffle_id)
+        if raffle is None:
+            print(f"La rifa {raffle_id} no existe.")
+            return
+        universe = 10 ** raffle.dijits_per_number
+
+        per_number_times, batch_times = [], []
+        for _ in range(repetitions):
+            numbers = [str(n).zfill(raffle.dijits_per_number) for n in random.sample(range(universe), package_size)]
+
+            start = time.perf_counter()
+            for number_str in numbers:
+                await is_number_available(session, raffle_id, number_str)
+            per_number_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await get_numbers_status(session, raffle_id, numbers)
+            batch_times.append(time.perf_counter() - start)
+
+    def describe(label, samples, queries):
+        ms = [s * 1000 for s in samples]
+        print(f"{label:<14} consultas={queries:<4} mediana={statistics.median(ms):8.2f} ms  p95={sorted(ms)[int(len(ms) * 0.95) - 1]:8.2f} ms")
+
+    print(f"Rifa {raffle_id} | paquete de {package_size} números | {repetitions} repeticiones")
+    describe("por número", per_number_times, package_size * 2)
+    describe("en lote", batch_times, 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python -m scripts.bench_check_numbers <raffle_id> [tamaño_paquete] [repeticiones]")
+        sys.exit(1)
+    raffle_id_arg = sys.argv[1]
+    package_size_arg = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    repetitions_arg = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    asyncio.run(run_benchmark(raffle_id_arg, package_size_arg, repetitions_arg))
@@ -0,0 +1,61 @@
+# scripts/bench_json_responses.py
+#
+# Micro-benchmark de la serialización de una respuesta TicketListResponse grande:
+#   - FastAPI por defecto: model_dump -> validación contra response_model -> jsonable_encoder
+#     -> json.dumps (JSONResponse).
+#   - PydanticJSONResponse: modelo -> bytes con el serializador de pydantic-core.
+# Verifica además que ambos cuerpos sean idénticos byte a byte.
+#
+# Uso (desde la raíz del módulo de rifas):
+#   python -m scripts.bench_json_responses [tiquetes] [repeticiones]
+
+import statistics
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.schemas.ticket import TicketListResponse
+from app.utils.responses import PydanticJSONResponse
+from scripts.bench_ticket_serialization import build_after, build_fixtures
+
+
+def render_default(response: TicketListResponse) -> bytes:
+    validated = TicketListResponse.model_validate(response.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def render_fast(response: TicketListResponse) -> bytes:
+    return PydanticJSONResponse(response).body
+
+
+def measure(label: str, render, response: TicketListResponse, repetitions: int) -> float:
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        render(response)
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    print(f"{label:<32} mediana={median * 1000:8.1f} ms  mín={min(times) * 1000:8.1f} ms")
+    return median
+
+
+def run_benchmark(ticket_count: int, repetitions: int):
+    _, rows = build_fixtures(ticket_count, 5)
+    response = TicketListResponse.model_construct(tickets=build_after(rows), next_cursor="cursor")
+
+    default_body, fast_body = render_default(response), render_fast(response)
+    assert default_body == fast_body, "Los cuerpos JSON no son idénticos"
+    print(f"{ticket_count} tiquetes, cuerpo de {len(fast_body) / 1024 / 1024:.1f} MB, {repetitions} repeticiones")
+
+    default = measure("FastAPI por defecto", render_default, response, repetitions)
+    fast = measure("PydanticJSONResponse", render_fast, response, repetitions)
+    print(f"{default / fast:.1f}x más rápido")
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    )
@@ -0,0 +1,108 @@
+# scripts/bench_login_storm.py
+#
+# Mide la latencia de las compras (POST /tickets/allocate) mientras una ráfaga de logins
+# golpea POST /auth/token en el mismo servidor. Corre dos fases de igual duración:
+#   1. solo compras (línea base)
+#   2. compras + tormenta de logins
+# y compara p50/p99 de las compras. Con bcrypt dentro del event loop la p99 de la fase 2 se
+# dispara a cientos de ms; con el pool acotado debe quedar cerca de la línea base.
+#
+# ATENCIÓN: crea tiquetes reales ('pending'). Úsese solo contra una base de pruebas.
+#
+# Uso (desde la raíz del módulo de rifas, con el servidor corriendo):
+#   python -m scripts.bench_login_storm <base_url> <username> <password> <raffle_id> \
+#       [compradores] [logins_concurrentes] [segundos_por_fase]
+
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+
+async def login(session: aiohttp.ClientSession, base_url: str, username: str, password: str) -> tuple[int, str | None]:
+    async with session.post(f"{base_url}/api/v1/auth/token", data={"username": username, "password": password}) as response:
+        if response.status != 200:
+            return response.status, None
+        return response.status, (await response.json())["access_token"]
+
+
+async def buyer(session, base_url: str, token: str, raffle_id: str, deadline: float, latencies: list, statuses: Counter):
+    headers = {"Authorization": f"Bearer {token}"}
+    index = 0
+    while time.perf_counter() < deadline:
+        payload = {
+            "raffle_id": raffle_id,
+            "name": f"Benchmark login {index}",
+            "phone": "0000000000",
+            "payment_type": "efectivo",
+            "status": "pending",
+        }
+        start = time.perf_counter()
+        async with session.post(f"{base_url}/api/v1/tickets/allocate", json=payload, headers=headers) as response:
+            await response.read()
+            statuses[response.status] += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+        index += 1
+
+
+async def login_storm(session, base_url: str, username: str, password: str, deadline: float, statuses: Counter):
+    while time.perf_counter() < deadline:
+        status, _ = await login(session, base_url, username, password)
+        statuses[status] += 1
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[max(int(len(ordered) * fraction) - 1, 0)]
+
+
+async def run_phase(label: str, base_url, token, username, password, raffle_id, buyers: int, logins: int, seconds: float):
+    latencies, purchase_statuses, login_statuses = [], Counter(), Counter()
+    connector = aiohttp.TCPConnector(limit=buyers + logins)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(
+            *[buyer(session, base_url, token, raffle_id, deadline, latencies, purchase_statuses) for _ in range(buyers)],
+            *[login_storm(session, base_url, username, password, deadline, login_statuses) for _ in range(logins)],
+        )
+
+    ordered = sorted(latencies)
+    print(f"--- {label} ---")
+    if ordered:
+        print(f"compras: {len(ordered)} ({len(ordered) / seconds:.1f}/s)  mediana={statistics.median(ordered):.1f} ms  "
+              f"p99={percentile(ordered, 0.99):.1f} ms  máx={ordered[-1]:.1f} ms  estados={dict(purchase_statuses)}")
+    if logins:
+        print(f"logins: {sum(login_statuses.values())} ({sum(login_statuses.values()) / seconds:.1f}/s)  estados={dict(login_statuses)}")
+    return percentile(ordered, 0.99) if ordered else None
+
+
+async def run_benchmark(base_url: str, username: str, password: str, raffle_id: str, buyers: int, logins: int, seconds: float):
+    async with aiohttp.ClientSession() as session:
+        status, token = await login(session, base_url, username, password)
+    if token is None:
+        print(f"No se pudo iniciar sesión como {username} (HTTP {status}).")
+        return
+
+    print(f"{buyers} compradores, {logins} logins concurrentes, {seconds:.0f} s por fase")
+    baseline = await run_phase("solo compras", base_url, token, username, password, raffle_id, buyers, 0, seconds)
+    storm = await run_phase("compras + tormenta de logins", base_url, token, username, password, raffle_id, buyers, logins, seconds)
+    if baseline and storm:
+        print(f"p99 de compras: {baseline:.1f} ms -> {storm:.1f} ms ({storm / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        print("Uso: python -m scripts.bench_login_storm <base_url> <username> <password> <raffle_id> "
+              "[compradores] [logins_concurrentes] [segundos_por_fase]")
+        sys.exit(1)
+    asyncio.run(run_benchmark(
+        sys.argv[1].rstrip("/"),
+        sys.argv[2],
+        sys.argv[3],
+        sys.argv[4],
+        int(sys.argv[5]) if len(sys.argv) > 5 else 20,
+        int(sys.argv[6]) if len(sys.argv) > 6 else 50,
+        float(sys.argv[7]) if len(sys.argv) > 7 else 20,
+    ))
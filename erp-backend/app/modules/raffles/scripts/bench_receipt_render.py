@@ -0,0 +1,108 @@
+# scripts/bench_receipt_render.py
+#
+# Mide comprobantes por segundo:
+#   - antes: la implementación anterior de generate_raffle_image (abre y convierte la plantilla,
+#     carga cinco fuentes y mide cada línea dos veces en cada render, compone la imagen completa).
+#   - después: ReceiptRenderer ya inicializado (plantilla decodificada, fuentes en cache, líneas
+#     fijas medidas, solo se compone la franja del recuadro).
+# Reporta render solo y render + JPEG calidad 95, y la diferencia de píxeles entre ambas salidas.
+# No necesita base de datos.
+#
+# Uso (desde la raíz del módulo de rifas):
+#   python -m scripts.bench_receipt_render [renders] [números_por_tiquete]
+
+import io
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from app.services.generate_image import FONT_PATH, TEMPLATE_IMAGE_PATH, ReceiptRenderer
+
+
+def legacy_generate_raffle_image(ticket_data: dict):
+    """Copia del render anterior, solo para comparar."""
+    img = Image.open(TEMPLATE_IMAGE_PATH).copy().convert("RGBA")
+    img_width, img_height = img.size
+    overlay = Image.new("RGBA", img.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(overlay)
+    font_title = ImageFont.truetype(str(FONT_PATH), 60)
+    font_subtitle = ImageFont.truetype(str(FONT_PATH), 35)
+    font_main = ImageFont.truetype(str(FONT_PATH), 40)
+    font_numbers = ImageFont.truetype(str(FONT_PATH), 45)
+    font_small = ImageFont.truetype(str(FONT_PATH), 25)
+
+    total_price = ticket_data["total_price"]
+    content_lines = [
+        ("¡Compra Exitosa!", font_title, 20),
+        (f"Rifa: {ticket_data['raffle_name']}", font_subtitle, 40),
+        (f"Comprador: {ticket_data['buyer_name']}", font_main, 15),
+        (f"Fecha de Compra: {ticket_data['purchase_date']}", font_main, 15),
+        (f"Total Pagado: ${total_price:,.0f} COP", font_main, 40),
+        ("Tus Números:", font_title, 20),
+        (", ".join(sorted(ticket_data["numbers"])), font_numbers, 40),
+        (f"Fecha del Sorteo: {ticket_data['draw_date']}", font_subtitle, 50),
+        (f"ID de Transacción: {ticket_data['ticket_id']}", font_small, 5),
+        ("Conserva este comprobante. ¡Mucha suerte!", font_small, 0),
+    ]
+    total_content_height = sum(font.getbbox(text)[3] - font.getbbox(text)[1] + spacing for text, font, spacing in content_lines)
+    y = (img_height - total_content_height) / 2
+    draw.rectangle([60, y - 60, img_width - 60, y + total_content_height + 60], fill=(255, 255, 255, 210))
+    for text, font, spacing in content_lines:
+        line_height = font.getbbox(text)[3] - font.getbbox(text)[1]
+        text_bbox = draw.textbbox((0, y), text, font=font)
+        draw.text(((img_width - (text_bbox[2] - text_bbox[0])) / 2, y), text, font=font, fill=(0, 0, 0))
+        y += line_height + spacing
+    return Image.alpha_composite(img, overlay).convert("RGB")
+
+
+def ticket_fixture(index: int, numbers_per_ticket: int) -> dict:
+    return {
+        "ticket_id": f"3f2a9c1e-0000-4000-8000-{index:012d}",
+        "buyer_name": f"Participante de Prueba {index}",
+        "raffle_name": "Gran Rifa de Fin de Año",
+        "purchase_date": "02 de enero de 2025",
+        "draw_date": "31 de enero de 2025",
+        "total_price": 20000,
+        "numbers": [str((index * numbers_per_ticket + k) % 10000).zfill(4) for k in range(numbers_per_ticket)],
+    }
+
+
+def to_jpeg(img) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def measure(label: str, func, tickets: list[dict]) -> float:
+    times = []
+    for ticket in tickets:
+        start = time.perf_counter()
+        func(ticket)
+        times.append(time.perf_counter() - start)
+    per_second = 1 / statistics.median(times)
+    print(f"{label:<38} {per_second:8.1f} renders/s  (mediana {statistics.median(times) * 1000:.2f} ms)")
+    return per_second
+
+
+def run_benchmark(renders: int, numbers_per_ticket: int):
+    renderer = ReceiptRenderer()
+    tickets = [ticket_fixture(i, numbers_per_ticket) for i in range(renders)]
+
+    difference = ImageChops.difference(legacy_generate_raffle_image(tickets[0]), renderer.render(tickets[0]))
+    print(f"plantilla {renderer.size[0]}x{renderer.size[1]}, {renders} renders, {numbers_per_ticket} números por tiquete")
+    print(f"píxeles distintos entre ambas salidas: {'ninguno' if difference.getbbox() is None else difference.getbbox()}")
+
+    before = measure("antes: render", legacy_generate_raffle_image, tickets)
+    after = measure("después: render", renderer.render, tickets)
+    before_jpeg = measure("antes: render + JPEG q95", lambda t: to_jpeg(legacy_generate_raffle_image(t)), tickets)
+    after_jpeg = measure("después: render + JPEG q95", renderer.render_jpeg, tickets)
+    print(f"render {after / before:.1f}x más rápido, con JPEG {after_jpeg / before_jpeg:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    )
@@ -0,0 +1,41 @@
+# scripts/bench_receipt_variants.py
+#
+# Tamaño en bytes y tiempo de derivación de cada variante del comprobante (full, preview,
+# thumb en JPEG y WebP) frente al maestro JPEG calidad 95. Usa los mismos tiquetes de prueba
+# que bench_receipt_render. No necesita base de datos.
+#
+# Uso (desde la raíz del módulo de rifas):
+#   python -m scripts.bench_receipt_variants [tiquetes]
+
+import statistics
+import sys
+import time
+
+from app.services.generate_image import IMAGE_FORMATS, ReceiptRenderer, derive_receipt_variant
+from app.services.receipt_service import RECEIPT_JPEG_QUALITY, RECEIPT_VARIANTS
+from scripts.bench_receipt_render import ticket_fixture
+
+
+def run_benchmark(ticket_count: int):
+    renderer = ReceiptRenderer()
+    masters = [renderer.render_jpeg(ticket_fixture(i, 5), quality=RECEIPT_JPEG_QUALITY) for i in range(ticket_count)]
+    master_avg = statistics.mean(len(master) for master in masters)
+    print(f"{ticket_count} comprobantes, maestro JPEG q{RECEIPT_JPEG_QUALITY}: {master_avg / 1024:.1f} KiB en promedio")
+    print(f"{'variante':<14} {'KiB':>8} {'ahorro':>8} {'derivación':>12}")
+
+    for variant, (max_width, quality) in RECEIPT_VARIANTS.items():
+        for image_format in IMAGE_FORMATS:
+            if variant == "full" and image_format == "jpeg":
+                continue
+            sizes, times = [], []
+            for master in masters:
+                start = time.perf_counter()
+                sizes.append(len(derive_receipt_variant(master, max_width, image_format, quality)))
+                times.append(time.perf_counter() - start)
+            average = statistics.mean(sizes)
+            print(f"{variant + '.' + image_format:<14} {average / 1024:8.1f} {100 * (1 - average / master_avg):7.1f}% "
+                  f"{statistics.median(times) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
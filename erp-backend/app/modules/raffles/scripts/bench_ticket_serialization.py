@@ -0,0 +1,114 @@
+# scripts/bench_ticket_serialization.py
+#
+# Mide el costo por tiquete de construir y serializar TicketInfo:
+#   - antes: objetos tipo ORM (Ticket + Number + Raffle + User) copiados campo por campo a
+#     TicketInfo(...) con validación, y la respuesta validada otra vez al salir (como FastAPI).
+#   - después: filas proyectadas (lo que devuelve ticket_projection_query) convertidas con
+#     model_construct, sin validación.
+# No necesita base de datos: las filas se generan en memoria.
+#
+# Uso (desde la raíz del módulo de rifas):
+#   python -m scripts.bench_ticket_serialization [tiquetes] [números_por_tiquete] [repeticiones]
+
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas.ticket import PaymentType, TicketInfo, TicketListResponse
+from app.services.ticket_service import _ticket_info_from_row
+
+
+class _ProjectedRow:
+    """Imita una fila de SQLAlchemy: solo se usa su atributo _mapping."""
+
+    def __init__(self, mapping: dict):
+        self._mapping = mapping
+
+
+def build_fixtures(ticket_count: int, numbers_per_ticket: int):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    raffle = SimpleNamespace(
+        name="Rifa de prueba", status="open", short_id="ABC12",
+        end_date=created + timedelta(days=30), price=5000,
+    )
+    user = SimpleNamespace(username="vendedor")
+    orm_tickets, rows = [], []
+    for i in range(ticket_count):
+        numbers = [str(i * numbers_per_ticket + k).zfill(6) for k in range(numbers_per_ticket)]
+        number_ids = list(range(i * numbers_per_ticket, (i + 1) * numbers_per_ticket))
+        common = dict(
+            id=f"ticket-{i}", name=f"Participante {i}", phone="3001234567", raffle_id="raffle-1",
+            status="paid", created_at=created + timedelta(seconds=i), updated_at=None,
+            payment_type=PaymentType.efectivo, payment_date=date(2024, 1, 2), payment_proof_url=None,
+            numbers_snapshot=numbers,
+        )
+        orm_tickets.append(SimpleNamespace(
+            **common, raffle=raffle, user=user,
+            numbers=[SimpleNamespace(id=number_id, number=n) for number_id, n in zip(number_ids, numbers)],
+        ))
+        rows.append(_ProjectedRow(dict(
+            **common, responsible=user.username, numbers=numbers, number_ids=number_ids,
+            raffle_name=raffle.name, raffle_status=raffle.status, raffle_short_id=raffle.short_id,
+            raffle_end_date=raffle.end_date, raffle_price=raffle.price,
+        )))
+    return orm_tickets, rows
+
+
+def build_before(orm_tickets) -> list[TicketInfo]:
+    return [
+        TicketInfo(
+            id=t.id, name=t.name, phone=t.phone, raffle_id=t.raffle_id, status=t.status,
+            responsible=t.user.username if t.user else None, created_at=t.created_at,
+            updated_at=t.updated_at, payment_type=t.payment_type, payment_date=t.payment_date,
+            payment_proof_url=t.payment_proof_url, numbers=[n.number for n in t.numbers],
+            numbers_snapshot=t.numbers_snapshot, number_ids=[n.id for n in t.numbers],
+            raffle_name=t.raffle.name, raffle_status=t.raffle.status, raffle_short_id=t.raffle.short_id,
+            raffle_end_date=t.raffle.end_date, raffle_price=t.raffle.price,
+        )
+        for t in orm_tickets
+    ]
+
+
+def build_after(rows) -> list[TicketInfo]:
+    return [_ticket_info_from_row(row) for row in rows]
+
+
+def serialize_like_fastapi(tickets: list[TicketInfo]):
+    # FastAPI vuelca el modelo, lo valida contra response_model y luego aplica jsonable_encoder.
+    dumped = TicketListResponse.model_construct(tickets=tickets, next_cursor=None).model_dump()
+    return jsonable_encoder(TicketListResponse.model_validate(dumped))
+
+
+def measure(label: str, func, argument, ticket_count: int, repetitions: int) -> float:
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        func(argument)
+        times.append(time.perf_counter() - start)
+    per_ticket_us = statistics.median(times) / ticket_count * 1_000_000
+    print(f"{label:<45} {per_ticket_us:8.2f} µs/tiquete  (mediana {statistics.median(times) * 1000:.1f} ms)")
+    return per_ticket_us
+
+
+def run_benchmark(ticket_count: int, numbers_per_ticket: int, repetitions: int):
+    orm_tickets, rows = build_fixtures(ticket_count, numbers_per_ticket)
+    before_models, after_models = build_before(orm_tickets), build_after(rows)
+    assert serialize_like_fastapi(before_models) == serialize_like_fastapi(after_models), "Las salidas difieren"
+
+    print(f"{ticket_count} tiquetes x {numbers_per_ticket} números, {repetitions} repeticiones")
+    before = measure("antes: ORM -> TicketInfo(...) validado", build_before, orm_tickets, ticket_count, repetitions)
+    after = measure("después: fila -> model_construct", build_after, rows, ticket_count, repetitions)
+    measure("serialización de salida (igual en ambos)", serialize_like_fastapi, after_models, ticket_count, repetitions)
+    print(f"construcción {before / after:.1f}x más rápida")
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 5,
+    )
@@ -0,0 +1,99 @@
+# scripts/bench_whatsapp_client.py
+#
+# Compara el envío de notificaciones con el cliente compartido (una sesión, keep-alive)
+# contra una sesión nueva por mensaje (el comportamiento anterior), usando el mock local de
+# la Graph API. Reporta mensajes por segundo, latencia p50/p95 y conexiones TCP abiertas.
+# No necesita base de datos ni credenciales.
+#
+# Uso (desde la raíz del módulo de rifas):
+#   python -m scripts.bench_whatsapp_client [mensajes] [concurrencia] [latencia_ms]
+
+import asyncio
+import statistics
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+from app.services.send_whatsapp_message import API_VERSION, WhatsAppClient, build_purchase_payload
+from scripts.mock_graph_api import STATS, build_app
+
+HOST, PORT = "127.0.0.1", 8091
+
+
+def new_client(per_host: int) -> WhatsAppClient:
+    return WhatsAppClient(
+        base_url=f"http://{HOST}:{PORT}",
+        access_token="token-de-prueba",
+        phone_number_id="000000000000000",
+        api_version=API_VERSION,
+        max_connections=per_host,
+        max_connections_per_host=per_host,
+        connect_timeout_seconds=3.0,
+        read_timeout_seconds=10.0,
+    )
+
+
+async def send_with_new_session(client: WhatsAppClient, payload: dict) -> bool:
+    # Lo que hacía la versión anterior: sesión (y conexión) nueva por cada mensaje.
+    async with aiohttp.ClientSession(headers={"Authorization": f"Bearer {client.access_token}"}) as session:
+        async with session.post(client.messages_url, json=payload) as response:
+            await response.read()
+            return response.status == 200
+
+
+async def run_mode(name: str, send, stats: dict, messages: int, concurrency: int):
+    stats["connections"].clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(index: int):
+        nonlocal failures
+        payload = build_purchase_payload(f"57300{index:07d}", f"Cliente {index}", f"ticket-{index}")
+        async with semaphore:
+            start = time.perf_counter()
+            ok = await send(payload)
+            latencies.append(time.perf_counter() - start)
+            failures += 0 if ok else 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{name:<16} {messages / elapsed:9.1f} msg/s  p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms  "
+          f"conexiones {len(stats['connections']):5d}  fallidos {failures}")
+
+
+async def main(messages: int, concurrency: int, latency_ms: float):
+    app = build_app(latency_ms=latency_ms)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, PORT).start()
+    stats = app[STATS]
+    print(f"{messages} mensajes, concurrencia {concurrency}, latencia simulada {latency_ms} ms")
+
+    client = new_client(per_host=concurrency)
+    try:
+        await run_mode("sesión por envío", lambda payload: send_with_new_session(client, payload), stats, messages, concurrency)
+        await client.start()
+
+        async def send_shared(payload: dict) -> bool:
+            return (await client.send_template(payload)).ok
+
+        await run_mode("cliente pooled", send_shared, stats, messages, concurrency)
+        print(f"métricas del cliente: {client.get_metrics()}")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 500,
+        int(args[1]) if len(args) > 1 else 20,
+        float(args[2]) if len(args) > 2 else 20.0,
+    ))
@@ -0,0 +1,68 @@
+# scripts/mock_graph_api.py
+#
+# Mock local del endpoint de mensajes de la Graph API de WhatsApp, para probar el cliente
+# sin enviar mensajes reales. Responde como la API ({"messages": [{"id": ...}]}), puede
+# agregar latencia y fallas (500 o 429), responde 400 si falta el destinatario y cuenta las
+# conexiones TCP distintas que recibe, para ver si el cliente reutiliza conexiones (keep-alive).
+#
+# Uso (desde la raíz del módulo de rifas):
+#   python -m scripts.mock_graph_api [--port 8090] [--latency-ms 50] [--failure-rate 0.0]
+# y apuntar la app con WHATSAPP_GRAPH_API_BASE_URL=http://127.0.0.1:8090
+
+import argparse
+import asyncio
+import random
+import uuid
+
+from aiohttp import web
+
+# Contadores del mock (peticiones, fallas y conexiones), para los tests y el benchmark.
+STATS = web.AppKey("stats", dict)
+
+
+def build_app(latency_ms: float = 0.0, failure_rate: float = 0.0, throttle_rate: float = 0.0) -> web.Application:
+    stats = {"requests": 0, "failures": 0, "throttled": 0, "connections": set()}
+
+    async def send_message(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        # Cada transporte es una conexión TCP: si el cliente reutiliza, el número no crece.
+        stats["connections"].add(id(request.transport))
+        payload = await request.json()
+        if not payload.get("to"):
+            # Como la API real: una petición inválida es un 400 y no tiene sentido reintentarla.
+            return web.json_response({"error": {"message": "Falta el parámetro 'to'", "code": 100}}, status=400)
+
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        roll = random.random()
+        if roll < failure_rate:
+            stats["failures"] += 1
+            return web.json_response({"error": {"message": "Error simulado", "code": 2}}, status=500)
+        if roll < failure_rate + throttle_rate:
+            stats["throttled"] += 1
+            return web.json_response({"error": {"message": "Límite simulado", "code": 130429}}, status=429)
+
+        return web.json_response({
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}],
+        })
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response({**stats, "connections": len(stats["connections"])})
+
+    app = web.Application()
+    app[STATS] = stats
+    app.router.add_post("/{version}/{phone_number_id}/messages", send_message)
+    app.router.add_get("/_stats", get_stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock de la Graph API de WhatsApp")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(build_app(args.latency_ms, args.failure_rate, args.throttle_rate), host="127.0.0.1", port=args.port)
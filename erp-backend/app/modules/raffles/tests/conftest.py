@@ -0,0 +1,39 @@
+import importlib
+import importlib.abc
+import importlib.util
+import sys
+
+# Algunos módulos importan con el prefijo del monorepo ('app.modules.raffles.app.…') y el
+# resto con 'app.…'. Los tests corren desde la raíz del módulo de rifas, donde solo existe
+# 'app': el prefijo largo se resuelve a los mismos módulos (y no a copias, que duplicarían
+# las tablas del ORM).
+ALIAS_PREFIX = "app.modules.raffles.app"
+
+
+class _MonorepoAliasFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def __init__(self):
+        self._real_specs = {}
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == ALIAS_PREFIX or fullname.startswith(ALIAS_PREFIX + "."):
+            return importlib.util.spec_from_loader(fullname, self)
+        if fullname in ("app.modules", "app.modules.raffles"):
+            # Paquetes vacíos intermedios.
+            return importlib.util.spec_from_loader(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        if spec.name == ALIAS_PREFIX or spec.name.startswith(ALIAS_PREFIX + "."):
+            module = importlib.import_module("app" + spec.name[len(ALIAS_PREFIX):])
+            self._real_specs[spec.name] = module.__spec__
+            return module
+        return None
+
+    def exec_module(self, module):
+        # El sistema de importación le puso el spec del alias al módulo real: se restaura.
+        real_spec = self._real_specs.pop(module.__spec__.name, None)
+        if real_spec is not None:
+            module.__spec__ = real_spec
+
+
+sys.meta_path.insert(0, _MonorepoAliasFinder())
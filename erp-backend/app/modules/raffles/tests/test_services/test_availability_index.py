@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.services import availability_index
+from app.services.availability_index import AvailabilityIndex
+
+
+def test_new_index_has_every_number_available():
+    index = AvailabilityIndex("r1", digits=2)
+    assert index.size == 100
+    assert index.available_count == 100
+    assert index.is_available("00") and index.is_available("99")
+
+
+def test_invalid_numbers_are_never_available():
+    index = AvailabilityIndex("r1", digits=2)
+    assert not index.is_available("100")
+    assert not index.is_available("7")
+    assert not index.is_available("a1")
+
+
+def test_padding_bits_do_not_count():
+    # 10 números ocupan 2 bytes: los 6 bits sobrantes no deben aparecer como disponibles.
+    index = AvailabilityIndex("r1", digits=1)
+    assert index.available_numbers() == [str(n) for n in range(10)]
+
+
+def test_marking_updates_count_and_is_idempotent():
+    index = AvailabilityIndex("r1", digits=2)
+    index.mark_unavailable(["05", "05", "42", "xx"])
+    assert index.available_count == 98
+    assert not index.is_available("05")
+
+    index.mark_available(["05", "05", "17"])
+    assert index.available_count == 99
+    assert index.is_available("05")
+    assert "42" not in index.available_numbers()
+
+
+def test_sample_returns_distinct_available_numbers():
+    index = AvailabilityIndex("r1", digits=3)
+    index.mark_unavailable([str(n).zfill(3) for n in range(0, 1000, 2)])
+    picked = index.sample(50, skip={"001", "003"})
+    assert len(picked) == len(set(picked)) == 50
+    assert all(index.is_available(number) and number not in {"001", "003"} for number in picked)
+
+
+def test_sample_when_few_numbers_remain():
+    index = AvailabilityIndex("r1", digits=2)
+    index.mark_unavailable([str(n).zfill(2) for n in range(100) if n not in (3, 50, 77)])
+    assert sorted(index.sample(10)) == ["03", "50", "77"]
+    assert index.sample(2, skip={"03", "50"}) == ["77"]
+
+
+def test_sample_of_a_full_raffle_is_empty():
+    index = AvailabilityIndex("r1", digits=1)
+    index.mark_unavailable([str(n) for n in range(10)])
+    assert index.sample(3) == []
+
+
+def test_sample_never_returns_more_than_remaining():
+    index = AvailabilityIndex("r1", digits=3)
+    index.mark_unavailable([str(n).zfill(3) for n in range(0, 1000) if n % 3])
+    picked = index.sample(10 ** 9)
+    assert len(picked) == index.available_count
+    assert sorted(picked) == index.available_numbers()
+
+
+def test_sample_attempts_are_capped(monkeypatch):
+    calls = []
+
+    class CountingRng:
+        def randrange(self, stop):
+            calls.append(stop)
+            return 0  # Siempre un número ocupado: el rechazo nunca acierta.
+
+        def sample(self, population, k):
+            return list(population)[:k]
+
+    monkeypatch.setattr(availability_index, "_rng", CountingRng())
+    index = AvailabilityIndex("r1", digits=5)
+    index.mark_unavailable(["00000"])
+    picked = index.sample(5_000)
+    assert len(picked) == 5_000
+    assert len(calls) <= availability_index._MAX_REJECTION_ATTEMPTS
+
+
+def test_pick_rejects_counts_above_available(monkeypatch):
+
+    index = AvailabilityIndex("r1", digits=1)
+    index.mark_unavailable(["1", "2"])
+
+    async def fake_get_index(db, raffle_id):
+        return index
+
+    async def fail_taken(*args, **kwargs):
+        raise AssertionError("no debe consultar la base de datos")
+
+    monkeypatch.setattr(availability_index, "get_availability_index", fake_get_index)
+    monkeypatch.setattr(availability_index, "get_taken_numbers", fail_taken)
+    with pytest.raises(ValueError):
+        asyncio.run(availability_index.pick_random_available_numbers(None, "r1", 9))
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import zlib
+
+import pytest
+
+from app.services.board import BOARD_STATUS_CODES, RaffleBoard, encode_board
+from app.utils.http_cache import etag_matches
+
+RESERVED, ASSIGNED, EXCLUDED = (BOARD_STATUS_CODES[s] for s in ("reserved", "assigned", "excluded"))
+
+
+def unpack(packed: bytes, size: int) -> list[int]:
+    return [(packed[position // 4] >> (2 * (position % 4))) & 0b11 for position in range(size)]
+
+
+def make_board() -> RaffleBoard:
+    return RaffleBoard("r1", digits=1, codes_by_position={1: RESERVED, 2: RESERVED, 5: ASSIGNED, 9: EXCLUDED})
+
+
+def test_packed_uses_two_bits_per_number_low_bits_first():
+    board = make_board()
+    packed = board.packed()
+    assert len(packed) == 3  # 10 números -> 12 posiciones con relleno -> 3 bytes
+    assert unpack(packed, 10) == [0, RESERVED, RESERVED, 0, 0, ASSIGNED, 0, 0, 0, EXCLUDED]
+
+
+def test_runs_cover_the_whole_universe():
+    runs = make_board().runs()
+    assert runs == [[0, 1], [RESERVED, 2], [0, 2], [ASSIGNED, 1], [0, 3], [EXCLUDED, 1]]
+    assert sum(length for _, length in runs) == 10
+
+
+def test_runs_of_an_empty_board():
+    assert RaffleBoard("r1", digits=2, codes_by_position={}).runs() == [[0, 100]]
+
+
+def test_encodings_round_trip():
+    board = make_board()
+    body, media_type = encode_board(board, "packed")
+    assert media_type == "application/octet-stream"
+    assert zlib.decompress(body) == board.packed()
+
+    body, media_type = encode_board(board, "rle")
+    assert media_type == "application/json"
+    assert json.loads(body) == {"digits": 1, "size": 10, "runs": board.runs()}
+
+    with pytest.raises(ValueError):
+        encode_board(board, "bitmap")
+
+
+def test_etag_follows_raffle_version_and_encoding(monkeypatch):
+    from app.services import raffle_service
+
+    versions = {"r1": 7}
+
+    async def fake_version(db, raffle_id):
+        return versions.get(raffle_id)
+
+    monkeypatch.setattr(raffle_service, "get_raffle_version", fake_version)
+
+    def etag(encoding):
+        return asyncio.run(raffle_service.get_raffle_board_etag_service("r1", encoding, None))
+
+    assert etag("rle") == etag("rle")
+    assert etag("rle") != etag("packed")
+    before = etag("rle")
+    versions["r1"] += 1
+    assert etag("rle") != before
+
+    with pytest.raises(ValueError):
+        asyncio.run(raffle_service.get_raffle_board_etag_service("missing", "rle", None))
+
+
+def test_etag_matches():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"x", "abc"', etag)
+    assert etag_matches("*", etag)
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+    assert not etag_matches('"abcd"', etag)
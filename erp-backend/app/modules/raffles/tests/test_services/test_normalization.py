@@ -0,0 +1,38 @@
+import pytest
+
+from app.utils.normalization import escape_like, looks_like_phone, normalize_name, normalize_phone
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("+57 300-123 4567", "573001234567"),
+    ("(300) 123.45.67", "3001234567"),
+    ("", ""),
+    (None, ""),
+])
+def test_normalize_phone(raw, expected):
+    assert normalize_phone(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("  José   PÉREZ ", "jose perez"),
+    ("Müller\tÑandú", "muller nandu"),
+    (None, ""),
+])
+def test_normalize_name(raw, expected):
+    assert normalize_name(raw) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("300 123 4567", True),
+    ("+57 (300) 123-4567", True),
+    ("ana 300", False),
+    ("---", False),
+    ("", False),
+])
+def test_looks_like_phone(query, expected):
+    assert looks_like_phone(query) is expected
+
+
+def test_escape_like():
+    assert escape_like("50%_off\\") == "50\\%\\_off\\\\"
+    assert escape_like("ana") == "ana"
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.db.repositories import notification as repository
+from app.services import notification_outbox as module
+from app.services.notification_outbox import NotificationDispatcher, _RateLimiter
+from app.services.send_whatsapp_message import NotificationResult
+
+
+def make_dispatcher(**overrides) -> NotificationDispatcher:
+    options = dict(
+        poll_interval_seconds=1.0,
+        batch_size=10,
+        concurrency=4,
+        rate_per_second=0,
+        max_attempts=3,
+        backoff_base_seconds=5.0,
+        backoff_max_seconds=60.0,
+        lease_seconds=60.0,
+    )
+    options.update(overrides)
+    return NotificationDispatcher(**options)
+
+
+def test_rate_limiter_spaces_acquisitions():
+    async def scenario():
+        limiter = _RateLimiter(rate_per_second=50)
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+        return time.monotonic() - started
+
+    # 6 envíos a 50/s: el primero sale de inmediato y los otros 5 cada 20 ms.
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_rate_limiter_disabled_does_not_wait():
+    async def scenario():
+        started = time.monotonic()
+        limiter = _RateLimiter(rate_per_second=0)
+        for _ in range(100):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 0.05
+
+
+@pytest.mark.parametrize("attempts, base_delay", [(1, 5), (2, 10), (3, 20), (4, 40), (10, 60)])
+def test_retry_at_backs_off_exponentially_with_jitter_and_cap(attempts, base_delay):
+    dispatcher = make_dispatcher()
+    before = datetime.now(timezone.utc)
+    retry_at = dispatcher._retry_at(attempts)
+    delay = (retry_at - before).total_seconds()
+    assert base_delay * 0.8 - 0.1 <= delay <= base_delay * 1.2 + 0.1
+
+
+def test_enqueue_only_paid_tickets(monkeypatch):
+    enqueued = []
+
+    async def fake_enqueue(db, kind, ticket_id, recipient, payload):
+        enqueued.append((kind, ticket_id, recipient, payload["to"]))
+
+    monkeypatch.setattr(module, "enqueue_notification", fake_enqueue)
+
+    async def scenario():
+        for status, phone in (("paid", "3001234567"), ("pending", "3001234567"), ("paid", "")):
+            ticket = SimpleNamespace(id=f"t-{status}-{phone}", status=status, phone=phone, name="Ana")
+            await module.enqueue_purchase_notification(None, ticket)
+
+    asyncio.run(scenario())
+    assert enqueued == [("purchase", "t-paid-3001234567", "3001234567", "3001234567")]
+
+
+def test_run_once_marks_sent_retried_and_dead(monkeypatch):
+    rows = [
+        SimpleNamespace(id=1, recipient="a", payload={"to": "ok"}, attempts=1),
+        SimpleNamespace(id=2, recipient="b", payload={"to": "retry"}, attempts=1),
+        SimpleNamespace(id=3, recipient="c", payload={"to": "retry"}, attempts=3),
+        SimpleNamespace(id=4, recipient="d", payload={"to": "bad"}, attempts=1),
+        SimpleNamespace(id=5, recipient="e", payload={"to": "boom"}, attempts=1),
+    ]
+    outcomes = {
+        "ok": NotificationResult(ok=True, status=200, message_id="wamid.1"),
+        "retry": NotificationResult(ok=False, status=503, error="no disponible", retryable=True),
+        "bad": NotificationResult(ok=False, status=400, error="inválido"),
+    }
+    recorded = {}
+
+    class FakeSession:
+        @asynccontextmanager
+        async def begin(self):
+            yield
+
+    @asynccontextmanager
+    async def fake_session_local():
+        yield FakeSession()
+
+    async def fake_claim(db, batch_size, lease_seconds, max_attempts):
+        return rows
+
+    async def fake_sent(db, notification_id, attempts, status_code, message_id):
+        recorded[notification_id] = ("sent", message_id)
+        return True
+
+    async def fake_failed(db, notification_id, attempts, status_code, error, retry_at):
+        recorded[notification_id] = ("retry" if retry_at else "dead", status_code)
+        return True
+
+    async def fake_send(payload):
+        if payload["to"] == "boom":
+            raise RuntimeError("fallo inesperado")
+        return outcomes[payload["to"]]
+
+    monkeypatch.setattr(module, "async_session_local", fake_session_local)
+    monkeypatch.setattr(module, "claim_notification_batch", fake_claim)
+    monkeypatch.setattr(module, "mark_notification_sent", fake_sent)
+    monkeypatch.setattr(module, "mark_notification_failed", fake_failed)
+    monkeypatch.setattr(module.whatsapp_client, "send_template", fake_send)
+
+    dispatcher = make_dispatcher()
+    assert asyncio.run(dispatcher.run_once()) == 5
+    assert recorded == {
+        1: ("sent", "wamid.1"),
+        2: ("retry", 503),
+        3: ("dead", 503),   # intentos agotados
+        4: ("dead", 400),   # no recuperable
+        5: ("retry", None),  # excepción inesperada: se reintenta
+    }
+    metrics = dispatcher.get_metrics()
+    assert (metrics["sent"], metrics["retried"], metrics["dead"]) == (1, 2, 2)
+
+
+def test_run_once_skips_results_after_losing_the_lease(monkeypatch):
+    rows = [
+        SimpleNamespace(id=1, recipient="a", payload={"to": "a"}, attempts=2),
+        SimpleNamespace(id=2, recipient="b", payload={"to": "b"}, attempts=1),
+    ]
+
+    class FakeSession:
+        @asynccontextmanager
+        async def begin(self):
+            yield
+
+    @asynccontextmanager
+    async def fake_session_local():
+        yield FakeSession()
+
+    async def fake_claim(db, batch_size, lease_seconds, max_attempts):
+        return rows
+
+    async def fake_sent(db, notification_id, attempts, status_code, message_id):
+        # La fila 1 la volvió a reclamar otro worker: su intento ya no es el 2.
+        return notification_id != 1
+
+    async def fake_send(payload):
+        return NotificationResult(ok=True, status=200, message_id="wamid.1")
+
+    monkeypatch.setattr(module, "async_session_local", fake_session_local)
+    monkeypatch.setattr(module, "claim_notification_batch", fake_claim)
+    monkeypatch.setattr(module, "mark_notification_sent", fake_sent)
+    monkeypatch.setattr(module.whatsapp_client, "send_template", fake_send)
+
+    dispatcher = make_dispatcher()
+    asyncio.run(dispatcher.run_once())
+    metrics = dispatcher.get_metrics()
+    assert (metrics["sent"], metrics["lease_lost"]) == (1, 1)
+
+
+class RecordingSession:
+    """Sesión falsa que guarda las sentencias para revisar su WHERE compilado para Postgres."""
+
+    def __init__(self, rowcount=1):
+        self.statements = []
+        self.rowcount = rowcount
+
+    async def execute(self, statement):
+        self.statements.append(statement.compile(dialect=postgresql.dialect()))
+        return SimpleNamespace(rowcount=self.rowcount, all=lambda: [])
+
+
+@pytest.mark.parametrize("mark", ["sent", "failed"])
+def test_outcome_writes_require_the_claimed_attempt(mark):
+    session = RecordingSession(rowcount=0)
+    if mark == "sent":
+        recorded = asyncio.run(repository.mark_notification_sent(session, 7, 3, 200, "wamid.1"))
+    else:
+        recorded = asyncio.run(repository.mark_notification_failed(session, 7, 3, 503, "no disponible", None))
+
+    assert recorded is False
+    compiled = session.statements[0]
+    where = str(compiled).split("WHERE", 1)[1]
+    assert "notification_outbox.status =" in where and "notification_outbox.attempts =" in where
+    assert {7, 3, "sending"} <= set(compiled.params.values())
+
+
+def test_claim_skips_rows_past_max_attempts():
+    session = RecordingSession()
+    asyncio.run(repository.claim_notification_batch(session, 10, 60.0, 8))
+
+    expire, claim = session.statements
+    assert "SET status=%(status)s" in str(expire) and expire.params["status"] == "dead"
+    assert "notification_outbox.attempts >=" in str(expire)
+    assert "notification_outbox.attempts <" in str(claim)
+    assert 8 in expire.params.values() and 8 in claim.params.values()
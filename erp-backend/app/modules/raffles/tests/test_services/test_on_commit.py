@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.db.database import on_commit
+
+
+def _session_with_transaction(engine) -> Session:
+    session = Session(engine)
+    session.execute(text("SELECT 1"))
+    return session
+
+
+def test_callbacks_run_only_after_commit():
+    engine = create_engine("sqlite://")
+    calls = []
+    with _session_with_transaction(engine) as session:
+        on_commit(SimpleNamespace(sync_session=session), lambda: calls.append("commit"))
+        assert calls == []
+        session.commit()
+    assert calls == ["commit"]
+
+
+def test_callbacks_are_discarded_on_rollback():
+    engine = create_engine("sqlite://")
+    calls = []
+    with _session_with_transaction(engine) as session:
+        on_commit(SimpleNamespace(sync_session=session), lambda: calls.append("rollback"))
+        session.rollback()
+        session.execute(text("SELECT 1"))
+        session.commit()
+    assert calls == []
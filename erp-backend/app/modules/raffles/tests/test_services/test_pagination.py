@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 3, 1, 14, 30, 5, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, "3f2a|with-pipe")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, "3f2a|with-pipe")
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-un-cursor", "%%%"])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
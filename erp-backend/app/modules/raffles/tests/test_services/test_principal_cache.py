@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db.models import User
+from app.services import principal_cache as module
+from app.services.principal_cache import PrincipalCache
+
+
+class FakeSession:
+    """Sesión mínima: responde la consulta de principal_cache con los usuarios registrados."""
+
+    def __init__(self, users: dict[str, SimpleNamespace]):
+        self.users = users
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        username = statement.whereclause.right.value
+        return SimpleNamespace(first=lambda: self.users.get(username))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def user_row(user_id: int, username: str, is_active=True) -> SimpleNamespace:
+    return SimpleNamespace(id=user_id, username=username, is_active=is_active)
+
+
+def test_principal_is_cached_within_the_ttl(clock):
+    db = FakeSession({"ana": user_row(1, "ana")})
+    cache = PrincipalCache(ttl_seconds=30, max_entries=8)
+
+    async def scenario():
+        first = await cache.get(db, "ana")
+        clock[0] += 10
+        second = await cache.get(db, "ana")
+        clock[0] += 30
+        await cache.get(db, "ana")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second and first.is_active
+    assert db.queries == 2
+
+
+def test_unknown_users_are_not_cached_and_null_is_active_counts_as_active(clock):
+    db = FakeSession({})
+    cache = PrincipalCache(ttl_seconds=30, max_entries=8)
+
+    async def scenario():
+        assert await cache.get(db, "nuevo") is None
+        db.users["nuevo"] = user_row(2, "nuevo", is_active=None)
+        return await cache.get(db, "nuevo")
+
+    assert asyncio.run(scenario()).is_active
+    assert db.queries == 2
+
+
+def test_lru_bound(clock):
+    db = FakeSession({name: user_row(i, name) for i, name in enumerate("abc")})
+    cache = PrincipalCache(ttl_seconds=30, max_entries=2)
+
+    async def scenario():
+        for name in "abca":
+            await cache.get(db, name)
+
+    asyncio.run(scenario())
+    assert db.queries == 4
+    assert cache.get_metrics()["entries"] == 2
+
+
+def test_orm_updates_invalidate_the_shared_cache(monkeypatch):
+    cache = PrincipalCache(ttl_seconds=30, max_entries=8)
+    monkeypatch.setattr(module, "principal_cache", cache)
+    cache._entries["ana"] = (0.0, module.Principal(id=1, username="ana", is_active=True))
+    cache._entries["eva"] = (0.0, module.Principal(id=2, username="eva", is_active=True))
+
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    with Session(engine) as session:
+        session.add_all([User(id=1, username="ana", is_active=True), User(id=2, username="eva", is_active=True)])
+        session.commit()
+
+        session.get(User, 1).is_active = False
+        session.get(User, 2).username = "eva2"
+        session.flush()
+
+    assert "ana" not in cache._entries
+    assert "eva" not in cache._entries
+    assert cache.get_metrics()["invalidations"] == 2
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import raffle_meta_cache as module
+from app.services.raffle_meta_cache import RaffleMetaCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def raffle_rows(monkeypatch):
+    """Filas que devolvería la base de datos, y el registro de consultas hechas."""
+    rows, queries = {}, []
+
+    async def fake_get_raffle_meta_row(db, raffle_id):
+        queries.append(raffle_id)
+        return rows.get(raffle_id)
+
+    monkeypatch.setattr(module, "get_raffle_meta_row", fake_get_raffle_meta_row)
+    return rows, queries
+
+
+def raffle_row(raffle_id: str, status: str = "active") -> SimpleNamespace:
+    return SimpleNamespace(
+        id=raffle_id, short_id=raffle_id[:4], name="Rifa", status=status, dijits_per_number=3,
+        numbers_per_ticket=1, excluded_numbers=["007"], price=5000, end_date=datetime(2030, 1, 1),
+    )
+
+
+def test_meta_is_cached_until_the_ttl_expires(clock, raffle_rows):
+    rows, queries = raffle_rows
+    rows["r1"] = raffle_row("r1")
+    cache = RaffleMetaCache(ttl_seconds=10, max_entries=8)
+
+    async def scenario():
+        first = await cache.get(None, "r1")
+        clock[0] += 5
+        second = await cache.get(None, "r1")
+        clock[0] += 10
+        await cache.get(None, "r1")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert first.excluded_numbers == frozenset({"007"}) and first.is_on_sale
+    assert queries == ["r1", "r1"]
+    assert cache.get_metrics()["expired"] == 1
+
+
+def test_missing_raffles_are_not_cached(clock, raffle_rows):
+    rows, queries = raffle_rows
+    cache = RaffleMetaCache(ttl_seconds=10, max_entries=8)
+
+    async def scenario():
+        assert await cache.get(None, "nueva") is None
+        rows["nueva"] = raffle_row("nueva")
+        return await cache.get(None, "nueva")
+
+    assert asyncio.run(scenario()).id == "nueva"
+    assert queries == ["nueva", "nueva"]
+
+
+def test_invalidate_and_lru_bound(clock, raffle_rows):
+    rows, queries = raffle_rows
+    for raffle_id in ("a", "b", "c"):
+        rows[raffle_id] = raffle_row(raffle_id, status="closed")
+    cache = RaffleMetaCache(ttl_seconds=10, max_entries=2)
+
+    async def scenario():
+        for raffle_id in ("a", "b", "c"):
+            await cache.get(None, raffle_id)
+        cache.invalidate("c")
+        await cache.get(None, "c")
+        await cache.get(None, "a")
+
+    asyncio.run(scenario())
+    assert queries == ["a", "b", "c", "c", "a"]
+    assert cache.get_metrics()["entries"] == 2
+    assert cache.get_metrics()["invalidations"] == 1
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import time
+
+from app.services.receipt_cache import ReceiptCache, receipt_digest
+
+
+def make_cache(tmp_path, **overrides) -> ReceiptCache:
+    options = dict(
+        directory=str(tmp_path / "receipts"),
+        memory_max_bytes=1024,
+        disk_max_bytes=10_000,
+        disk_max_age_seconds=3600,
+        prune_interval_seconds=600,
+        tracked_tickets_max=100,
+    )
+    options.update(overrides)
+    return ReceiptCache(**options)
+
+
+def test_digest_changes_with_rendered_fields():
+    data = {"ticket_id": "t1", "name": "Ana", "status": "paid"}
+    assert receipt_digest(data) == receipt_digest(dict(reversed(list(data.items()))))
+    assert receipt_digest(data) != receipt_digest({**data, "status": "cancelled"})
+
+
+def test_memory_then_disk_hits(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path)
+        assert await cache.get("t1", "d1", "jpg") is None
+        await cache.put("t1", "d1", "jpg", b"imagen")
+        assert await cache.get("t1", "d1", "jpg") == b"imagen"
+
+        # Otro worker (otra instancia) la encuentra en disco.
+        other = make_cache(tmp_path)
+        assert await other.get("t1", "d1", "jpg") == b"imagen"
+        return cache.metrics, other.metrics
+
+    cache_metrics, other_metrics = asyncio.run(scenario())
+    assert cache_metrics["misses"] == 1 and cache_metrics["memory_hits"] == 1
+    assert other_metrics["disk_hits"] == 1
+
+
+def test_memory_tier_is_bounded_by_bytes(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path, memory_max_bytes=10)
+        await cache.put("t1", "d1", "jpg", b"123456")
+        await cache.put("t2", "d2", "jpg", b"123456")
+        return cache.get_metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["memory_entries"] == 1
+    assert metrics["memory_bytes"] <= 10
+
+
+def test_new_digest_replaces_stale_versions(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path)
+        await cache.put("t1", "viejo", "jpg", b"a")
+        await cache.put("t1", "nuevo", "jpg", b"b")
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert sorted(os.listdir(tmp_path / "receipts" / "t1")) == ["nuevo.jpg"]
+    assert all(key[1] == "nuevo" for key in cache._memory)
+
+
+def test_evict_tickets_removes_both_tiers(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path)
+        await cache.put("t1", "d1", "jpg", b"a")
+        await cache.put("t2", "d2", "jpg", b"b")
+        await cache.evict_tickets(["t1", "t2"])
+        return cache, await cache.get("t1", "d1", "jpg")
+
+    cache, body = asyncio.run(scenario())
+    assert body is None
+    assert not (tmp_path / "receipts" / "t1").exists()
+    assert cache.get_metrics()["tracked_tickets"] == 0
+
+
+def test_tracked_tickets_are_bounded(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path, tracked_tickets_max=3)
+        for index in range(10):
+            await cache.put(f"t{index}", "d", "jpg", b"x")
+        return cache
+
+    assert asyncio.run(scenario()).get_metrics()["tracked_tickets"] == 3
+
+
+def test_prune_removes_old_files_and_enforces_the_byte_cap(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path, disk_max_bytes=250)
+        for index in range(5):
+            await cache.put(f"t{index}", "d", "jpg", b"x" * 100)
+        # t0 lleva mucho sin usarse; t1 es el siguiente más viejo.
+        now = time.time()
+        os.utime(tmp_path / "receipts" / "t0" / "d.jpg", (now - 7200, now - 7200))
+        os.utime(tmp_path / "receipts" / "t1" / "d.jpg", (now - 60, now - 60))
+        removed = await cache.prune()
+        return cache, removed
+
+    cache, removed = asyncio.run(scenario())
+    remaining = sorted(path.parent.name for path in (tmp_path / "receipts").glob("*/d.jpg"))
+    # t0 por antigüedad; t1 y uno más por el tope de 250 bytes.
+    assert removed == 3
+    assert len(remaining) == 2 and "t0" not in remaining and "t1" not in remaining
+    assert cache.get_metrics()["disk_bytes"] == 200
@@ -0,0 +1,114 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import receipt_export as module
+from app.utils.pagination import decode_cursor, encode_cursor
+
+BASE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_row(minute: int, ticket_id: str):
+    return SimpleNamespace(id=ticket_id, created_at=BASE + timedelta(minutes=minute))
+
+
+# Reanudación de una exportación que ya había llegado hasta 't3'; 't1' había fallado.
+AFTER = (BASE + timedelta(minutes=3), "t3")
+RETRY_ROW = make_row(1, "t1")
+NEW_ROWS = [make_row(5, "t5"), make_row(6, "t6"), make_row(7, "t7")]
+
+
+@pytest.fixture
+def export(monkeypatch):
+    """Sustituye la base de datos y el render; devuelve la lista de avances guardados."""
+    saved = []
+    render = {"block": False}
+
+    @asynccontextmanager
+    async def fake_session_local():
+        yield None
+
+    async def fake_stream(session, filters, chunk_size, after, statuses, include_ids):
+        # Igual que la consulta real: orden (created_at, id), así que el reintento va primero.
+        yield [RETRY_ROW, *NEW_ROWS]
+
+    async def fake_render(row):
+        if render["block"]:
+            await asyncio.Event().wait()
+        return b"jpeg"
+
+    async def fake_save(job_id, finished=False, **values):
+        saved.append(dict(values, finished=finished))
+
+    monkeypatch.setattr(module, "async_session_local", fake_session_local)
+    monkeypatch.setattr(module, "stream_ticket_rows", fake_stream)
+    monkeypatch.setattr(module, "_render_for_export", fake_render)
+    monkeypatch.setattr(module, "_save_progress", fake_save)
+    monkeypatch.setattr(module.settings, "RECEIPT_EXPORT_WINDOW", 1)
+    return saved, render
+
+
+def start():
+    return module._export_receipts_zip("job", None, None, AFTER, [RETRY_ROW.id])
+
+
+def test_resume_interrupted_before_first_chunk_keeps_position(export):
+    saved, render = export
+    render["block"] = True
+
+    async def scenario():
+        task = asyncio.create_task(start().__anext__())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    final = saved[-1]
+    assert final["finished"] and final["status"] == "interrupted"
+    assert decode_cursor(final["resume_cursor"]) == AFTER
+    assert final["failed_ticket_ids"] == ["t1"]
+
+
+def test_retried_ticket_does_not_move_cursor_backwards(export):
+    saved, _ = export
+
+    async def scenario():
+        generator = start()
+        await generator.__anext__()  # Bloque de 't1'.
+        await generator.__anext__()  # Bloque de 't5': 't1' ya se entregó.
+        await generator.aclose()
+
+    asyncio.run(scenario())
+    final = saved[-1]
+    assert decode_cursor(final["resume_cursor"]) == AFTER
+    assert final["failed_ticket_ids"] == []
+
+
+def test_unwritten_retry_stays_failed(export):
+    saved, _ = export
+
+    async def scenario():
+        generator = start()
+        await generator.__anext__()  # El bloque de 't1' se produjo pero no se confirmó su entrega.
+        await generator.aclose()
+
+    asyncio.run(scenario())
+    assert saved[-1]["failed_ticket_ids"] == ["t1"]
+
+
+def test_completed_resume_advances_past_new_rows(export):
+    saved, _ = export
+
+    async def scenario():
+        return [chunk async for chunk in start()]
+
+    asyncio.run(scenario())
+    final = saved[-1]
+    assert final["status"] == "completed"
+    assert final["exported_tickets"] == 4
+    assert final["resume_cursor"] == encode_cursor(NEW_ROWS[-1].created_at, NEW_ROWS[-1].id)
+    assert final["failed_ticket_ids"] == []
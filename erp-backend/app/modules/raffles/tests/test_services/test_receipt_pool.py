@@ -0,0 +1,34 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.receipt_pool import ReceiptRenderPool
+
+
+# Se ejecutan en los procesos hijos (spawn): deben ser importables a nivel de módulo.
+def _echo(value: bytes) -> tuple[bytes, float]:
+    return value, 0.0
+
+
+def _crash() -> tuple[bytes, float]:
+    os._exit(1)
+
+
+def test_pool_recovers_after_a_child_dies():
+    async def scenario():
+        pool = ReceiptRenderPool(processes=1, max_pending=4, timeout_seconds=30)
+        try:
+            assert await pool._submit("t1", _echo, b"antes") == b"antes"
+            with pytest.raises(HTTPException) as exc_info:
+                await pool._submit("t2", _crash)
+            assert exc_info.value.status_code == 503
+            assert await pool._submit("t3", _echo, b"despues") == b"despues"
+            return pool.get_metrics()
+        finally:
+            pool.shutdown()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["pool_restarts"] == 1
+    assert metrics["rendered"] == 2
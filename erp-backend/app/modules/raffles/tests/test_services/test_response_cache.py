@@ -0,0 +1,26 @@
+from app.services.response_cache import VersionedResponseCache
+
+
+def test_hit_only_for_the_same_version():
+    cache = VersionedResponseCache(max_entries=4)
+    stored = cache.put("raffle:r1", "v1", b"{}")
+    assert cache.get("raffle:r1", "v1") == stored
+    assert cache.get("raffle:r1", "v2") is None
+    assert cache.get_metrics()["hits"] == 1 and cache.get_metrics()["misses"] == 1
+
+
+def test_etag_is_deterministic_across_workers():
+    # Dos instancias (dos workers) calculan el mismo ETag para la misma versión.
+    assert VersionedResponseCache(1).put("k", "7", b"a").etag == VersionedResponseCache(1).put("k", "7", b"b").etag
+    assert VersionedResponseCache.etag_for("k", "7") != VersionedResponseCache.etag_for("k", "8")
+
+
+def test_lru_bound():
+    cache = VersionedResponseCache(max_entries=2)
+    cache.put("a", "1", b"a")
+    cache.put("b", "1", b"b")
+    cache.get("a", "1")
+    cache.put("c", "1", b"c")
+    assert cache.get("b", "1") is None
+    assert cache.get("a", "1") is not None and cache.get("c", "1") is not None
+    assert cache.get_metrics()["entries"] == 2
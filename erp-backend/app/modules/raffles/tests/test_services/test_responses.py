@@ -0,0 +1,16 @@
+from app.utils.responses import attachment_disposition
+
+
+def test_ascii_filename_is_sent_as_is():
+    assert attachment_disposition("Rifa_Moto_Ticket_1a2b3c4d.jpg") == 'attachment; filename="Rifa_Moto_Ticket_1a2b3c4d.jpg"'
+
+
+def test_non_ascii_filename_gets_rfc5987_parameter():
+    header = attachment_disposition('Rifa_Año_€_"VIP"_😀.jpg')
+    # Starlette codifica los encabezados en latin-1: no debe fallar.
+    header.encode("latin-1")
+    assert header.startswith('attachment; filename="Rifa_Ano')
+    assert "filename*=UTF-8''Rifa_A%C3%B1o_%E2%82%AC_%22VIP%22_%F0%9F%98%80.jpg" in header
+    # El nombre de respaldo no puede cerrar la comilla antes de tiempo.
+    fallback = header.split('filename="', 1)[1].split('"', 1)[0]
+    assert '"' not in fallback and fallback.endswith(".jpg")
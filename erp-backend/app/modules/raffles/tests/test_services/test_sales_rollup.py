@@ -0,0 +1,136 @@
+import asyncio
+from collections import Counter
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.db.models import Base, Raffle, SalesDailyRollup, User
+from app.db.repositories.sales import apply_sales_deltas, get_sales_buckets, rollup_key
+from app.schemas.ticket import PaymentType
+
+
+def test_rollup_key_uses_enum_values():
+    assert rollup_key(date(2025, 5, 1), "r1", 3, PaymentType.efectivo) == (date(2025, 5, 1), "r1", 3, "efectivo")
+    assert rollup_key(date(2025, 5, 1), "r1", 3, "transferencia")[3] == "transferencia"
+
+
+def test_rollup_key_stores_nulls_as_zero_and_empty():
+    assert rollup_key(date(2025, 5, 1), "r1", None, None) == (date(2025, 5, 1), "r1", 0, "")
+
+
+def test_enum_and_plain_value_share_a_key():
+    # Un delta por la ruta ORM (enum) y otro por Core (str) deben caer en la misma fila.
+    day = date(2025, 5, 1)
+    assert rollup_key(day, "r1", 2, PaymentType.transferencia) == rollup_key(day, "r1", 2, "transferencia")
+
+
+# --- DELTAS DEL ROLLUP ---
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement.compile(dialect=postgresql.dialect()))
+        return SimpleNamespace(all=lambda: [])
+
+
+def test_sales_deltas_are_upserted_in_key_order_without_zero_rows():
+    session = RecordingSession()
+    later, earlier = rollup_key(date(2025, 5, 2), "r1", 1, "efectivo"), rollup_key(date(2025, 5, 1), "r1", 1, "efectivo")
+    cancelled_same_day = rollup_key(date(2025, 5, 1), "r2", 1, "efectivo")
+    asyncio.run(apply_sales_deltas(session, {
+        later: Counter(tickets_sold=1, revenue=5000),
+        cancelled_same_day: Counter(tickets_sold=0, revenue=0),
+        earlier: Counter(tickets_sold=-1, revenue=-5000),
+    }))
+
+    (compiled,) = session.statements
+    sql = str(compiled)
+    assert "ON CONFLICT (sale_date, raffle_id, user_id, payment_type) DO UPDATE" in sql
+    assert "tickets_sold = (sales_daily_rollup.tickets_sold + excluded.tickets_sold)" in sql
+    params = compiled.params
+    assert [params["sale_date_m0"], params["sale_date_m1"]] == [date(2025, 5, 1), date(2025, 5, 2)]
+    assert [params["tickets_sold_m0"], params["tickets_sold_m1"]] == [-1, 1]
+    assert "raffle_id_m2" not in params
+
+
+def test_sales_deltas_without_changes_do_not_touch_the_table():
+    session = RecordingSession()
+    asyncio.run(apply_sales_deltas(session, {rollup_key(date(2025, 5, 1), "r1", 1, None): Counter()}))
+    assert session.statements == []
+
+
+# --- CONSULTA POR CUBETAS ---
+class SyncSession:
+    """Adapta una sesión síncrona de SQLite a la interfaz async que usa el repositorio."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def execute(self, statement):
+        return self.session.execute(statement)
+
+
+@pytest.fixture
+def rollup_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, Raffle.__table__, SalesDailyRollup.__table__])
+    with Session(engine) as session:
+        end = datetime(2030, 1, 1)
+        session.add_all([
+            User(id=1, username="ana"),
+            User(id=2, username="luis"),
+            Raffle(id="r1", short_id="A", name="Moto", end_date=end, excluded_numbers=[]),
+            Raffle(id="r2", short_id="B", name="TV", end_date=end, excluded_numbers=[]),
+        ])
+        session.add_all([
+            SalesDailyRollup(sale_date=date(2025, 5, 1), raffle_id="r1", user_id=1, payment_type="efectivo", tickets_sold=2, revenue=10000),
+            SalesDailyRollup(sale_date=date(2025, 5, 1), raffle_id="r2", user_id=1, payment_type="transferencia", tickets_sold=1, revenue=3000),
+            SalesDailyRollup(sale_date=date(2025, 5, 1), raffle_id="r1", user_id=2, payment_type="efectivo", tickets_sold=1, revenue=5000),
+            SalesDailyRollup(sale_date=date(2025, 5, 2), raffle_id="r1", user_id=2, payment_type="efectivo", tickets_sold=4, revenue=20000),
+            # Vendido y cancelado el mismo día: la fila queda en cero y no debe aparecer.
+            SalesDailyRollup(sale_date=date(2025, 5, 3), raffle_id="r2", user_id=2, payment_type="efectivo", tickets_sold=0, revenue=0),
+        ])
+        session.commit()
+        yield SyncSession(session)
+
+
+def buckets(db, group_by, **filters):
+    rows = asyncio.run(get_sales_buckets(db, "day", date(2025, 5, 1), date(2025, 5, 31), group_by, **filters))
+    return [row._asdict() for row in rows]
+
+
+def test_buckets_by_day_only(rollup_db):
+    assert buckets(rollup_db, []) == [
+        {"bucket": date(2025, 5, 1), "tickets_sold": 4, "revenue": 18000},
+        {"bucket": date(2025, 5, 2), "tickets_sold": 4, "revenue": 20000},
+    ]
+
+
+def test_buckets_by_seller(rollup_db):
+    rows = buckets(rollup_db, ["seller"])
+    assert [(row["bucket"].day, row["seller"], row["tickets_sold"]) for row in rows] == [
+        (1, "ana", 3), (1, "luis", 1), (2, "luis", 4),
+    ]
+
+
+def test_buckets_by_raffle_and_payment_type_with_filter(rollup_db):
+    rows = buckets(rollup_db, ["raffle", "payment_type"], user_id=1)
+    assert [(row["raffle_name"], row["payment_type"], row["revenue"]) for row in rows] == [
+        ("Moto", "efectivo", 10000), ("TV", "transferencia", 3000),
+    ]
+
+
+@pytest.mark.parametrize("granularity", ["week", "month"])
+def test_coarser_buckets_truncate_the_sale_date(granularity):
+    session = RecordingSession()
+    asyncio.run(get_sales_buckets(session, granularity, date(2025, 5, 1), date(2025, 5, 31), []))
+    sql = str(session.statements[0])
+    select_part, group_part = sql.split("GROUP BY", 1)
+    assert "CAST(date_trunc(" in select_part and "sales_daily_rollup.sale_date) AS DATE) AS bucket" in select_part
+    assert "date_trunc(" in group_part
+    assert session.statements[0].params["date_trunc_1"] == granularity
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from app.schemas.ticket import TicketAllocateRequest, TicketCreateRequest
+from app.services import ticket_service as module
+from app.services.availability_index import AvailabilityIndex
+from app.services.raffle_meta_cache import RaffleMeta
+
+
+def make_raffle(**overrides) -> RaffleMeta:
+    values = dict(
+        id="r1",
+        short_id="R1",
+        name="Rifa",
+        status="active",
+        dijits_per_number=2,
+        numbers_per_ticket=1,
+        excluded_numbers=frozenset(),
+        price=1000,
+        end_date=datetime(2030, 1, 1, tzinfo=timezone.utc),
+    )
+    values.update(overrides)
+    return RaffleMeta(**values)
+
+
+def make_request(count: int | None) -> TicketAllocateRequest:
+    return TicketAllocateRequest(raffle_id="r1", count=count, name="Ana", phone="3001234567", payment_type="efectivo")
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Sustituye los repositorios y devuelve el registro de llamadas y el índice usado."""
+    calls = {"inserted": 0, "locked": [], "raffle": make_raffle()}
+    index = AvailabilityIndex("r1", digits=2)
+
+    async def get_raffle(db, raffle_id):
+        return calls["raffle"]
+
+    async def get_index(db, raffle_id):
+        return index
+
+    async def insert_ticket(db, values):
+        calls["inserted"] += 1
+        return SimpleNamespace(created_at=None, updated_at=None)
+
+    async def try_lock(db, raffle_id, candidates):
+        calls["locked"].extend(candidates)
+        return list(candidates)
+
+    async def claim(db, raffle_id, ticket_id, numbers, status, expire_at):
+        return [SimpleNamespace(number=n, id=int(n)) for n in numbers]
+
+    async def noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(module.raffle_meta_cache, "get", get_raffle)
+    monkeypatch.setattr(module, "get_availability_index", get_index)
+    monkeypatch.setattr(module, "insert_ticket", insert_ticket)
+    monkeypatch.setattr(module, "try_lock_free_numbers", try_lock)
+    monkeypatch.setattr(module, "claim_numbers", claim)
+    monkeypatch.setattr(module, "set_ticket_numbers_snapshot", noop)
+    monkeypatch.setattr(module, "record_new_ticket", noop)
+    monkeypatch.setattr(module, "enqueue_purchase_notification", noop)
+    monkeypatch.setattr(module, "on_commit", lambda db, callback: None)
+    return calls, index
+
+
+USER = SimpleNamespace(id=1, username="vendedor")
+
+
+def test_count_must_be_positive_and_bounded():
+    with pytest.raises(ValidationError):
+        make_request(0)
+    with pytest.raises(ValidationError):
+        make_request(10 ** 9)
+
+
+def test_allocation_fails_before_inserting_when_not_enough_numbers(fake_db):
+    calls, index = fake_db
+    index.mark_unavailable([str(n).zfill(2) for n in range(95)])
+
+    with pytest.raises(ValueError):
+        asyncio.run(module.allocate_random_ticket_service(make_request(10), None, USER))
+    assert calls["inserted"] == 0
+    assert calls["locked"] == []
+
+
+def test_allocation_assigns_the_requested_count(fake_db):
+    calls, index = fake_db
+    ticket = asyncio.run(module.allocate_random_ticket_service(make_request(4), None, USER))
+    assert len(ticket.numbers) == len(set(ticket.numbers)) == 4
+    assert calls["inserted"] == 1
+
+
+def test_allocation_never_offers_excluded_numbers(fake_db):
+    calls, index = fake_db
+    # El índice aún no refleja la edición: los excluidos solo están en los metadatos de la rifa.
+    excluded = frozenset(str(n).zfill(2) for n in range(90))
+    calls["raffle"] = make_raffle(excluded_numbers=excluded)
+
+    ticket = asyncio.run(module.allocate_random_ticket_service(make_request(10), None, USER))
+    assert sorted(ticket.numbers) == [str(n) for n in range(90, 100)]
+    assert not excluded & set(calls["locked"])
+
+
+def test_create_ticket_snapshot_has_no_duplicates(monkeypatch, fake_db):
+    saved = {}
+
+    async def fake_save(db, ticket_values, numbers, expiration_time, raffle_price):
+        saved.update(snapshot=ticket_values["numbers_snapshot"], numbers=numbers)
+        return SimpleNamespace(created_at=None, updated_at=None), [SimpleNamespace(number=n, id=int(n)) for n in numbers]
+
+    monkeypatch.setattr(module, "save_new_ticket", fake_save)
+    data = TicketCreateRequest(raffle_id="r1", numbers=["07", "03", "07"], name="Ana", phone="3001234567", payment_type="efectivo")
+    ticket = asyncio.run(module.create_ticket_service(data, None, USER))
+    assert saved == {"snapshot": ["07", "03"], "numbers": ["07", "03"]}
+    assert ticket.numbers_snapshot == ["07", "03"]
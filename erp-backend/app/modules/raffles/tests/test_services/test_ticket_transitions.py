@@ -0,0 +1,118 @@
+import asyncio
+from collections import Counter
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.repositories import stats
+from app.db.repositories.sales import rollup_key
+from app.db.repositories.stats import TicketTransition
+
+DAY = date(2025, 5, 1)
+SALES_KEY = rollup_key(DAY, "r1", 2, "efectivo")
+
+
+def nonzero(deltas) -> dict:
+    return {key: value for key, value in deltas.items() if value}
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """Captura los deltas (sin ceros) que apply_ticket_transitions escribiría en cada tabla."""
+    calls = {"stats": [], "participants": [], "sales": [], "participants_result": Counter()}
+
+    async def fake_upsert(db, raffle_id, deltas):
+        calls["stats"].append((raffle_id, nonzero(deltas)))
+
+    async def fake_participants(db, participant_deltas):
+        calls["participants"].append(nonzero(participant_deltas))
+        return calls["participants_result"]
+
+    async def fake_sales(db, deltas):
+        calls["sales"].append({key: nonzero(delta) for key, delta in deltas.items()})
+
+    monkeypatch.setattr(stats, "_upsert_stats_deltas", fake_upsert)
+    monkeypatch.setattr(stats, "_apply_participant_deltas", fake_participants)
+    monkeypatch.setattr(stats, "apply_sales_deltas", fake_sales)
+    return calls
+
+
+def transition(old_status, new_status, payment_date=DAY):
+    return TicketTransition(
+        raffle_id="r1", name="Ana", old_status=old_status, new_status=new_status,
+        price=5000, user_id=2, payment_type="efectivo", payment_date=payment_date,
+    )
+
+
+def apply(*transitions):
+    asyncio.run(stats.apply_ticket_transitions(None, list(transitions)))
+
+
+def test_new_paid_ticket(recorded):
+    apply(transition(None, "paid"))
+    assert recorded["stats"] == [("r1", {"paid_tickets": 1, "revenue": 5000})]
+    assert recorded["sales"] == [{SALES_KEY: {"tickets_sold": 1, "revenue": 5000}}]
+    assert recorded["participants"] == [{("r1", "Ana"): 1}]
+
+
+def test_pending_to_paid(recorded):
+    apply(transition("pending", "paid"))
+    assert recorded["stats"] == [("r1", {"pending_tickets": -1, "paid_tickets": 1, "revenue": 5000})]
+    assert recorded["sales"] == [{SALES_KEY: {"tickets_sold": 1, "revenue": 5000}}]
+    # Sigue activo: el participante no cambia.
+    assert recorded["participants"] == [{}]
+
+
+def test_paid_to_cancelled(recorded):
+    apply(transition("paid", "cancelled"))
+    assert recorded["stats"] == [("r1", {"paid_tickets": -1, "cancelled_tickets": 1, "revenue": -5000})]
+    assert recorded["sales"] == [{SALES_KEY: {"tickets_sold": -1, "revenue": -5000}}]
+    assert recorded["participants"] == [{("r1", "Ana"): -1}]
+
+
+def test_paid_without_payment_date_skips_the_rollup(recorded):
+    apply(transition(None, "paid", payment_date=None))
+    assert recorded["stats"] == [("r1", {"paid_tickets": 1, "revenue": 5000})]
+    assert recorded["sales"] == [{}]
+
+
+def test_unchanged_status_writes_nothing(recorded):
+    apply(transition("paid", "paid"))
+    assert recorded == {"stats": [], "participants": [], "sales": [], "participants_result": Counter()}
+
+
+def test_participant_changes_update_the_raffle_count(recorded):
+    # _apply_participant_deltas informa un participante nuevo (0 -> n) en la rifa.
+    recorded["participants_result"] = Counter({"r1": 1})
+    apply(transition(None, "pending"))
+    assert recorded["stats"] == [("r1", {"pending_tickets": 1}), ("r1", {"participants": 1})]
+
+
+class ScriptedSession:
+    """Devuelve, en orden, las filas de RETURNING que daría Postgres a cada sentencia."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    async def execute(self, statement, params=None):
+        rows = self.results.pop(0)
+        return SimpleNamespace(all=lambda: rows)
+
+
+def test_participant_appears_only_when_count_goes_from_zero():
+    session = ScriptedSession([
+        SimpleNamespace(raffle_id="r1", name="Ana", active_tickets=1),   # 0 -> 1: nuevo
+        SimpleNamespace(raffle_id="r1", name="Luis", active_tickets=3),  # 2 -> 3: ya existía
+    ])
+    deltas = Counter({("r1", "Ana"): 1, ("r1", "Luis"): 1})
+    assert asyncio.run(stats._apply_participant_deltas(session, deltas)) == Counter({"r1": 1})
+
+
+def test_participant_disappears_only_when_count_reaches_zero():
+    session = ScriptedSession([
+        SimpleNamespace(raffle_id="r1", active_tickets=0),  # 1 -> 0: desaparece
+        SimpleNamespace(raffle_id="r1", active_tickets=2),  # 3 -> 2: sigue
+    ])
+    deltas = Counter({("r1", "Ana"): -1, ("r1", "Luis"): -1})
+    assert asyncio.run(stats._apply_participant_deltas(session, deltas)) == Counter({"r1": -1})
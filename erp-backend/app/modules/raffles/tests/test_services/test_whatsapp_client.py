@@ -0,0 +1,78 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.send_whatsapp_message import API_VERSION, WhatsAppClient, build_purchase_payload
+from scripts.mock_graph_api import STATS, build_app
+
+
+def make_client(server: TestServer, read_timeout_seconds: float = 5.0) -> WhatsAppClient:
+    return WhatsAppClient(
+        base_url=str(server.make_url("")),
+        access_token="token-de-prueba",
+        phone_number_id="000000000000000",
+        api_version=API_VERSION,
+        max_connections=4,
+        max_connections_per_host=2,
+        connect_timeout_seconds=1.0,
+        read_timeout_seconds=read_timeout_seconds,
+    )
+
+
+def send_with_mock(app: web.Application, payloads: list[dict], read_timeout_seconds: float = 5.0):
+    """Levanta 'app' en un servidor local, envía los payloads en orden y cierra todo."""
+    async def scenario():
+        server = TestServer(app)
+        await server.start_server()
+        client = make_client(server, read_timeout_seconds)
+        try:
+            return [await client.send_template(payload) for payload in payloads], client.get_metrics()
+        finally:
+            await client.close()
+            await server.close()
+
+    return asyncio.run(scenario())
+
+
+def purchase_payload(index: int = 0) -> dict:
+    return build_purchase_payload(f"57300{index:07d}", f"Cliente {index}", f"ticket-{index}")
+
+
+def test_connections_are_reused():
+    app = build_app()
+    results, metrics = send_with_mock(app, [purchase_payload(i) for i in range(10)])
+    assert all(result.ok and result.message_id.startswith("wamid.") for result in results)
+    assert app[STATS]["requests"] == 10
+    assert len(app[STATS]["connections"]) == 1
+    assert metrics["sent"] == 10 and metrics["failed"] == 0
+
+
+def test_timeout_is_retryable():
+    results, metrics = send_with_mock(build_app(latency_ms=500), [purchase_payload()], read_timeout_seconds=0.1)
+    assert not results[0].ok
+    assert results[0].retryable
+    assert metrics["timeouts"] == 1
+
+
+def test_server_errors_and_throttling_are_retryable():
+    server_error, _ = send_with_mock(build_app(failure_rate=1.0), [purchase_payload()])
+    throttled, _ = send_with_mock(build_app(throttle_rate=1.0), [purchase_payload()])
+    assert (server_error[0].status, server_error[0].retryable) == (500, True)
+    assert (throttled[0].status, throttled[0].retryable) == (429, True)
+
+
+def test_bad_request_is_not_retryable():
+    results, _ = send_with_mock(build_app(), [{**purchase_payload(), "to": ""}])
+    assert results[0].status == 400
+    assert not results[0].ok and not results[0].retryable
+
+
+def test_accepted_message_with_unexpected_body_is_ok():
+    async def accepted(request: web.Request) -> web.Response:
+        return web.Response(text="ok", content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_post("/{version}/{phone_number_id}/messages", accepted)
+    results, _ = send_with_mock(app, [purchase_payload()])
+    assert results[0].ok and results[0].message_id is None
@@ -33,9 +33,18 @@ const SalesManagementPage = () => {
         setError(null);
         try {
             //const response = await axios.get('/api/v1/tickets/');
-            const response = await apiClient.get('/tickets/'); // <-- CAMBIO
-            console.log("DATOS CRUDOS RECIBIDOS DEL BACKEND:", response.data.tickets);
-            const sortedTickets = (response.data.tickets || []).sort((a, b) =>
+            // El backend pagina con cursor: se piden páginas hasta que no devuelva 'next_cursor'.
+            const allTickets = [];
+            let cursor = null;
+            do {
+                const response = await apiClient.get('/tickets/', {
+                    params: { limit: 500, ...(cursor ? { cursor } : {}) },
+                });
+                allTickets.push(...(response.data.tickets || []));
+                cursor = response.data.next_cursor;
+            } while (cursor);
+            console.log("DATOS CRUDOS RECIBIDOS DEL BACKEND:", allTickets);
+            const sortedTickets = allTickets.sort((a, b) =>
                 new Date(b.created_at) - new Date(a.created_at)
             );
             setTickets(sortedTickets);